@@ -1,6 +1,7 @@
 """
 Script de diagnostic mémoire pour les scrapers
 """
+import asyncio
 import gc
 import psutil
 import os
@@ -13,14 +14,15 @@ def check_memory():
     print(f"Mémoire utilisée: {memory_mb:.2f} MB")
     return memory_mb
 
-def test_scraper_memory_leak():
+async def test_scraper_memory_leak():
     """Test de fuites mémoire des scrapers"""
     print("=== Test de fuites mémoire ===")
     
     # Import après pour isoler
-    from stores.carrefour import get_price_carrefour
-    from stores.aldi import get_price_aldi
-    from stores.monoprix import get_price_monoprix
+    from stores.browser_pool import get_async_browser_pool
+    from stores.carrefour import get_price_carrefour_async
+    from stores.aldi import get_price_aldi_async
+    from stores.monoprix import get_price_monoprix_async
     
     initial_memory = check_memory()
     
@@ -40,11 +42,11 @@ def test_scraper_memory_leak():
         for item in items:
             try:
                 if store == "carrefour":
-                    get_price_carrefour("Marly le roi", item)
+                    await get_price_carrefour_async("Marly le roi", item)
                 elif store == "aldi":
-                    get_price_aldi("Marly le roi", item)
+                    await get_price_aldi_async("Marly le roi", item)
                 elif store == "monoprix":
-                    get_price_monoprix("Marly le roi", item)
+                    await get_price_monoprix_async("Marly le roi", item)
                     
                 # Nettoyage forcé
                 gc.collect()
@@ -72,5 +74,7 @@ def test_scraper_memory_leak():
     else:
         print("✅ Fuites acceptables")
 
+    await get_async_browser_pool().close()
+
 if __name__ == "__main__":
-    test_scraper_memory_leak()
\ No newline at end of file
+    asyncio.run(test_scraper_memory_leak())
\ No newline at end of file
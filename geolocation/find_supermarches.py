@@ -1,133 +1,238 @@
 import requests
-from geopy.geocoders import Nominatim
-import pandas as pd
+from requests.adapters import HTTPAdapter
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from dotenv import load_dotenv
 
+from geolocation.records import Supermarket, dedupe
+from geolocation.tiles import TILE_CACHE_ENABLED, IncompleteFetch, TileCache
+from geolocation.offline_index import SpatialIndex
+from geolocation.overpass import OverpassMirrors, mirror_urls
+
 load_dotenv()
 
-def find_supermarkets_gcp(latitude, longitude, radius_km=5):
+PLACES_URL = os.getenv("GOOGLE_PLACES_URL", "https://maps.googleapis.com/maps/api/place/nearbysearch/json")
+# Temps total accordé à la recherche Google Places, pagination comprise
+PLACES_BUDGET_S = float(os.getenv("GOOGLE_PLACES_BUDGET_S", "6"))
+# Google n'active le next_page_token qu'après un court délai
+PLACES_PAGE_DELAY_S = float(os.getenv("GOOGLE_PLACES_PAGE_DELAY_S", "2"))
+PLACES_MAX_PAGES = 3
+PLACES_PAGE_SIZE = 20
+
+# Types de lieux à rechercher
+PLACE_TYPES = ['supermarket', 'grocery_or_supermarket']
+
+# Mapping des enseignes courantes
+BRAND_MAPPING = {
+    'carrefour': 'carrefour',
+    'monoprix': 'monoprix',
+    'aldi': 'aldi',
+    'super u': 'u',
+    'hyper u': 'u',
+    'marché u': 'u',
+    'leclerc': 'leclerc',
+    'intermarché': 'intermarché',
+    'casino': 'casino',
+    'franprix': 'franprix',
+    'picard': 'picard'
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Session HTTP partagée (connexions keep-alive réutilisées entre les recherches)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def place_to_store(place):
+    """Convertit un résultat Google Places en magasin"""
+    name = place.get('name', 'Inconnu')
+
+    # Identifier la marque/enseigne à partir du nom
+    brand = ""
+    name_lower = name.lower()
+    for key, value in BRAND_MAPPING.items():
+        if key in name_lower:
+            brand = value
+            break
+
+    return Supermarket(
+        name,
+        brand,
+        place['geometry']['location']['lat'],
+        place['geometry']['location']['lng'],
+        place.get('vicinity', ''),  # Adresse formatée
+        is_opened=place.get('opening_hours', {}).get('open_now', None)
+    )
+
+
+class PlacesError(Exception):
+    """Google Places n'a pas répondu (erreur HTTP ou statut autre que OK/ZERO_RESULTS)"""
+
+
+def _search_place_type(params, deadline, add_places):
     """
-    Trouve les supermarchés autour de coordonnées données en utilisant Google Places API.
-    Beaucoup plus rapide et fiable qu'Overpass.
-    
+    Parcourt les pages de résultats d'un type de lieu tant que le budget le permet
+
     Args:
-        latitude: Latitude du point de recherche
-        longitude: Longitude du point de recherche
-        radius_km: Rayon de recherche en kilomètres
-    
-    Nécessite une clé API Google Maps avec Places API activée.
-    Définir la variable d'environnement GOOGLE_MAPS_API_KEY.
+        params: Paramètres Nearby Search (location, radius, type, key, language)
+        deadline: Échéance (time.monotonic) au-delà de laquelle on ne demande plus de page
+        add_places: Appelé avec les résultats de chaque page
+
+    Returns:
+        "complete", "truncated" si le budget a coupé la pagination avant la dernière page,
+        "saturated" si les PLACES_MAX_PAGES pages sont pleines (Google tronque à 60 lieux)
+
+    Raises:
+        PlacesError: statut Google en erreur
     """
+    session = get_session()
+    page_params = params
+    for page in range(PLACES_MAX_PAGES):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return "truncated"
+        response = session.get(PLACES_URL, params=page_params, timeout=min(10, remaining))
+        response.raise_for_status()
+        data = response.json()
+
+        if data['status'] == 'INVALID_REQUEST' and page > 0:
+            # Jeton pas encore actif : réessayer après le délai
+            time.sleep(PLACES_PAGE_DELAY_S)
+            continue
+        if data['status'] not in ['OK', 'ZERO_RESULTS']:
+            raise PlacesError(f"Google Places {data['status']}: {data.get('error_message', '')}".strip())
+
+        results = data.get('results', [])
+        add_places(results)
+
+        token = data.get('next_page_token')
+        if page == PLACES_MAX_PAGES - 1 and (token or len(results) >= PLACES_PAGE_SIZE):
+            return "saturated"
+        if not token:
+            return "complete"
+        if time.monotonic() + PLACES_PAGE_DELAY_S >= deadline:
+            return "truncated"
+        time.sleep(PLACES_PAGE_DELAY_S)
+        page_params = {'pagetoken': token, 'key': params['key']}
+    # Jeton jamais actif sur la dernière page
+    return "truncated"
+
+
+def google_api_key():
     # Vérifier la clé API
     api_key = os.getenv('GOOGLE_MAPS_API_KEY')
     if not api_key:
         raise ValueError("GOOGLE_MAPS_API_KEY non définie. Obtenez une clé sur https://console.cloud.google.com/")
-    
-    # Validation des coordonnées
+    return api_key
+
+
+def validate_coordinates(latitude, longitude):
     if not (-90 <= latitude <= 90):
         raise ValueError(f"Latitude invalide: {latitude}. Doit être entre -90 et 90.")
     if not (-180 <= longitude <= 180):
         raise ValueError(f"Longitude invalide: {longitude}. Doit être entre -180 et 180.")
+
+
+def fetch_supermarkets_gcp(latitude, longitude, radius_km=5, budget_s=PLACES_BUDGET_S, complete=False):
+    """
+    Interroge Google Places API (sans cache).
+    Les types de lieux sont interrogés en parallèle et les pages suivantes
+    (next_page_token) sont suivies tant que budget_s le permet.
     
-    # Rechercher les supermarchés avec Places API Nearby Search
-    places_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    radius_m = radius_km * 1000
-    
-    supermarkets = []
-    
-    # Types de lieux à rechercher
-    place_types = ['supermarket', 'grocery_or_supermarket']
-    
-    for place_type in place_types:
-        places_params = {
-            'location': f"{latitude},{longitude}",
-            'radius': radius_m,
-            'type': place_type,
-            'key': api_key,
-            'language': 'fr'
-        }
-        
-        try:
-            places_response = requests.get(places_url, params=places_params, timeout=10)
-            places_response.raise_for_status()
-            places_data = places_response.json()
-            
-            if places_data['status'] not in ['OK', 'ZERO_RESULTS']:
-                continue
-                
-            # Traiter les résultats
-            for place in places_data.get('results', []):
-                name = place.get('name', 'Inconnu')
-                place_lat = place['geometry']['location']['lat']
-                place_lng = place['geometry']['location']['lng']
-                is_opened = place.get('opening_hours', {}).get('open_now', None)
-                
-                # Extraire l'adresse formatée
-                vicinity = place.get('vicinity', '')
-                
-                # Identifier la marque/enseigne à partir du nom
-                brand = ""
-                name_lower = name.lower()
-                
-                # Mapping des enseignes courantes
-                brand_mapping = {
-                    'carrefour': 'carrefour',
-                    'monoprix': 'monoprix', 
-                    'aldi': 'aldi',
-                    'super u': 'u',
-                    'hyper u': 'u',
-                    'marché u': 'u',
-                    'leclerc': 'leclerc',
-                    'intermarché': 'intermarché',
-                    'casino': 'casino',
-                    'franprix': 'franprix',
-                    'picard': 'picard'
-                }
-                
-                for key, value in brand_mapping.items():
-                    if key in name_lower:
-                        brand = value
-                        break
-                
-                supermarkets.append({
-                    "name": name,
-                    "brand": brand,
-                    "latitude": place_lat,
-                    "longitude": place_lng,
-                    "address": vicinity,
-                    "is_opened": is_opened
-                })
-                
-        except Exception as e:
-            continue  # Continuer avec le type suivant si erreur
-    
-    # Supprimer les doublons basés sur le nom et la position
-    df = pd.DataFrame(supermarkets)
-    if not df.empty:
-        df = df.drop_duplicates(subset=['name', 'latitude', 'longitude'])
-        df = df.reset_index(drop=True)
+    Args:
+        latitude: Latitude du point de recherche
+        longitude: Longitude du point de recherche
+        radius_km: Rayon de recherche en kilomètres
+        budget_s: Temps maximal consacré à la pagination
+        complete: Lever IncompleteFetch si un type a échoué, si la pagination a été coupée
+            ou si un type a atteint la limite de 60 lieux
+
+    Returns:
+        Liste de Supermarket (is_opened renseigné)
+
+    Raises:
+        PlacesError: tous les types de lieux ont échoué
+        IncompleteFetch: réponse partielle (seulement avec complete=True)
+    """
+    api_key = google_api_key()
+    validate_coordinates(latitude, longitude)
     
-    return df
+    radius_m = radius_km * 1000
+    deadline = time.monotonic() + budget_s
 
+    # Doublons supprimés au fil de l'eau (nom et position), dans l'ordre d'arrivée
+    supermarkets = {}
+    lock = threading.Lock()
 
-def find_supermarkets(latitude, longitude, radius_km=5):
+    def add_places(places):
+        with lock:
+            for place in places:
+                store = place_to_store(place)
+                supermarkets.setdefault(store.key(), store)
+
+    with ThreadPoolExecutor(max_workers=len(PLACE_TYPES)) as executor:
+        futures = [
+            executor.submit(_search_place_type, {
+                'location': f"{latitude},{longitude}",
+                'radius': radius_m,
+                'type': place_type,
+                'key': api_key,
+                'language': 'fr'
+            }, deadline, add_places)
+            for place_type in PLACE_TYPES
+        ]
+        errors, outcomes = [], set()
+        for future in futures:
+            try:
+                outcomes.add(future.result())
+            except Exception as e:
+                print(f"Recherche Google Places en erreur: {e}")
+                errors.append(str(e))
+                continue  # Continuer avec les autres types si erreur
+
+    if len(errors) == len(PLACE_TYPES):
+        raise PlacesError(f"Google Places indisponible: {errors[0]}")
+    if complete and "saturated" in outcomes:
+        raise IncompleteFetch("plus de 60 lieux pour un type", list(supermarkets.values()), saturated=True)
+    if complete and (errors or "truncated" in outcomes):
+        raise IncompleteFetch("; ".join(errors) or "pagination coupée par le budget", list(supermarkets.values()))
+    return list(supermarkets.values())
+
+
+# Miroirs Overpass configurés par OVERPASS_MIRRORS
+overpass_mirrors = OverpassMirrors(mirror_urls(), get_session)
+
+
+def fetch_supermarkets_overpass(latitude, longitude, radius_km=5):
     """
-    Trouve les supermarchés et drives autour de coordonnées données avec Overpass.
+    Interroge Overpass (sans cache) pour les supermarchés et drives.
     
     Args:
         latitude: Latitude du point de recherche
         longitude: Longitude du point de recherche
         radius_km: Rayon de recherche en kilomètres
+
+    Returns:
+        Liste de Supermarket (is_opened non renseigné par OSM)
     """
     # 1. Validation des coordonnées
-    if not (-90 <= latitude <= 90):
-        raise ValueError(f"Latitude invalide: {latitude}. Doit être entre -90 et 90.")
-    if not (-180 <= longitude <= 180):
-        raise ValueError(f"Longitude invalide: {longitude}. Doit être entre -180 et 180.")
+    validate_coordinates(latitude, longitude)
 
     # 2. Construire la requête Overpass (OpenStreetMap)
-    overpass_url = "https://overpass-api.de/api/interpreter"
     query = f"""
     [out:json][timeout:25];
     (
@@ -138,44 +243,8 @@ def find_supermarkets(latitude, longitude, radius_km=5):
     out body;
     """
     
-    max_retries = 3
-    
-    for attempt in range(max_retries):
-        try:
-            response = requests.get(overpass_url, params={'data': query}, timeout=30)
-            
-            if response.status_code == 200:
-                if not response.text.strip():
-                    raise ValueError("Réponse vide de l'API Overpass")
-                data = response.json()
-                break
-                
-            elif response.status_code == 504:  
-                if attempt < max_retries - 1:
-                    continue
-                else:
-                    raise ValueError(f"API Overpass indisponible après {max_retries} tentatives (504)")
-            
-            else:
-                raise ValueError(f"Erreur API Overpass: status {response.status_code}")
-                
-        except requests.exceptions.Timeout:
-            if attempt < max_retries - 1:
-                continue
-            else:
-                raise ValueError(f"Timeout après {max_retries} tentatives")
-                
-        except requests.exceptions.JSONDecodeError as e:
-            if attempt < max_retries - 1:
-                continue
-            else:
-                raise ValueError(f"Réponse invalide après {max_retries} tentatives")
-                
-        except Exception as e:
-            if attempt < max_retries - 1:
-                continue
-            else:
-                raise
+    # 3. Interroger les miroirs (requête doublée sur le miroir suivant s'il tarde)
+    data = overpass_mirrors.query(query)
 
     # 4. Extraire les résultats
     supermarkets = []
@@ -190,16 +259,120 @@ def find_supermarkets(latitude, longitude, radius_km=5):
                 tags.get("addr:city")
             ])
         )
-        supermarkets.append({
-            "name": name,
-            "brand": brand,
-            "latitude": element["lat"],
-            "longitude": element["lon"],
-            "address": addr
-        })
+        supermarkets.append(Supermarket(name, brand, element["lat"], element["lon"], addr))
+
+    # Un même magasin peut correspondre à plusieurs filtres de la requête
+    return dedupe(supermarkets)
+
+
+_tile_caches = {}
+_tile_caches_lock = threading.Lock()
+
+# Une tuile n'est enregistrée que si tous les types et toutes les pages ont été lus
+TILE_SOURCES = {
+    "gcp": partial(fetch_supermarkets_gcp, complete=True),
+    "overpass": fetch_supermarkets_overpass,
+}
+
+
+def get_tile_cache(source: str) -> TileCache:
+    """Cache de tuiles d'une source, créé au premier appel"""
+    with _tile_caches_lock:
+        if source not in _tile_caches:
+            _tile_caches[source] = TileCache(source, TILE_SOURCES[source])
+        return _tile_caches[source]
+
 
-    df = pd.DataFrame(supermarkets)
-    return df
+def tile_cache_stats():
+    with _tile_caches_lock:
+        return {source: cache.status() for source, cache in _tile_caches.items()}
+
+
+def find_supermarkets_gcp(latitude, longitude, radius_km=5):
+    """
+    Trouve les supermarchés autour de coordonnées données en utilisant Google Places API.
+    Beaucoup plus rapide et fiable qu'Overpass.
+    Les réponses sont mises en cache par tuiles geohash (GEO_TILE_CACHE=0 pour désactiver).
+    
+    Args:
+        latitude: Latitude du point de recherche
+        longitude: Longitude du point de recherche
+        radius_km: Rayon de recherche en kilomètres
+
+    Returns:
+        Liste de Supermarket (records.to_dataframe pour un DataFrame pandas) ; is_opened
+        n'est renseigné que pour les tuiles remplies par cet appel, None depuis le cache
+    
+    Nécessite une clé API Google Maps avec Places API activée.
+    Définir la variable d'environnement GOOGLE_MAPS_API_KEY.
+    """
+    google_api_key()
+    validate_coordinates(latitude, longitude)
+    if TILE_CACHE_ENABLED:
+        stores = get_tile_cache("gcp").query(latitude, longitude, radius_km)
+    else:
+        stores = fetch_supermarkets_gcp(latitude, longitude, radius_km)
+    return stores
+
+
+# Index hors-ligne construit avec python -m geolocation.offline_index build
+OFFLINE_INDEX_PATH = os.getenv("SUPERMARKET_INDEX_PATH", "")
+
+_offline_index = None
+_offline_index_lock = threading.Lock()
+
+
+def get_offline_index():
+    """Index hors-ligne chargé au premier appel, None si SUPERMARKET_INDEX_PATH n'est pas défini"""
+    global _offline_index
+    if not OFFLINE_INDEX_PATH:
+        return None
+    with _offline_index_lock:
+        if _offline_index is None:
+            start = time.monotonic()
+            _offline_index = SpatialIndex.load(OFFLINE_INDEX_PATH)
+            print(f"Index hors-ligne chargé : {_offline_index.meta['count']} magasins en {time.monotonic() - start:.2f}s")
+        return _offline_index
+
+
+def find_supermarkets_offline(latitude, longitude, radius_km=5):
+    """
+    Trouve les supermarchés dans l'index OSM hors-ligne, sans réseau.
+
+    Args:
+        latitude: Latitude du point de recherche
+        longitude: Longitude du point de recherche
+        radius_km: Rayon de recherche en kilomètres
+    """
+    validate_coordinates(latitude, longitude)
+    index = get_offline_index()
+    if index is None:
+        raise ValueError("SUPERMARKET_INDEX_PATH non défini : pas d'index hors-ligne")
+    return index.query(latitude, longitude, radius_km)
+
+
+def find_supermarkets(latitude, longitude, radius_km=5):
+    """
+    Trouve les supermarchés et drives autour de coordonnées données avec Overpass.
+    Les réponses sont mises en cache par tuiles geohash (GEO_TILE_CACHE=0 pour désactiver).
+    Avec un index hors-ligne (SUPERMARKET_INDEX_PATH), aucune requête réseau n'est faite.
+    
+    Args:
+        latitude: Latitude du point de recherche
+        longitude: Longitude du point de recherche
+        radius_km: Rayon de recherche en kilomètres
+
+    Returns:
+        Liste de Supermarket (records.to_dataframe pour un DataFrame pandas)
+    """
+    validate_coordinates(latitude, longitude)
+    if get_offline_index() is not None:
+        return find_supermarkets_offline(latitude, longitude, radius_km)
+    if TILE_CACHE_ENABLED:
+        stores = get_tile_cache("overpass").query(latitude, longitude, radius_km)
+    else:
+        stores = fetch_supermarkets_overpass(latitude, longitude, radius_km)
+    return stores
 
 # --- Exemple d'utilisation ---
 if __name__ == "__main__":
@@ -210,7 +383,8 @@ if __name__ == "__main__":
     try:
         resultats_gcp = find_supermarkets_gcp(lat, lon, radius_km=2)
         print("Résultats Google Maps :")
-        print(resultats_gcp)
+        for store in resultats_gcp:
+            print(store)
         print(f"Trouvé {len(resultats_gcp)} magasins")
     except Exception as e:
         print(f"Erreur Google Maps: {e}")
@@ -219,7 +393,8 @@ if __name__ == "__main__":
     try:
         resultats_overpass = find_supermarkets(lat, lon, radius_km=2)
         print("Résultats Overpass :")
-        print(resultats_overpass)
+        for store in resultats_overpass:
+            print(store)
         print(f"Trouvé {len(resultats_overpass)} magasins")
     except Exception as e:
         print(f"Erreur Overpass: {e}")
@@ -0,0 +1,176 @@
+"""
+Index spatial hors-ligne des supermarchés construit depuis un extrait OpenStreetMap :
+grille régulière en degrés, magasins triés par case et stockés dans des tableaux compacts.
+Les recherches par rayon se font dans le processus, sans réseau.
+
+Construction :
+    python -m geolocation.offline_index build extrait.osm.pbf -o supermarkets.idx
+    python -m geolocation.offline_index build overpass.json -o supermarkets.idx
+
+Le format .osm.pbf nécessite le paquet optionnel osmium (pip install osmium) ;
+le JSON est la sortie d'Overpass ("out body;").
+"""
+import argparse
+import json
+import math
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List
+
+from geolocation.records import Supermarket
+from geolocation.tiles import KM_PER_DEGREE, haversine_km
+
+MAGIC = b"SMIDX1\n"
+# Taille d'une case de la grille (~5,5 km en latitude)
+CELL_DEG = 0.05
+GRID_COLUMNS = int(360 / CELL_DEG)
+
+SHOP_TAGS = {"supermarket", "convenience"}
+
+
+def is_supermarket(tags: Dict) -> bool:
+    """Mêmes critères que la requête Overpass de find_supermarkets"""
+    return tags.get("shop") in SHOP_TAGS or tags.get("drive_through") == "yes"
+
+
+def node_to_store(tags: Dict, latitude: float, longitude: float) -> Supermarket:
+    address = ", ".join(filter(None, [tags.get("addr:street"), tags.get("addr:postcode"), tags.get("addr:city")]))
+    return Supermarket(tags.get("name", "Inconnu"), tags.get("brand", ""), latitude, longitude, address)
+
+
+def read_overpass_json(path: str) -> List[Supermarket]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return [
+        node_to_store(element.get("tags", {}), element["lat"], element["lon"])
+        for element in data.get("elements", [])
+        if element.get("type", "node") == "node" and "lat" in element and is_supermarket(element.get("tags", {}))
+    ]
+
+
+def read_osm_pbf(path: str) -> List[Supermarket]:
+    try:
+        import osmium
+    except ImportError:
+        raise RuntimeError("Le paquet osmium est nécessaire pour lire un .osm.pbf (pip install osmium)")
+
+    stores = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, node):
+            tags = {tag.k: tag.v for tag in node.tags}
+            if is_supermarket(tags) and node.location.valid():
+                stores.append(node_to_store(tags, node.location.lat, node.location.lon))
+
+    Handler().apply_file(path)
+    return stores
+
+
+def cell_of(latitude: float, longitude: float) -> int:
+    row = int(math.floor((latitude + 90) / CELL_DEG))
+    column = int(math.floor((longitude + 180) / CELL_DEG)) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+class SpatialIndex:
+
+    def __init__(self, cells: array, latitudes: array, longitudes: array, records: List[list], meta: Dict):
+        self.cells = cells
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.records = records  # [name, brand, address] dans l'ordre des tableaux
+        self.meta = meta
+
+    @classmethod
+    def build(cls, stores: List[Supermarket], source: str = "") -> "SpatialIndex":
+        stores = sorted(stores, key=lambda s: cell_of(s.latitude, s.longitude))
+        return cls(
+            array("q", (cell_of(s.latitude, s.longitude) for s in stores)),
+            array("d", (s.latitude for s in stores)),
+            array("d", (s.longitude for s in stores)),
+            [[s.name, s.brand, s.address] for s in stores],
+            {"count": len(stores), "cell_deg": CELL_DEG, "built_at": round(time.time()), "source": source},
+        )
+
+    def save(self, path: str):
+        header = json.dumps({**self.meta, "records": self.records}, ensure_ascii=False).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            self.cells.tofile(f)
+            self.latitudes.tofile(f)
+            self.longitudes.tofile(f)
+
+    @classmethod
+    def load(cls, path: str) -> "SpatialIndex":
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} n'est pas un index de supermarchés")
+            (length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(length).decode("utf-8"))
+            if header["cell_deg"] != CELL_DEG:
+                raise ValueError(f"Index construit avec une grille de {header['cell_deg']}°, à reconstruire")
+            count = header["count"]
+            cells, latitudes, longitudes = array("q"), array("d"), array("d")
+            cells.fromfile(f, count)
+            latitudes.fromfile(f, count)
+            longitudes.fromfile(f, count)
+        records = header.pop("records")
+        return cls(cells, latitudes, longitudes, records, header)
+
+    def query(self, latitude: float, longitude: float, radius_km: float) -> List[Supermarket]:
+        """Magasins à moins de radius_km, triés par distance"""
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+        row_min = int(math.floor((max(-90.0, latitude - dlat) + 90) / CELL_DEG))
+        row_max = int(math.floor((min(90.0, latitude + dlat) + 90) / CELL_DEG))
+        col_min = int(math.floor((longitude - dlon + 180) / CELL_DEG))
+        col_max = int(math.floor((longitude + dlon + 180) / CELL_DEG))
+
+        stores = []
+        for row in range(row_min, row_max + 1):
+            for column in range(col_min, col_max + 1):
+                cell = row * GRID_COLUMNS + column % GRID_COLUMNS
+                for i in range(bisect_left(self.cells, cell), bisect_right(self.cells, cell)):
+                    distance = haversine_km(latitude, longitude, self.latitudes[i], self.longitudes[i])
+                    if distance <= radius_km:
+                        name, brand, address = self.records[i]
+                        stores.append(Supermarket(
+                            name, brand, self.latitudes[i], self.longitudes[i], address,
+                            distance_km=round(distance, 3)
+                        ))
+        stores.sort(key=lambda store: store.distance_km)
+        return stores
+
+
+def build_index(input_path: str, output_path: str) -> SpatialIndex:
+    """Construit et enregistre l'index depuis un .osm.pbf ou un JSON Overpass"""
+    if input_path.endswith(".pbf"):
+        stores = read_osm_pbf(input_path)
+    else:
+        stores = read_overpass_json(input_path)
+    index = SpatialIndex.build(stores, source=os.path.basename(input_path))
+    index.save(output_path)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m geolocation.offline_index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Construire l'index depuis un extrait OSM")
+    build.add_argument("input", help="Fichier .osm.pbf ou JSON Overpass")
+    build.add_argument("-o", "--output", default="supermarkets.idx", help="Fichier index à écrire")
+    args = parser.parse_args(argv)
+
+    start = time.monotonic()
+    index = build_index(args.input, args.output)
+    print(f"{index.meta['count']} magasins indexés dans {args.output} en {time.monotonic() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Requêtes Overpass sur plusieurs miroirs : si le premier miroir ne répond pas après un court
+délai, la même requête part sur le suivant et la première réponse valide gagne. Un miroir en
+échec est écarté pendant un délai exponentiel avec gigue.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List
+
+DEFAULT_MIRRORS = [
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://overpass.private.coffee/api/interpreter",
+]
+
+# Délai avant d'interroger le miroir suivant
+OVERPASS_HEDGE_DELAY_S = float(os.getenv("OVERPASS_HEDGE_DELAY_S", "3"))
+OVERPASS_TIMEOUT_S = float(os.getenv("OVERPASS_TIMEOUT_S", "25"))
+# Temps total accordé à une requête, tous miroirs confondus
+OVERPASS_BUDGET_S = float(os.getenv("OVERPASS_BUDGET_S", "30"))
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 300.0
+
+
+def mirror_urls() -> List[str]:
+    """Miroirs configurés par OVERPASS_MIRRORS (liste séparée par des virgules)"""
+    configured = os.getenv("OVERPASS_MIRRORS", "")
+    urls = [url.strip() for url in configured.split(",") if url.strip()]
+    return urls or list(DEFAULT_MIRRORS)
+
+
+class Mirror:
+
+    def __init__(self, url: str):
+        self.url = url
+        self.consecutive_failures = 0
+        self.backoff_until = 0.0
+        self.latency_s = None
+        self.stats = {"requests": 0, "successes": 0, "failures": 0, "wins": 0}
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.backoff_until
+
+    def succeeded(self, latency_s: float):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.backoff_until = 0.0
+            self.stats["successes"] += 1
+            self.latency_s = latency_s if self.latency_s is None else 0.8 * self.latency_s + 0.2 * latency_s
+
+    def failed(self):
+        """Backoff exponentiel avec gigue : 5 s, 10 s, 20 s... jusqu'à 5 min (±50 %)"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self.stats["failures"] += 1
+            delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (self.consecutive_failures - 1))
+            self.backoff_until = time.monotonic() + delay * random.uniform(0.5, 1.5)
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "available": self.available(),
+                "consecutive_failures": self.consecutive_failures,
+                "backoff_s": round(max(0.0, self.backoff_until - time.monotonic()), 1),
+                "latency_s": round(self.latency_s, 2) if self.latency_s is not None else None,
+                **self.stats
+            }
+
+
+class OverpassMirrors:
+
+    def __init__(self, urls: List[str], get_session, hedge_delay_s: float = OVERPASS_HEDGE_DELAY_S,
+                 timeout_s: float = OVERPASS_TIMEOUT_S, budget_s: float = OVERPASS_BUDGET_S):
+        self.mirrors = [Mirror(url) for url in urls]
+        self.get_session = get_session
+        self.hedge_delay_s = hedge_delay_s
+        self.timeout_s = timeout_s
+        self.budget_s = budget_s
+
+    def _ordered(self) -> List[Mirror]:
+        """Miroirs disponibles dans l'ordre configuré, puis ceux en backoff (fin la plus proche d'abord)"""
+        available = [m for m in self.mirrors if m.available()]
+        waiting = sorted((m for m in self.mirrors if not m.available()), key=lambda m: m.backoff_until)
+        return available + waiting
+
+    def _fetch(self, mirror: Mirror, query: str, timeout: float) -> Dict:
+        with mirror._lock:
+            mirror.stats["requests"] += 1
+        start = time.monotonic()
+        try:
+            response = self.get_session().get(mirror.url, params={'data': query}, timeout=timeout)
+            if response.status_code != 200:
+                raise ValueError(f"status {response.status_code}")
+            if not response.text.strip():
+                raise ValueError("Réponse vide")
+            data = response.json()
+            if "elements" not in data or "runtime error" in data.get("remark", ""):
+                raise ValueError(data.get("remark", "Réponse sans éléments"))
+        except Exception:
+            mirror.failed()
+            raise
+        mirror.succeeded(time.monotonic() - start)
+        return data
+
+    def query(self, query: str) -> Dict:
+        """
+        Exécute une requête Overpass QL
+
+        Raises:
+            ValueError: aucun miroir n'a donné de réponse valide dans le budget
+        """
+        deadline = time.monotonic() + self.budget_s
+        order = self._ordered()
+        executor = ThreadPoolExecutor(max_workers=len(order))
+        futures = {}
+        errors = []
+
+        def launch():
+            mirror = order[len(futures)]
+            timeout = max(0.1, min(self.timeout_s, deadline - time.monotonic()))
+            futures[executor.submit(self._fetch, mirror, query, timeout)] = mirror
+
+        try:
+            launch()
+            pending = set(futures)
+            while pending or len(futures) < len(order):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                can_hedge = len(futures) < len(order)
+                done, pending = wait(
+                    pending, timeout=min(self.hedge_delay_s, remaining) if can_hedge else remaining,
+                    return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        errors.append(f"{futures[future].url}: {e}")
+                        continue
+                    with futures[future]._lock:
+                        futures[future].stats["wins"] += 1
+                    return data
+                # Pas de réponse valide à temps (ou échec) : miroir suivant
+                if can_hedge:
+                    launch()
+                    pending = {f for f in futures if not f.done()}
+        finally:
+            # Les requêtes perdantes se terminent en arrière-plan (bornées par leur timeout)
+            executor.shutdown(wait=False)
+
+        raise ValueError(f"API Overpass indisponible ({'; '.join(errors) or 'délai dépassé'})")
+
+    def status(self) -> Dict:
+        return {mirror.url: mirror.status() for mirror in self.mirrors}
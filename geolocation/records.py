@@ -0,0 +1,38 @@
+"""
+Enregistrements légers des supermarchés trouvés (NamedTuple), sans pandas
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+
+class Supermarket(NamedTuple):
+    name: str
+    brand: str
+    latitude: float
+    longitude: float
+    address: str
+    is_opened: Optional[bool] = None  # Google Places uniquement
+    distance_km: Optional[float] = None  # Rempli par les recherches par rayon
+
+    def key(self):
+        """Identité d'un magasin pour le dédoublonnage : nom et position"""
+        return self.name, self.latitude, self.longitude
+
+
+def dedupe(stores: Iterable[Supermarket]) -> List[Supermarket]:
+    """Supprime les doublons (nom et position) en gardant l'ordre d'arrivée"""
+    unique = {}
+    for store in stores:
+        unique.setdefault(store.key(), store)
+    return list(unique.values())
+
+
+def to_dicts(stores: Iterable[Supermarket]) -> List[Dict]:
+    """Format JSON des endpoints"""
+    return [store._asdict() for store in stores]
+
+
+def to_dataframe(stores: Iterable[Supermarket]):
+    """Adaptateur optionnel vers pandas (importé seulement ici)"""
+    import pandas as pd
+
+    return pd.DataFrame(list(stores), columns=Supermarket._fields)
@@ -0,0 +1,304 @@
+"""
+Cache géographique des supermarchés par tuiles geohash : une recherche par rayon charge
+les tuiles qui couvrent le cercle (mémoire, puis SQLite, puis API) et filtre les magasins
+à la distance exacte
+"""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from geolocation.records import Supermarket
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+TILE_CACHE_ENABLED = os.getenv("GEO_TILE_CACHE", "1") != "0"
+TILE_CACHE_PATH = os.getenv("GEO_TILE_CACHE_PATH", "geo_tiles.sqlite3")
+# Les magasins changent en mois : tuile valable 30 jours, rafraîchie en arrière-plan après 7
+TILE_TTL_S = float(os.getenv("GEO_TILE_TTL_S", str(30 * 24 * 3600)))
+TILE_REFRESH_S = float(os.getenv("GEO_TILE_REFRESH_S", str(7 * 24 * 3600)))
+# Remplissages de tuiles simultanés lors d'un premier passage dans une zone
+TILE_FETCH_WORKERS = 8
+# Rayon maximal d'une requête de remplissage (Google Places refuse au-delà de 50 km) ;
+# les recherches plus larges interrogent la source directement, sans cache
+TILE_MAX_QUERY_KM = float(os.getenv("GEO_TILE_MAX_QUERY_KM", "50"))
+
+
+class IncompleteFetch(Exception):
+    """
+    Remplissage en partie seulement (une source en erreur, pagination coupée) : les
+    magasins trouvés servent la recherche en cours mais la tuile n'est pas enregistrée.
+    saturated : la source a atteint sa limite de résultats, la zone est trop dense pour
+    une requête par tuile
+    """
+
+    def __init__(self, message: str, stores: List[Supermarket], saturated: bool = False):
+        super().__init__(message)
+        self.stores = stores
+        self.saturated = saturated
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_bbox(geohash: str):
+    """(lat_min, lat_max, lon_min, lon_max) d'une tuile"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def cell_size_deg(precision: int):
+    """(hauteur, largeur) d'une tuile en degrés"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def precision_for_radius(radius_km: float, latitude: float = 0.0) -> int:
+    """
+    Plus grande précision dont les tuiles mesurent au moins le rayon en hauteur et en
+    largeur : un cercle est couvert par 4 tuiles au plus le plus souvent (9 au pire),
+    soit autant de requêtes à l'API lors d'un premier passage
+    """
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    for precision in range(7, 2, -1):
+        height, width = cell_size_deg(precision)
+        if min(height, width * cos_lat) * KM_PER_DEGREE >= radius_km:
+            return precision
+    return 3
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def covering_tiles(latitude: float, longitude: float, radius_km: float, precision: int) -> List[str]:
+    """Tuiles qui recouvrent la boîte englobante du cercle"""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    cell_lat, cell_lon = cell_size_deg(precision)
+
+    tiles = []
+    lat = max(-90.0, latitude - dlat)
+    while True:
+        lon = longitude - dlon
+        while True:
+            tile = geohash_encode(lat, ((lon + 180) % 360) - 180, precision)
+            if tile not in tiles:
+                tiles.append(tile)
+            if lon >= longitude + dlon:
+                break
+            lon = min(lon + cell_lon, longitude + dlon)
+        if lat >= min(90.0, latitude + dlat):
+            break
+        lat = min(lat + cell_lat, latitude + dlat, 90.0)
+    return tiles
+
+
+def tile_query(geohash: str):
+    """Centre et rayon (km) de la requête qui couvre toute la tuile"""
+    lat_min, lat_max, lon_min, lon_max = geohash_bbox(geohash)
+    center_lat, center_lon = (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+    return center_lat, center_lon, haversine_km(center_lat, center_lon, lat_max, lon_max)
+
+
+def in_tile(geohash: str, store: Supermarket) -> bool:
+    lat_min, lat_max, lon_min, lon_max = geohash_bbox(geohash)
+    return lat_min <= store.latitude < lat_max and lon_min <= store.longitude < lon_max
+
+
+class TileCache:
+    """
+    Tuiles d'une source (Google Places ou Overpass).
+    fetch(latitude, longitude, radius_km) -> [Supermarket] remplit une tuile ; il lève
+    IncompleteFetch si sa réponse est partielle, toute autre exception si elle a échoué.
+    Les tuiles sont enregistrées sans is_opened : seul le remplissage le renvoie.
+    Une tuile dont la réponse est saturée est marquée dense (en mémoire, refresh_s) : les
+    recherches qui la touchent interrogent la source sur leur seul cercle, sans cache.
+    """
+
+    def __init__(self, source: str, fetch, path: str = TILE_CACHE_PATH,
+                 ttl_s: float = TILE_TTL_S, refresh_s: float = TILE_REFRESH_S, max_query_km: float = TILE_MAX_QUERY_KM):
+        self.source = source
+        self.fetch = fetch
+        self.max_query_km = max_query_km
+        self.ttl_s = ttl_s
+        self.refresh_s = refresh_s
+        self._memory = {}
+        self._refreshing = set()
+        self._dense = {}
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "fetches": 0, "incomplete": 0, "saturated": 0, "uncached": 0, "background_refreshes": 0}
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tiles (source TEXT, geohash TEXT, fetched_at REAL, stores TEXT, "
+                "PRIMARY KEY (source, geohash))"
+            )
+            self._db.commit()
+
+    def _load(self, geohash: str):
+        """(fetched_at, magasins) depuis la mémoire ou le disque, None si absente"""
+        with self._lock:
+            entry = self._memory.get(geohash)
+            if entry is not None:
+                self.stats["memory_hits"] += 1
+                return entry
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT fetched_at, stores FROM tiles WHERE source = ? AND geohash = ?", (self.source, geohash)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = (row[0], [Supermarket(**fields) for fields in json.loads(row[1])])
+            self._memory[geohash] = entry
+            self.stats["disk_hits"] += 1
+            return entry
+
+    def _fetch(self, latitude: float, longitude: float, radius_km: float):
+        """(magasins, erreur) : une réponse partielle est servie mais jamais enregistrée"""
+        try:
+            return self.fetch(latitude, longitude, radius_km), None
+        except IncompleteFetch as e:
+            print(f"Réponse {self.source} incomplète, non mise en cache: {e}")
+            with self._lock:
+                self.stats["incomplete"] += 1
+            return e.stores, e
+
+    def _fill(self, geohash: str):
+        """
+        Magasins de la tuile tels que la source vient de les renvoyer (is_opened compris)
+
+        Returns:
+            None si la réponse est saturée : la tuile est marquée dense
+        """
+        fetched, incomplete = self._fetch(*tile_query(geohash))
+        if incomplete is not None and incomplete.saturated:
+            with self._lock:
+                self.stats["saturated"] += 1
+                self._dense[geohash] = time.time()
+                # Une ancienne version de la tuile était elle aussi tronquée
+                self._memory.pop(geohash, None)
+                if self._db is not None:
+                    self._db.execute("DELETE FROM tiles WHERE source = ? AND geohash = ?", (self.source, geohash))
+                    self._db.commit()
+            return None
+        stores = [store for store in fetched if in_tile(geohash, store)]
+        if incomplete is not None:
+            return stores
+        # L'ouverture change dans la journée : jamais servie depuis une tuile de 30 jours
+        entry = (time.time(), [store._replace(is_opened=None) for store in stores])
+        with self._lock:
+            self.stats["fetches"] += 1
+            self._memory[geohash] = entry
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO tiles (source, geohash, fetched_at, stores) VALUES (?, ?, ?, ?)",
+                    (self.source, geohash, entry[0], json.dumps([store._asdict() for store in entry[1]]))
+                )
+                self._db.commit()
+        return stores
+
+    def _refresh_in_background(self, geohash: str):
+        with self._lock:
+            if geohash in self._refreshing:
+                return
+            self._refreshing.add(geohash)
+            self.stats["background_refreshes"] += 1
+
+        def refresh():
+            try:
+                self._fill(geohash)
+            except Exception as e:
+                print(f"Rafraîchissement de la tuile {geohash} en erreur: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(geohash)
+
+        threading.Thread(target=refresh, name=f"tile-{geohash}", daemon=True).start()
+
+    def tile(self, geohash: str):
+        """Magasins de la tuile, None si elle est trop dense pour être mise en cache"""
+        with self._lock:
+            marked_at = self._dense.get(geohash)
+        if marked_at is not None and time.time() - marked_at < self.refresh_s:
+            return None
+        entry = self._load(geohash)
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age < self.ttl_s:
+                if age >= self.refresh_s:
+                    self._refresh_in_background(geohash)
+                return entry[1]
+        return self._fill(geohash)
+
+    def query(self, latitude: float, longitude: float, radius_km: float) -> List[Supermarket]:
+        """Magasins à moins de radius_km, triés par distance"""
+        tiles = covering_tiles(latitude, longitude, radius_km, precision_for_radius(radius_km, latitude))
+        chunks = None
+        if max(tile_query(tile)[2] for tile in tiles) <= self.max_query_km:
+            with ThreadPoolExecutor(max_workers=min(TILE_FETCH_WORKERS, len(tiles))) as executor:
+                chunks = list(executor.map(self.tile, tiles))
+
+        if chunks is None or None in chunks:
+            # Tuiles trop grandes pour une seule requête, ou zone trop dense : recherche
+            # directe sur le cercle demandé, sans cache
+            with self._lock:
+                self.stats["uncached"] += 1
+            candidates = self._fetch(latitude, longitude, radius_km)[0]
+        else:
+            candidates = [store for chunk in chunks for store in chunk]
+
+        stores = []
+        for store in candidates:
+            distance = haversine_km(latitude, longitude, store.latitude, store.longitude)
+            if distance <= radius_km:
+                stores.append(store._replace(distance_km=round(distance, 3)))
+        stores.sort(key=lambda store: store.distance_km)
+        return stores
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {"tiles_in_memory": len(self._memory), "refreshing": len(self._refreshing),
+                    "dense_tiles": len(self._dense), **self.stats}
@@ -1,10 +1,16 @@
-import concurrent.futures
 from typing import List, Dict, Optional
 import asyncio
 import os
-import gc
+import json
+import time
+
+# Début du chronométrage du démarrage (phase "imports")
+IMPORTS_STARTED_AT = time.monotonic()
+
+from contextlib import asynccontextmanager
 import psutil
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 # Charger les variables d'environnement depuis .env si le fichier existe (développement local)
@@ -26,17 +32,69 @@ def load_env_file():
 # Charger la configuration
 load_env_file()
 
-from stores.u import get_price_u
-from stores.carrefour import get_price_carrefour
-from stores.aldi import get_price_aldi
-from stores.monoprix import get_price_monoprix
+from stores import u, carrefour, aldi, monoprix
+from stores.browser_pool import get_async_browser_pool
+from stores.resources import resource_stats
+from stores.http_fast import fast_path_stats, lookup_with_fast_path_async
+from stores.deadline import deadline, expired, remaining_s
+from stores.common import warm_up_context_async
+from scraping.cache import get_price_cache, cache_key, LOCATION_DEPENDENT
+from scraping.singleflight import price_lookups_async
+from scraping.admission import memory_admission
+from scraping.scheduler import ScrapeScheduler
+from scraping.autotune import ConcurrencyTuner
+from scraping.cancellation import ClientDisconnected, cancellation_stats, run_while_connected
+from scraping.hedging import HedgePolicy
+from scraping.breaker import CircuitBreaker, get_breaker, breaker_stats
+from scraping.jobs import JobQueue, QueueFull, make_backend
+from scraping.startup import startup
+from regex.utils import normalize
+
+from geolocation.find_supermarches import (
+    find_supermarkets,
+    find_supermarkets_gcp,
+    find_supermarkets_offline,
+    get_offline_index,
+    overpass_mirrors,
+    tile_cache_stats,
+)
+from geolocation.records import to_dicts
+
+startup.record("imports", time.monotonic() - IMPORTS_STARTED_AT)
+
+# WARMUP=0 désactive le préchauffage (le premier panier lance alors les navigateurs)
+WARMUP_ENABLED = os.getenv("WARMUP", "1") != "0"
+# Navigateurs lancés au démarrage, et magasins préchauffés en même temps sur eux
+WARMUP_BROWSERS = max(1, int(os.getenv("WARMUP_BROWSERS", "1")))
+WARMUP_TIMEOUT_MS = int(os.getenv("WARMUP_TIMEOUT_MS", "15000"))
+# U est dans DISABLED_STORES : inutile de le préchauffer
+WARMUP_STORES = [s for s in os.getenv("WARMUP_STORES", "carrefour,aldi,monoprix").split(",") if s]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Préchauffage en tâche de fond au démarrage (suivi par /ready), fermeture des
+    navigateurs du pool async à l'arrêt
+    """
+    warm_up_task = asyncio.create_task(warm_up()) if WARMUP_ENABLED else None
+    if warm_up_task is None:
+        startup.mark_ready()
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+        try:
+            await warm_up_task
+        except asyncio.CancelledError:
+            pass
+    await get_async_browser_pool().close()
 
-from geolocation.find_supermarches import find_supermarkets, find_supermarkets_gcp
 
 app = FastAPI(
     title="Comparateur de Prix API",
     description="API pour comparer les prix d'articles dans différents supermarchés",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
@@ -47,6 +105,24 @@ WORKERS = {
     "monoprix": 6
 }
 
+STORE_MODULES = {"u": u, "carrefour": carrefour, "aldi": aldi, "monoprix": monoprix}
+
+# Recherches désactivées dans scrape_single_item_async (toujours "non trouvé") : hors ordonnanceur,
+# disjoncteur et autotuning, qui les prendraient pour un site en panne
+DISABLED_STORES = {"u"}
+
+# Places de scraping du processus : WORKERS par magasin, SCRAPE_GLOBAL_LIMIT au total,
+# quel que soit le nombre de requêtes et d'endpoints en cours
+scrape_scheduler = ScrapeScheduler(WORKERS)
+# Les limites par magasin évoluent ensuite selon la latence et les erreurs observées
+concurrency_tuner = ConcurrencyTuner(scrape_scheduler)
+# Recherches doublées au-delà du p95 du magasin (SCRAPE_HEDGING=1)
+hedge_policy = HedgePolicy()
+# Un disjoncteur par magasin (BREAKER_FAILURES échecs consécutifs, BREAKER_RESET_S)
+for store_name in WORKERS:
+    if store_name not in DISABLED_STORES:
+        CircuitBreaker(store_name)
+
 class Item(BaseModel):
     name: str
     brand: Optional[str] = ""
@@ -56,11 +132,13 @@ class PriceEstimationRequest(BaseModel):
     item: Item
     store: str
     city: Optional[str] = "Le port-marly"
+    deadline_ms: Optional[int] = None
 
 class ListPriceEstimationRequest(BaseModel):
     items: List[Item]
     store: str
     city: Optional[str] = "Le port-marly"
+    deadline_ms: Optional[int] = None
 
 class ClosestStoreRequest(BaseModel):
     latitude: float
@@ -72,34 +150,142 @@ class ClosestStoreGroceries(BaseModel):
     longitude: float
     max_distance_km: Optional[float] = 5.0
     items: List[Item]
+    deadline_ms: Optional[int] = None
+
+
+async def search_single_item_async(store: str, city: str, item: Dict) -> Dict:
+    """
+    Recherche le prix d'un seul article dans un magasin donné (cache, puis HTTP, puis navigateur),
+    exécutée directement sur la boucle asyncio
+    """
+    cached = get_price_cache().get(store, city, item)
+    if cached is not None:
+        return cached
+
+    result, shared = await price_lookups_async.do(cache_key(store, city, item), lambda: scheduled_scrape_async(store, city, item))
+    return {**result, "item": item, "coalesced": True} if shared else result
 
 
-def search_single_item(store: str, city: str, item: Dict) -> Dict:
-    """Recherche le prix d'un seul article dans un magasin donné"""
+async def scheduled_scrape_async(store: str, city: str, item: Dict) -> Dict:
+    """
+    Scraping lancé quand l'ordonnanceur global donne une place pour ce magasin
+    et que le budget mémoire le permet
+    """
+    if store.lower() not in WORKERS or store.lower() in DISABLED_STORES:
+        return await scrape_single_item_async(store, city, item)
+    breaker = get_breaker(store.lower())
+    if not breaker.allow():
+        return circuit_open_result(store, city, item)
+    start = None
+    try:
+        async with scrape_scheduler.slot(store.lower()), memory_admission.admit():
+            start = time.monotonic()
+            result = await hedge_policy.run(
+                store.lower(),
+                lambda: scrape_single_item_async(store, city, item),
+                lambda: hedge_scrape(store, city, item)
+            )
+    except asyncio.CancelledError:
+        # Client parti ou échéance atteinte : page et contexte fermés par le pool
+        breaker.abandon()
+        cancellation_stats.cancelled(store.lower(), time.monotonic() - start if start is not None else 0.0)
+        raise
+    except BaseException:
+        breaker.abandon()
+        raise
+    latency = time.monotonic() - start
+    if expired():
+        # Timeouts écourtés par l'échéance de ses appelants : rien à en conclure sur le site
+        breaker.abandon()
+        return result
+    breaker.record(result)
+    cancellation_stats.completed(store.lower(), latency)
+    observe_scrape(store.lower(), latency, result)
+    return result
+
+
+def circuit_open_result(store: str, city: str, item: Dict) -> Dict:
+    """Réponse immédiate quand le disjoncteur du magasin est ouvert : dernier prix connu ou erreur"""
+    stale = get_price_cache().get_stale(store, city, item)
+    if stale is not None:
+        return {**stale, "circuit": "open"}
+    return {"item": item, "store": store, "success": False, "error": f"{store} indisponible pour le moment (disjoncteur ouvert)", "circuit": "open"}
+
+
+async def hedge_scrape(store: str, city: str, item: Dict) -> Dict:
+    """Recherche de secours : sa propre place dans l'ordonnanceur et un nouveau contexte navigateur"""
+    async with scrape_scheduler.slot(store.lower()), memory_admission.admit():
+        return await scrape_single_item_async(store, city, item)
+
+
+def observe_scrape(store: str, latency_s: float, result: Dict):
+    """Mesure transmise à l'autotuning et au hedging (les réponses du chemin HTTP ne chargent pas le navigateur)"""
+    if result.get("source") != "http":
+        concurrency_tuner.observe(store, latency_s, result)
+        hedge_policy.observe(store, latency_s)
+
+
+async def scrape_single_item_async(store: str, city: str, item: Dict) -> Dict:
+    """Scraping d'un article, sans passer par le cache"""
     try:
         if store.lower() == "u":
-            #highest_price, lowest_price, success = get_price_u(city, item)
-            highest_price, lowest_price, success = 0, 0, False
+            #highest_price, lowest_price, success, source = await lookup_with_fast_path_async(u.FAST_PATH, u.get_price_u_http, u.get_price_u_async, city, item)
+            highest_price, lowest_price, success, source = 0, 0, False, None
         elif store.lower() == "carrefour":
-            highest_price, lowest_price, success = get_price_carrefour(city, item)
+            highest_price, lowest_price, success, source = await lookup_with_fast_path_async(carrefour.FAST_PATH, carrefour.get_price_carrefour_http, carrefour.get_price_carrefour_async, city, item)
         elif store.lower() == "aldi":
-            highest_price, lowest_price, success = get_price_aldi(city, item)
+            highest_price, lowest_price, success, source = await lookup_with_fast_path_async(aldi.FAST_PATH, aldi.get_price_aldi_http, aldi.get_price_aldi_async, city, item)
         elif store.lower() == "monoprix":
-            highest_price, lowest_price, success = get_price_monoprix(city, item)
+            highest_price, lowest_price, success, source = await lookup_with_fast_path_async(monoprix.FAST_PATH, monoprix.get_price_monoprix_http, monoprix.get_price_monoprix_async, city, item)
         else:
             return {"item": item, "store": store, "success": False, "error": f"Magasin non supporté: {store}"}
-        
+
         if success:
-            return {"item": item, "store": store, "success": True, "highest_price": highest_price, "lowest_price": lowest_price}
+            result = {"item": item, "store": store, "success": True, "highest_price": highest_price, "lowest_price": lowest_price, "source": source}
+            # Écriture SQLite dans un thread : la boucle asyncio ne l'attend pas
+            await asyncio.to_thread(get_price_cache().set, store, city, item, result)
+            return result
         else:
-            return {"item": item, "store": store, "success": False, "error": "Aucun produit trouvé"}
-    
+            return {"item": item, "store": store, "success": False, "error": "Aucun produit trouvé", "source": source}
+
     except Exception as e:
         return {"item": item, "store": store, "success": False, "error": str(e)}
 
 
+async def warm_up():
+    """Préchauffage : le premier panier après un démarrage à froid ne paie pas le lancement de Chromium"""
+    with startup.phase("price_cache"):
+        get_price_cache()
+    with startup.phase("offline_index"):
+        await asyncio.to_thread(get_offline_index)
+    with startup.phase("browser_launch"):
+        await get_async_browser_pool().prelaunch(WARMUP_BROWSERS)
+    # Au plus un magasin par navigateur lancé : le pool en lancerait un autre pour un
+    # navigateur occupé, et WARMUP_BROWSERS ne serait plus respecté
+    browsers = asyncio.Semaphore(WARMUP_BROWSERS)
+    await asyncio.gather(*(warm_up_store(store, browsers) for store in WARMUP_STORES))
+    startup.mark_ready()
+
+
+async def warm_up_store(store: str, browsers: asyncio.Semaphore):
+    """Un contexte par magasin, avec sa politique de blocage des ressources"""
+    async with browsers:
+        with startup.phase(f"context_{store}"):
+            module = STORE_MODULES[store]
+            async with get_async_browser_pool().new_context() as context:
+                await warm_up_context_async(context, module.RESOURCE_POLICY, module.URL, WARMUP_TIMEOUT_MS)
+
+
 ### ENDPOINTS DE L'API ###
 
+
+@app.get("/ready")
+async def ready():
+    """Sonde de disponibilité : 503 tant que le préchauffage n'est pas terminé"""
+    status = startup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
 @app.get("/health")
 async def health():
     """Endpoint de santé avec diagnostic des configurations et mémoire"""
@@ -118,7 +304,21 @@ async def health():
         "memory_usage_mb": round(memory_mb, 2),
         "memory_percent": round(process.memory_percent(), 2),
         "supported_stores": list(WORKERS.keys()),
-        "workers_configuration": WORKERS
+        "workers_configuration": WORKERS,
+        "browser_pool": get_async_browser_pool().status(),
+        "resource_blocking": resource_stats(),
+        "http_fast_path": fast_path_stats(),
+        "price_cache": get_price_cache().status(),
+        "single_flight": price_lookups_async.status(),
+        "jobs": job_queue.status(),
+        "memory_admission": memory_admission.status(),
+        "scheduler": scrape_scheduler.status(),
+        "autotune": concurrency_tuner.status(),
+        "circuit_breakers": breaker_stats(),
+        "cancellation": cancellation_stats.status(),
+        "hedging": hedge_policy.status(),
+        "geo_tile_cache": tile_cache_stats(),
+        "overpass_mirrors": overpass_mirrors.status()
     }
 
 
@@ -139,7 +339,7 @@ async def root():
 ### RECUPERER LE PRIX D'UN SEUL ARTICLE ###
 
 @app.post("/price_estimation")
-async def price_estimation(request: PriceEstimationRequest):
+async def price_estimation(request: PriceEstimationRequest, http_request: Request):
     """
     Endpoint pour obtenir l'estimation de prix d'un seul article
     
@@ -161,21 +361,23 @@ async def price_estimation(request: PriceEstimationRequest):
             "quantity": request.item.quantity or ""
         }
         
-        # Exécuter la recherche dans un thread séparé pour éviter les conflits asyncio
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            None, 
-            search_single_item, 
-            request.store, 
-            request.city, 
-            item_dict
-        )
+        try:
+            with deadline(request.deadline_ms):
+                result = await run_while_connected(http_request, asyncio.wait_for(
+                    search_single_item_async(request.store, request.city, item_dict),
+                    timeout=request.deadline_ms / 1000 if request.deadline_ms is not None else None
+                ))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=TIMED_OUT_ERROR)
         
         if not result["success"]:
             raise HTTPException(status_code=404, detail=result.get("error", "Article non trouvé"))
         
         return result
         
+    except ClientDisconnected:
+        # Personne ne lira la réponse : 499 (convention nginx) pour les logs
+        raise HTTPException(status_code=499, detail="Client déconnecté")
     except HTTPException:
         raise
     except Exception as e:
@@ -185,7 +387,7 @@ async def price_estimation(request: PriceEstimationRequest):
 ### RECUPERER LE PRIX D'UNE LISTE D'ARTICLES ###
 
 @app.post("/list_price_estimation")
-async def list_price_estimation(request: ListPriceEstimationRequest):
+async def list_price_estimation(request: ListPriceEstimationRequest, http_request: Request):
     """
     Endpoint pour obtenir l'estimation de prix d'une liste d'articles
     
@@ -213,68 +415,105 @@ async def list_price_estimation(request: ListPriceEstimationRequest):
             for item in request.items
         ]
         
-        # Exécuter la recherche dans un thread séparé pour éviter les conflits asyncio
-        loop = asyncio.get_event_loop()
-        results = await loop.run_in_executor(
-            None,
-            process_items_list,
-            items_dict,
-            request.store,
-            request.city,
-            max_workers
-        )
+        results = await run_while_connected(http_request, process_items_list(
+            items_dict, request.store, request.city, max_workers, deadline_ms=request.deadline_ms
+        ))
         
-        return {
-            "total_items": len(results),
-            "rate_success": (len([r for r in results if r["success"]]) / len(results)) * 100,
-            "min_price": sum(r["lowest_price"] for r in results if r["success"]),
-            "max_price": sum(r["highest_price"] for r in results if r["success"]),
-            "results": results
-        }
+        return {**list_summary(results), "status": basket_status(results), "results": results}
         
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client déconnecté")
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
 
 
-def process_items_list(articles: List[Dict], store: str, city: str = "Le port-marly", max_workers: int = 2) -> List[Dict]:
+TIMED_OUT_ERROR = "Délai dépassé"
+
+
+def basket_status(results: List[Dict]) -> str:
+    """ "timed_out" si l'échéance a coupé au moins une recherche, sinon "complete" """
+    return "timed_out" if any(r.get("status") == "timed_out" for r in results) else "complete"
+
+
+def remaining_budget_ms(deadline_ms: Optional[int], started: float) -> Optional[float]:
+    """Budget restant d'une requête commencée à started (time.monotonic)"""
+    if deadline_ms is None:
+        return None
+    return deadline_ms - (time.monotonic() - started) * 1000
+
+
+def list_summary(results: List[Dict]) -> Dict:
+    """Totaux d'une liste d'articles : taux de succès, prix minimum et maximum du panier"""
+    return {
+        "total_items": len(results),
+        "rate_success": (len([r for r in results if r["success"]]) / len(results)) * 100 if results else 0,
+        "min_price": sum(r["lowest_price"] for r in results if r["success"]),
+        "max_price": sum(r["highest_price"] for r in results if r["success"])
+    }
+
+
+async def process_items_list(articles: List[Dict], store: str, city: str = "Le port-marly", max_workers: int = 2, on_result=None, deadline_ms: Optional[int] = None) -> List[Dict]:
     """
-    Traite une liste d'articles avec multithreading et gestion mémoire
+    Traite une liste d'articles en parallèle sur la boucle asyncio
+    (les scrapings attendent leur tour dans memory_admission si la mémoire manque)
     
     Args:
         articles: Liste d'articles [{"name": "...", "brand": "...", "quantity": "..."}]
         store: "carrefour", "u", "aldi" ou "monoprix"
         city: Nom de la ville
-        max_workers: Nombre maximum de threads
+        max_workers: Nombre maximum de recherches simultanées
+        on_result: Appelé avec chaque résultat dès qu'il est disponible (progression des jobs)
+        deadline_ms: Budget de la liste ; à l'échéance les recherches en cours sont annulées
+            et leurs articles marqués "timed_out" (les autres "complete")
     
     Returns:
         Liste des résultats
     """
     results = []
     
-    # Limiter le nombre de workers pour éviter l'explosion mémoire
-    max_workers = min(max_workers, 8)
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_item = {executor.submit(search_single_item, store, city, item): item for item in articles}
-        
-        for future in concurrent.futures.as_completed(future_to_item):
+    # Limite propre à cette liste ; les limites par magasin et globale sont dans scrape_scheduler
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def search(item):
+        async with semaphore:
             try:
-                result = future.result()
-                results.append(result)
+                return await search_single_item_async(store, city, item)
             except Exception as exc:
-                item = future_to_item[future]
-                results.append({"item": item, "store": store, "success": False, "error": str(exc)})
-            finally:
-                # Nettoyage forcé après chaque item
-                del future_to_item[future]
-                gc.collect()
-    
-    # Nettoyage final
-    del future_to_item
-    gc.collect()
-    
+                return {"item": item, "store": store, "success": False, "error": str(exc)}
+
+    # Les tâches héritent de l'échéance : les timeouts des scrapers sont bornés par elle
+    with deadline(deadline_ms):
+        tasks = {asyncio.ensure_future(search(item)): item for item in articles}
+        remaining = remaining_s()
+    end = time.monotonic() + remaining if remaining is not None else None
+
+    pending = set(tasks)
+    try:
+        while pending:
+            timeout = end - time.monotonic() if end is not None else None
+            if timeout is not None and timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = {**task.result(), "status": "complete"}
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+    except asyncio.CancelledError:
+        # Requête annulée (client déconnecté) : on arrête les recherches en attente et en cours
+        for task in pending:
+            task.cancel()
+        raise
+
+    for task in pending:
+        task.cancel()
+        result = {"item": tasks[task], "store": store, "success": False, "error": TIMED_OUT_ERROR, "status": "timed_out"}
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
     return results
 
 
@@ -293,16 +532,7 @@ async def closest_stores(request: ClosestStoreRequest):
         Liste des supermarchés proches
     """
     try:
-        # Essayer d'abord Google Maps, fallback sur Overpass si erreur
-        try:
-            stores = find_supermarkets_gcp(request.latitude, request.longitude, request.max_distance_km)
-            api_used = "Google Maps"
-        except Exception as gcp_error:
-            print(f"Google Maps API indisponible: {gcp_error}")
-            stores = find_supermarkets(request.latitude, request.longitude, request.max_distance_km)
-            api_used = "Overpass"
-            
-        stores = stores.to_dict(orient="records")
+        stores, api_used = await asyncio.to_thread(locate_stores, request.latitude, request.longitude, request.max_distance_km)
         return {
             "latitude": request.latitude,
             "longitude": request.longitude,
@@ -316,59 +546,70 @@ async def closest_stores(request: ClosestStoreRequest):
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
 
 
-def process_single_store(store, items_list):
+def resolve_chain(store: Dict) -> Optional[str]:
+    """Enseigne supportée (clé de WORKERS) correspondant à un magasin trouvé, None sinon"""
+    # Chercher si l'un des mots du nom du magasin correspond à une clé dans WORKERS
+    for word in store.get("name", "").lower().split():
+        if word in WORKERS:
+            return word
+    return None
+
+
+def chain_group_key(chain: Optional[str], store: Dict) -> str:
+    """
+    Clé de regroupement des magasins proches : les enseignes à prix nationaux sont
+    scrapées une seule fois, celles à prix locaux (Super U) une fois par adresse
+    """
+    if chain is None:
+        return "unknown"
+    if chain in LOCATION_DEPENDENT:
+        return f"{chain}|{normalize(store.get('address', ''))}"
+    return chain
+
+
+def store_summary(store: Dict, store_results: List[Dict], error: Optional[str] = None) -> Dict:
+    """Résultat d'un magasin : taux de succès, totaux et détail des produits"""
+    successful = sum(1 for r in store_results if r.get("success", False))
+    total = len(store_results)
+
+    result = {
+        "store": store,
+        "success_rate": (successful / total) * 100 if total > 0 else 0,
+        "min_price": sum(r["lowest_price"] for r in store_results if r["success"]),
+        "max_price": sum(r["highest_price"] for r in store_results if r["success"]),
+        "products": store_results,  # Ajout de la liste détaillée des produits
+        "status": basket_status(store_results)
+    }
+    if error is not None:
+        result["error"] = error
+    return result
+
+
+async def price_chain(chain: Optional[str], city: str, items_list: List[Dict], deadline_ms: Optional[float] = None) -> Dict:
     """
-    Traite un seul magasin et retourne ses résultats avec gestion mémoire
+    Prix du panier pour une enseigne
+
+    Returns:
+        {"products": [...], "error": message ou None}
     """
     try:
-        store_name = store.get("name", "").lower()
-        
-        # Chercher si l'un des mots du nom du magasin correspond à une clé dans WORKERS
-        matched_store = None
-        for word in store_name.split():
-            if word in WORKERS:
-                matched_store = word
-                break
-        
-        if not matched_store:
+        if not chain:
             # Créer une liste par défaut avec les produits demandés mais non trouvés
             default_products = [
                 {
                     "item": item,
-                    "store": matched_store or "unknown",
+                    "store": "unknown",
                     "success": False,
                     "error": "Magasin non supporté"
                 }
                 for item in items_list
             ]
-            return {
-                "store": store,
-                "success_rate": 0,
-                "min_price": 0,
-                "max_price": 0,
-                "products": default_products,
-                "error": "Magasin non supporté"
-            }
-        
-        max_workers = WORKERS[matched_store]
-        store_results = process_items_list(items_list, matched_store, store.get("address", ""), max_workers)
-        
-        successful = sum(1 for r in store_results if r.get("success", False))
-        total = len(store_results)
-        
-        result = {
-            "store": store,
-            "success_rate": (successful / total) * 100 if total > 0 else 0,
-            "min_price": sum(r["lowest_price"] for r in store_results if r["success"]),
-            "max_price": sum(r["highest_price"] for r in store_results if r["success"]),
-            "products": store_results  # Ajout de la liste détaillée des produits
-        }
-        
-        # Nettoyage mémoire - on garde store_results dans le résultat
-        gc.collect()
-        
-        return result
-        
+            return {"products": default_products, "error": "Magasin non supporté"}
+
+        max_workers = WORKERS[chain]
+        products = await process_items_list(items_list, chain, city, max_workers, deadline_ms=deadline_ms)
+        return {"products": products, "error": None}
+
     except Exception as e:
         # Créer une liste par défaut avec les produits demandés mais en erreur
         default_products = [
@@ -380,22 +621,96 @@ def process_single_store(store, items_list):
             }
             for item in items_list
         ]
-        return {
-            "store": store,
-            "success_rate": 0,
-            "min_price": 0,
-            "max_price": 0,
-            "products": default_products,
-            "error": str(e)
-        }
+        return {"products": default_products, "error": str(e)}
+
+
+async def process_single_store(store, items_list):
+    """
+    Traite un seul magasin et retourne ses résultats
+    """
+    priced = await price_chain(resolve_chain(store), store.get("address", ""), items_list)
+    return store_summary(store, priced["products"], priced["error"])
+
+
+def group_nearby_stores(stores: List[Dict]) -> List[Dict]:
+    """
+    Regroupe les magasins proches pour scraper le panier une seule fois par enseigne
+    (par adresse pour Super U)
+
+    Returns:
+        [{"chain": ..., "city": ..., "stores": [...]}]
+    """
+    groups = {}
+    for store in stores:
+        chain = resolve_chain(store)
+        key = chain_group_key(chain, store)
+        if key not in groups:
+            groups[key] = {"chain": chain, "city": store.get("address", ""), "stores": []}
+        groups[key]["stores"].append(store)
+
+    print(f"{len(stores)} magasins proches regroupés en {len(groups)} recherches")
+    return list(groups.values())
+
+
+async def iter_nearby_stores(stores: List[Dict], items_list: List[Dict], deadline_ms: Optional[float] = None):
+    """
+    Génère le résultat de chaque magasin dès que son enseigne est traitée
+    (toutes les enseignes en parallèle sur la boucle asyncio)
+    """
+    async def price_group(group):
+        return group, await price_chain(group["chain"], group["city"], items_list, deadline_ms)
+
+    tasks = [asyncio.ensure_future(price_group(group)) for group in group_nearby_stores(stores)]
+    try:
+        for future in asyncio.as_completed(tasks):
+            group, priced = await future
+            for store in group["stores"]:
+                yield store_summary(store, priced["products"], priced["error"])
     finally:
-        # Nettoyage forcé à la fin
-        gc.collect()
+        # Client parti avant la fin : inutile de continuer les autres enseignes
+        for task in tasks:
+            task.cancel()
+
+
+async def process_nearby_stores(stores: List[Dict], items_list: List[Dict], deadline_ms: Optional[float] = None) -> List[Dict]:
+    """
+    Traite les magasins proches et recopie le résultat de chaque enseigne sur ses magasins
+
+    Returns:
+        Résultats dans l'ordre de stores
+    """
+    by_store = {}
+    async for result in iter_nearby_stores(stores, items_list, deadline_ms):
+        by_store[id(result["store"])] = result
+    return [by_store[id(store)] for store in stores]
+
+
+def locate_stores(latitude: float, longitude: float, max_distance_km: float):
+    """
+    Supermarchés proches : index OSM hors-ligne s'il est configuré, sinon Google Maps
+    d'abord, fallback sur Overpass si erreur.
+    Appels réseau bloquants (pagination, Overpass) : à appeler via asyncio.to_thread
+    depuis la boucle, qui sert aussi les scrapings Playwright
+
+    Returns:
+        (liste des magasins, nom de l'API utilisée)
+    """
+    if get_offline_index() is not None:
+        stores = find_supermarkets_offline(latitude, longitude, max_distance_km)
+        return to_dicts(stores), "OSM hors-ligne"
+    try:
+        stores = find_supermarkets_gcp(latitude, longitude, max_distance_km)
+        api_used = "Google Maps"
+    except Exception as gcp_error:
+        print(f"Google Maps API indisponible: {gcp_error}")
+        stores = find_supermarkets(latitude, longitude, max_distance_km)
+        api_used = "Overpass"
+    return to_dicts(stores), api_used
 
 
 ### ENDPOINT QUI PREND UNE LISTE, UNE ADRESSE, UN RAYON EN KM ET RETOURNE CHAQUE SUPERMARCHÉ PROCHE AVEC LE HIGHEST PRICE, LOWEST PRICE ET SUCCESS RATE
 @app.post("/closest_store_groceries")
-async def closest_store_groceries(request: ClosestStoreGroceries):
+async def closest_store_groceries(request: ClosestStoreGroceries, http_request: Request):
     """
     Endpoint pour obtenir les supermarchés proches d'une adresse donnée avec les prix des articles
     
@@ -406,17 +721,8 @@ async def closest_store_groceries(request: ClosestStoreGroceries):
         Liste des supermarchés proches avec les prix des articles
     """
     try:
-        # Essayer d'abord Google Maps, fallback sur Overpass si erreur
-        try:
-            stores = find_supermarkets_gcp(request.latitude, request.longitude, request.max_distance_km)
-            api_used = "Google Maps"
-        except Exception as gcp_error:
-            print(f"Google Maps API indisponible: {gcp_error}")
-            stores = find_supermarkets(request.latitude, request.longitude, request.max_distance_km)
-            api_used = "Overpass"
-        
-            
-        stores = stores.to_dict(orient="records")
+        started = time.monotonic()
+        stores, api_used = await asyncio.to_thread(locate_stores, request.latitude, request.longitude, request.max_distance_km)
         
         # Convertir les items une seule fois
         items_dict = [
@@ -428,32 +734,186 @@ async def closest_store_groceries(request: ClosestStoreGroceries):
             for item in request.items
         ]
         
-        # PARALLÉLISATION : Traiter tous les magasins en parallèle
-        loop = asyncio.get_event_loop()
-        
-        # Exécuter en parallèle
-        tasks = [
-            loop.run_in_executor(None, process_single_store, store, items_dict)
-            for store in stores
-        ]
-        
-        results = await asyncio.gather(*tasks)
+        results = await run_while_connected(http_request, process_nearby_stores(
+            stores, items_dict, remaining_budget_ms(request.deadline_ms, started)
+        ))
         
         return {
             "latitude": request.latitude,
             "longitude": request.longitude,
             "max_distance_km": request.max_distance_km,
+            "status": "timed_out" if any(r["status"] == "timed_out" for r in results) else "complete",
             "stores_processed": len(results),
             "api_used": api_used,
             "stores_with_prices": results
         }
         
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client déconnecté")
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
 
 
+@app.post("/closest_store_groceries/stream")
+async def closest_store_groceries_stream(request: ClosestStoreGroceries):
+    """
+    Variante streamée de /closest_store_groceries (NDJSON, un objet JSON par ligne) :
+    - {"type": "stores", ...} : supermarchés trouvés
+    - {"type": "store", ...} : résultat d'un magasin, dès que son enseigne est traitée
+    - {"type": "summary", ...} : fin du flux
+
+    Args:
+        request: Contient l'adresse, la distance maximale en km et la liste d'articles
+
+    Returns:
+        Flux application/x-ndjson
+    """
+    started = time.monotonic()
+    try:
+        stores, api_used = await asyncio.to_thread(locate_stores, request.latitude, request.longitude, request.max_distance_km)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+
+    items_dict = [
+        {
+            "name": item.name,
+            "brand": item.brand or "",
+            "quantity": item.quantity or ""
+        }
+        for item in request.items
+    ]
+
+    async def records():
+        start = time.monotonic()
+        yield json.dumps({
+            "type": "stores",
+            "latitude": request.latitude,
+            "longitude": request.longitude,
+            "max_distance_km": request.max_distance_km,
+            "found_stores": len(stores),
+            "api_used": api_used,
+            "stores": stores
+        }, default=str) + "\n"
+
+        processed = 0
+        status = "complete"
+        try:
+            async for result in iter_nearby_stores(stores, items_dict, remaining_budget_ms(request.deadline_ms, started)):
+                processed += 1
+                if result["status"] == "timed_out":
+                    status = "timed_out"
+                yield json.dumps({"type": "store", **result}, default=str) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+        yield json.dumps({
+            "type": "summary",
+            "status": status,
+            "stores_processed": processed,
+            "elapsed_s": round(time.monotonic() - start, 2)
+        }) + "\n"
+
+    return StreamingResponse(records(), media_type="application/x-ndjson")
+
+
+### JOBS ASYNCHRONES POUR LES GROS PANIERS ###
+
+async def run_list_job(payload: Dict, progress) -> Dict:
+    """Job /list_price_estimation : un résultat partiel par article"""
+    store = payload["store"].lower()
+    progress.set_total(len(payload["items"]))
+    results = await process_items_list(payload["items"], store, payload["city"], WORKERS[store], on_result=progress.add)
+    return list_summary(results)
+
+
+async def run_groceries_job(payload: Dict, progress) -> Dict:
+    """Job /closest_store_groceries : un résultat partiel par magasin"""
+    stores, api_used = await asyncio.to_thread(locate_stores, payload["latitude"], payload["longitude"], payload["max_distance_km"])
+    progress.set_total(len(stores))
+    async for result in iter_nearby_stores(stores, payload["items"]):
+        progress.add(result)
+    return {"stores_processed": len(stores), "api_used": api_used}
+
+
+job_queue = JobQueue(make_backend(), {
+    "list_price_estimation": run_list_job,
+    "closest_store_groceries": run_groceries_job,
+})
+
+
+def job_view(job: Dict) -> Dict:
+    """Représentation d'un job renvoyée au client"""
+    return {key: job[key] for key in (
+        "id", "kind", "status", "submitted_at", "started_at", "finished_at", "progress", "results", "summary", "error"
+    )}
+
+
+def submit_job(kind: str, payload: Dict, total: int = 0) -> Dict:
+    try:
+        return job_view(job_queue.submit(kind, payload, total))
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"File de jobs pleine: {e}")
+
+
+@app.post("/jobs/list_price_estimation")
+async def submit_list_price_estimation(request: ListPriceEstimationRequest):
+    """
+    Soumet une liste d'articles en job asynchrone
+
+    Returns:
+        Le job (id, statut) à suivre avec GET /jobs/{job_id}
+    """
+    if request.store.lower() not in WORKERS:
+        raise HTTPException(status_code=400, detail=f"Magasin non supporté: {request.store}")
+
+    items_dict = [
+        {
+            "name": item.name,
+            "brand": item.brand or "",
+            "quantity": item.quantity or ""
+        }
+        for item in request.items
+    ]
+    payload = {"store": request.store.lower(), "city": request.city, "items": items_dict}
+    return submit_job("list_price_estimation", payload, total=len(items_dict))
+
+
+@app.post("/jobs/closest_store_groceries")
+async def submit_closest_store_groceries(request: ClosestStoreGroceries):
+    """
+    Soumet une recherche /closest_store_groceries en job asynchrone
+
+    Returns:
+        Le job (id, statut) à suivre avec GET /jobs/{job_id}
+    """
+    items_dict = [
+        {
+            "name": item.name,
+            "brand": item.brand or "",
+            "quantity": item.quantity or ""
+        }
+        for item in request.items
+    ]
+    payload = {
+        "latitude": request.latitude,
+        "longitude": request.longitude,
+        "max_distance_km": request.max_distance_km,
+        "items": items_dict
+    }
+    return submit_job("closest_store_groceries", payload)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Progression et résultats partiels d'un job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    return job_view(job)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
@@ -1,13 +1,22 @@
-from rapidfuzz import fuzz
+from functools import lru_cache
+from rapidfuzz import fuzz, process
 import unicodedata
 import re
 
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+# Requêtes et noms de produits reviennent souvent (paniers, tuiles) : on garde les plus récents
+NORMALIZE_CACHE_SIZE = 8192
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize(text):
     """Nettoie une chaîne pour comparaison floue"""
     text = text.lower()
-    text = unicodedata.normalize("NFKD", text)
-    text = "".join(c for c in text if not unicodedata.combining(c))
-    text = re.sub(r"[^a-z0-9]+", " ", text)
+    # Pas d'accents possibles en ASCII : décomposition inutile
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    text = NON_ALPHANUMERIC.sub(" ", text)
     return text.strip()
 
 def fuzzy_score(query, candidate):
@@ -16,3 +25,34 @@ def fuzzy_score(query, candidate):
     norm_candidate = normalize(candidate)
     score = fuzz.ratio(norm_query, norm_candidate)
     return score
+
+def _extract(query, candidates, limit):
+    """(candidat normalisé, score, index) triés par score décroissant, en un seul appel RapidFuzz"""
+    return process.extract(
+        normalize(query),
+        [normalize(candidate) for candidate in candidates],
+        scorer=fuzz.ratio,
+        processor=None,
+        limit=limit
+    )
+
+def fuzzy_scores(query, candidates):
+    """
+    Scores de tous les candidats d'une recherche, la requête n'étant normalisée qu'une fois
+
+    Returns:
+        Liste de scores 0-100 dans l'ordre des candidats (mêmes valeurs que fuzzy_score)
+    """
+    scores = [0.0] * len(candidates)
+    for _, score, index in _extract(query, candidates, None):
+        scores[index] = score
+    return scores
+
+def top_matches(query, candidates, k=3):
+    """
+    Les k candidats les plus proches de la requête
+
+    Returns:
+        [(index, score)] par score décroissant, à égalité dans l'ordre des candidats
+    """
+    return [(index, score) for _, score, index in _extract(query, candidates, k)]
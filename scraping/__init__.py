@@ -0,0 +1 @@
+# Pour que scraping soit considéré comme un module
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Contrôle d'admission par budget mémoire : un nouveau scraping ne démarre que si la
+mémoire du processus et de ses enfants (navigateurs Chromium) reste sous le budget.
+La mémoire est mesurée en PSS : les pages partagées entre processus Chromium
+(bibliothèques, mémoire partagée du GPU et du rendu) ne sont comptées qu'une fois,
+là où l'addition des RSS les compterait dans chaque enfant.
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+import psutil
+
+# Part de la mémoire du conteneur accordée aux scrapings, le reste servant de marge
+# (Python, caches, pics d'un onglet)
+MEMORY_BUDGET_FRACTION = float(os.getenv("MEMORY_BUDGET_FRACTION", "0.75"))
+# Limite cgroup v2 puis v1 (Docker, Cloud Run)
+CGROUP_LIMIT_FILES = ["/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"]
+# Mémoire supplémentaire prévue pour un scraping qui démarre (page Chromium)
+SCRAPE_MEMORY_MB = float(os.getenv("SCRAPE_MEMORY_MB", "120"))
+POLL_INTERVAL_S = 0.25
+# Mesure réutilisée pendant ce délai (lire smaps_rollup de chaque enfant coûte quelques ms)
+MEASURE_MAX_AGE_S = 0.5
+
+
+def container_memory_mb() -> float:
+    """Limite mémoire du cgroup, ou mémoire de la machine hors conteneur, en Mo"""
+    total = psutil.virtual_memory().total
+    for path in CGROUP_LIMIT_FILES:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # "max" (v2) ou une valeur géante (v1) : pas de limite
+        if value.isdigit() and int(value) < total:
+            return int(value) / 1024 / 1024
+        break
+    return total / 1024 / 1024
+
+
+def default_budget_mb() -> float:
+    """MEMORY_BUDGET_MB si défini, sinon MEMORY_BUDGET_FRACTION de la limite du conteneur"""
+    if os.getenv("MEMORY_BUDGET_MB"):
+        return float(os.getenv("MEMORY_BUDGET_MB"))
+    return round(container_memory_mb() * MEMORY_BUDGET_FRACTION)
+
+
+def process_memory(process: psutil.Process) -> int:
+    """PSS d'un processus en octets, RSS si le système ne la fournit pas"""
+    try:
+        return process.memory_full_info().pss
+    except (AttributeError, psutil.AccessDenied):
+        return process.memory_info().rss
+
+
+def tree_memory_mb(process: psutil.Process) -> float:
+    """Mémoire (PSS) du processus et de tous ses descendants, en Mo"""
+    total = process_memory(process)
+    for child in process.children(recursive=True):
+        try:
+            total += process_memory(child)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total / 1024 / 1024
+
+
+class MemoryAdmission:
+
+    def __init__(self, budget_mb: float = None, scrape_mb: float = SCRAPE_MEMORY_MB):
+        self.budget_mb = default_budget_mb() if budget_mb is None else budget_mb
+        self.scrape_mb = scrape_mb
+        self._process = psutil.Process()
+        self._memory_mb = 0.0
+        self._measured_at = 0.0
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {"admitted": 0, "delayed": 0, "total_wait_s": 0.0, "max_wait_s": 0.0}
+
+    def memory_mb(self) -> float:
+        now = time.monotonic()
+        if now - self._measured_at > MEASURE_MAX_AGE_S:
+            self._memory_mb = tree_memory_mb(self._process)
+            self._measured_at = now
+        return self._memory_mb
+
+    def _try_admit(self) -> bool:
+        with self._lock:
+            # Toujours laisser passer un scraping, sinon rien ne libérerait de mémoire
+            if self.in_flight > 0 and self.memory_mb() + self.scrape_mb > self.budget_mb:
+                return False
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+            # Forcer une nouvelle mesure : la page vient d'être fermée
+            self._measured_at = 0.0
+
+    def _record_wait(self, waited: float):
+        with self._lock:
+            self.stats["delayed"] += 1
+            self.stats["total_wait_s"] += waited
+            self.stats["max_wait_s"] = max(self.stats["max_wait_s"], waited)
+
+    @asynccontextmanager
+    async def admit(self):
+        """Attend qu'il y ait assez de mémoire pour un scraping de plus"""
+        start = time.monotonic()
+        if not self._try_admit():
+            with self._lock:
+                self.waiting += 1
+            try:
+                while not self._try_admit():
+                    await asyncio.sleep(POLL_INTERVAL_S)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+            self._record_wait(time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def status(self) -> Dict:
+        memory = self.memory_mb()
+        with self._lock:
+            return {
+                "budget_mb": self.budget_mb,
+                "pss_mb": round(memory, 1),
+                "scrape_mb": self.scrape_mb,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "admitted": self.stats["admitted"],
+                "delayed": self.stats["delayed"],
+                "total_wait_s": round(self.stats["total_wait_s"], 2),
+                "max_wait_s": round(self.stats["max_wait_s"], 2)
+            }
+
+
+# Budget partagé par tous les scrapings du processus
+memory_admission = MemoryAdmission()
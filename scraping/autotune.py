@@ -0,0 +1,127 @@
+"""
+Réglage automatique de la concurrence par magasin (AIMD) : +1 place quand le site répond
+bien, division par deux quand la latence, les timeouts, les erreurs ou les murs anti-bot
+augmentent
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+AUTOTUNE_ENABLED = os.getenv("SCRAPE_AUTOTUNE", "1") != "0"
+# Nombre de recherches observées avant chaque ajustement
+AUTOTUNE_WINDOW = int(os.getenv("SCRAPE_AUTOTUNE_WINDOW", "10"))
+AUTOTUNE_MIN = int(os.getenv("SCRAPE_AUTOTUNE_MIN", "1"))
+# Limite haute par défaut : deux fois la valeur de WORKERS
+AUTOTUNE_MAX_FACTOR = 2
+
+# Seuils de recul sur une fenêtre
+MAX_ERROR_RATE = 0.2      # timeouts, exceptions et murs anti-bot
+MAX_LATENCY_FACTOR = 2.0  # latence moyenne par rapport à la meilleure fenêtre récente
+
+HISTORY_SIZE = 20
+
+
+# Issues qui signalent un site en difficulté ; "not_found" (article absent de la gamme) n'en fait pas partie
+FAILURES = {"timeout", "error", "blocked"}
+
+
+def classify(result: Dict) -> str:
+    """Issue d'une recherche : "ok", "not_found", "timeout", "blocked" (mur anti-bot) ou "error" """
+    if result.get("success"):
+        return "ok"
+    error = result.get("error") or ""
+    if error == "Aucun produit trouvé":
+        return "not_found"
+    if error.startswith("Page anti-bot"):
+        return "blocked"
+    if "timeout" in error.lower():
+        return "timeout"
+    return "error"
+
+
+class ConcurrencyTuner:
+
+    def __init__(self, scheduler, window: int = AUTOTUNE_WINDOW, enabled: bool = AUTOTUNE_ENABLED):
+        self.scheduler = scheduler
+        self.window = window
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.bounds = {
+            store: (
+                int(os.getenv(f"SCRAPE_AUTOTUNE_MIN_{store.upper()}", AUTOTUNE_MIN)),
+                int(os.getenv(f"SCRAPE_AUTOTUNE_MAX_{store.upper()}", limit * AUTOTUNE_MAX_FACTOR)),
+            )
+            for store, limit in scheduler.limits.items()
+        }
+        self._samples = {store: [] for store in scheduler.limits}
+        self._baseline = {store: None for store in scheduler.limits}
+        self.history = {store: deque(maxlen=HISTORY_SIZE) for store in scheduler.limits}
+
+    def observe(self, store: str, latency_s: float, result: Dict):
+        """Enregistre une recherche terminée et ajuste la limite à chaque fenêtre complète"""
+        if not self.enabled or store not in self._samples:
+            return
+        with self._lock:
+            samples = self._samples[store]
+            samples.append((latency_s, classify(result)))
+            if len(samples) < self.window:
+                return
+            self._samples[store] = []
+            self._adjust(store, samples)
+
+    def _adjust(self, store: str, samples: list):
+        n = len(samples)
+        outcomes = [outcome for _, outcome in samples]
+        error_rate = sum(outcome in FAILURES for outcome in outcomes) / n
+        not_found_rate = outcomes.count("not_found") / n
+        latency = sum(latency for latency, _ in samples) / n
+
+        # Meilleure latence récente, qui remonte lentement pour suivre le site
+        baseline = self._baseline[store]
+        baseline = latency if baseline is None else min(baseline * 1.05, latency)
+        self._baseline[store] = baseline
+
+        if error_rate > MAX_ERROR_RATE:
+            reason = f"erreurs {error_rate:.0%}"
+        elif latency > baseline * MAX_LATENCY_FACTOR:
+            reason = f"latence {latency:.1f}s (référence {baseline:.1f}s)"
+        else:
+            reason = None
+
+        low, high = self.bounds[store]
+        current = self.scheduler.limits[store]
+        if reason is None:
+            new_limit = min(high, current + 1)
+            reason = "stable"
+        else:
+            new_limit = max(low, current // 2)
+
+        self.history[store].append({
+            "at": round(time.time()),
+            "limit": new_limit,
+            "previous": current,
+            "reason": reason,
+            "latency_s": round(latency, 2),
+            "error_rate": round(error_rate, 2),
+            "not_found_rate": round(not_found_rate, 2),
+        })
+        if new_limit != current:
+            print(f"Concurrence {store} : {current} -> {new_limit} ({reason})")
+            self.scheduler.set_limit(store, new_limit)
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "window": self.window,
+                "stores": {
+                    store: {
+                        "limit": self.scheduler.limits[store],
+                        "bounds": list(self.bounds[store]),
+                        "history": list(self.history[store])
+                    }
+                    for store in self.bounds
+                }
+            }
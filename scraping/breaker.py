@@ -0,0 +1,103 @@
+"""
+Disjoncteur par magasin : après plusieurs échecs consécutifs (timeouts, erreurs, murs
+anti-bot ; un article absent n'en est pas un), les recherches échouent immédiatement au lieu d'attendre les timeouts
+Playwright, puis quelques recherches d'essai vérifient si le site est revenu
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+from scraping.autotune import FAILURES, classify
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.getenv("BREAKER_RESET_S", "60"))
+BREAKER_PROBES = int(os.getenv("BREAKER_PROBES", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Disjoncteurs des magasins, pour /health
+BREAKERS = {}
+
+
+class CircuitBreaker:
+
+    def __init__(self, store: str, failures: int = BREAKER_FAILURES, reset_s: float = BREAKER_RESET_S, probes: int = BREAKER_PROBES):
+        self.store = store
+        self.max_failures = failures
+        self.reset_s = reset_s
+        self.max_probes = probes
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.stats = {"opened": 0, "short_circuited": 0}
+        self._lock = threading.Lock()
+        BREAKERS[store] = self
+
+    def allow(self) -> bool:
+        """True si la recherche peut partir (fermé, ou place de test en semi-ouvert)"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_s:
+                self.state = HALF_OPEN
+                self.probes = 0
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self.probes < self.max_probes:
+                self.probes += 1
+                return True
+            self.stats["short_circuited"] += 1
+            return False
+
+    def record(self, result: Dict):
+        """Résultat d'une recherche autorisée par allow()"""
+        failed = classify(result) in FAILURES
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes -= 1
+                if failed:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self.failures = 0
+                    print(f"Disjoncteur {self.store} refermé")
+                return
+
+            if not failed:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == CLOSED and self.failures >= self.max_failures:
+                self._open()
+
+    def abandon(self):
+        """Recherche annulée avant d'avoir un résultat : libère la place de test"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes -= 1
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.stats["opened"] += 1
+        print(f"Disjoncteur {self.store} ouvert pour {self.reset_s:.0f}s")
+
+    def status(self) -> Dict:
+        with self._lock:
+            retry_in = max(0.0, self.reset_s - (time.monotonic() - self.opened_at)) if self.state == OPEN else 0
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "retry_in_s": round(retry_in, 1),
+                **self.stats
+            }
+
+
+def get_breaker(store: str) -> CircuitBreaker:
+    return BREAKERS.get(store) or CircuitBreaker(store)
+
+
+def breaker_stats() -> Dict:
+    return {store: breaker.status() for store, breaker in BREAKERS.items()}
@@ -0,0 +1,179 @@
+"""
+Cache des prix à deux niveaux : LRU en mémoire puis SQLite persistant entre redémarrages
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from regex.utils import normalize
+
+# Durée de vie des prix par magasin (secondes), surchargeable par PRICE_CACHE_TTL_<MAGASIN>
+DEFAULT_TTL = {
+    "carrefour": 6 * 3600,
+    "aldi": 12 * 3600,
+    "monoprix": 6 * 3600,
+    "u": 6 * 3600,
+}
+
+# Magasins dont les prix dépendent du magasin physique choisi (donc de la ville)
+LOCATION_DEPENDENT = {"u"}
+
+CACHE_PATH = os.getenv("PRICE_CACHE_PATH", "price_cache.sqlite3")
+CACHE_SIZE = int(os.getenv("PRICE_CACHE_SIZE", "2048"))
+# Prix expirés gardés ce délai pour get_stale (disjoncteur ouvert), puis supprimés du disque
+STALE_RETENTION_S = float(os.getenv("PRICE_CACHE_STALE_S", str(7 * 24 * 3600)))
+# Intervalle minimal entre deux purges
+PURGE_INTERVAL_S = 3600
+
+# Champs du résultat conservés en cache
+CACHED_FIELDS = ("highest_price", "lowest_price", "source")
+
+
+def store_ttl(store: str) -> float:
+    default = DEFAULT_TTL.get(store, 6 * 3600)
+    return float(os.getenv(f"PRICE_CACHE_TTL_{store.upper()}", default))
+
+
+def cache_key(store: str, city: str, item: Dict) -> str:
+    """Clé (magasin, recherche normalisée, ville si les prix en dépendent)"""
+    store = store.lower()
+    query = normalize(f"{item.get('name', '')} {item.get('brand', '')} {item.get('quantity', '')}")
+    location = normalize(city or "") if store in LOCATION_DEPENDENT else ""
+    return f"{store}|{query}|{location}"
+
+
+class PriceCache:
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_SIZE, stale_retention_s: float = STALE_RETENTION_S):
+        self.max_entries = max_entries
+        self.stale_retention_s = stale_retention_s
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._purged_at = 0.0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0, "stale_hits": 0, "purged": 0}
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            # Journal WAL sans fsync à chaque commit : une écriture ne bloque ni les lectures
+            # ni l'appelant (au pire les derniers prix sont perdus si la machine s'arrête)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS prices (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Dict):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, store: str, city: str, item: Dict) -> Optional[Dict]:
+        """Résultat en cache encore valide, sinon None"""
+        key = cache_key(store, city, item)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return {"item": item, "store": store, "success": True, **value, "cached": True}
+                del self._memory[key]
+                self.stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM prices WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.stats["disk_hits"] += 1
+                    return {"item": item, "store": store, "success": True, **value, "cached": True}
+
+            self.stats["misses"] += 1
+            return None
+
+    def get_stale(self, store: str, city: str, item: Dict) -> Optional[Dict]:
+        """Dernier résultat connu même expiré (quand le magasin est injoignable), sinon None"""
+        key = cache_key(store, city, item)
+        oldest = time.time() - self.stale_retention_s
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+            elif self._db is not None:
+                row = self._db.execute("SELECT value, expires_at FROM prices WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                value, expires_at = json.loads(row[0]), row[1]
+            else:
+                return None
+            if expires_at < oldest:
+                return None
+            self.stats["stale_hits"] += 1
+        return {"item": item, "store": store, "success": True, **value, "cached": True, "stale": True}
+
+    def set(self, store: str, city: str, item: Dict, result: Dict):
+        """
+        Enregistre un résultat réussi avec la durée de vie du magasin
+        (écriture SQLite : à appeler hors de la boucle asyncio)
+        """
+        if not result.get("success"):
+            return
+        key = cache_key(store, city, item)
+        value = {field: result.get(field) for field in CACHED_FIELDS}
+        expires_at = time.time() + store_ttl(store.lower())
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO prices (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                self._db.commit()
+        self._purge()
+
+    def _purge(self):
+        """Supprime du disque les prix expirés depuis plus de stale_retention_s (au plus une fois par heure)"""
+        now = time.time()
+        with self._lock:
+            if self._db is None or now - self._purged_at < PURGE_INTERVAL_S:
+                return
+            self._purged_at = now
+            deleted = self._db.execute(
+                "DELETE FROM prices WHERE expires_at < ?", (now - self.stale_retention_s,)
+            ).rowcount
+            self._db.commit()
+            self.stats["purged"] += deleted
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None,
+                **self.stats
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_price_cache() -> PriceCache:
+    """Cache des prix du processus (créé au premier appel)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PriceCache()
+        return _cache
@@ -0,0 +1,82 @@
+"""
+Annulation des recherches quand le client HTTP se déconnecte, et mesure du temps de
+scraping économisé
+"""
+import asyncio
+import threading
+from typing import Dict
+
+DISCONNECT_POLL_S = 0.5
+# Poids de la dernière mesure dans la durée moyenne d'un scraping
+LATENCY_SMOOTHING = 0.2
+
+
+class ClientDisconnected(Exception):
+    """Le client est parti avant la réponse"""
+
+
+class CancellationStats:
+    """
+    Temps économisé par recherche annulée : durée moyenne d'un scraping du magasin
+    moins le temps déjà passé (toute la durée si la recherche attendait sa place)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}
+        self.stats = {"disconnects": 0, "cancelled_lookups": 0, "scrape_seconds_saved": 0.0}
+
+    def completed(self, store: str, latency_s: float):
+        with self._lock:
+            previous = self._latency.get(store)
+            self._latency[store] = latency_s if previous is None else (
+                (1 - LATENCY_SMOOTHING) * previous + LATENCY_SMOOTHING * latency_s
+            )
+
+    def cancelled(self, store: str, elapsed_s: float):
+        with self._lock:
+            self.stats["cancelled_lookups"] += 1
+            self.stats["scrape_seconds_saved"] += max(0.0, self._latency.get(store, 0.0) - elapsed_s)
+
+    def disconnected(self):
+        with self._lock:
+            self.stats["disconnects"] += 1
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "scrape_seconds_saved": round(self.stats["scrape_seconds_saved"], 1),
+                "avg_scrape_s": {store: round(latency, 2) for store, latency in self._latency.items()}
+            }
+
+
+cancellation_stats = CancellationStats()
+
+
+async def run_while_connected(request, coro):
+    """
+    Exécute coro tant que le client est connecté ; sinon l'annule, ce qui annule les
+    recherches en attente ou en cours et ferme leurs pages
+
+    Raises:
+        ClientDisconnected: le client s'est déconnecté avant la fin
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_S)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                cancellation_stats.disconnected()
+                print("Client déconnecté, annulation des recherches en cours")
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
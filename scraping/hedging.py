@@ -0,0 +1,123 @@
+"""
+Requêtes couvertes (hedging) : quand une recherche dépasse le p95 observé du magasin,
+une deuxième recherche part dans un nouveau contexte navigateur ; la première réponse
+réussie gagne et l'autre est annulée
+"""
+import asyncio
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+HEDGING_ENABLED = os.getenv("SCRAPE_HEDGING", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("SCRAPE_HEDGE_PERCENTILE", "95"))
+# Part maximale de recherches doublées, par rapport au nombre total de recherches
+HEDGE_MAX_FRACTION = float(os.getenv("SCRAPE_HEDGE_MAX_FRACTION", "0.1"))
+# Pas de hedging tant que la distribution des latences n'est pas connue
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 200
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class HedgePolicy:
+
+    def __init__(self, enabled: bool = HEDGING_ENABLED, pct: float = HEDGE_PERCENTILE,
+                 max_fraction: float = HEDGE_MAX_FRACTION, min_samples: int = HEDGE_MIN_SAMPLES):
+        self.enabled = enabled
+        self.pct = pct
+        self.max_fraction = max_fraction
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self.stats = {}
+
+    def _store_stats(self, store: str) -> Dict:
+        if store not in self.stats:
+            self.stats[store] = {"lookups": 0, "hedges": 0, "hedge_wins": 0}
+            self._latencies[store] = deque(maxlen=LATENCY_SAMPLES)
+        return self.stats[store]
+
+    def observe(self, store: str, latency_s: float):
+        with self._lock:
+            self._store_stats(store)
+            self._latencies[store].append(latency_s)
+
+    def threshold(self, store: str) -> Optional[float]:
+        """Latence au-delà de laquelle une recherche est doublée, None si pas assez de mesures"""
+        with self._lock:
+            self._store_stats(store)
+            samples = list(self._latencies[store])
+        if len(samples) < self.min_samples:
+            return None
+        return percentile(samples, self.pct)
+
+    def _may_hedge(self, store: str) -> bool:
+        with self._lock:
+            stats = self._store_stats(store)
+            if stats["hedges"] + 1 > self.max_fraction * stats["lookups"]:
+                return False
+            stats["hedges"] += 1
+            return True
+
+    async def run(self, store: str, primary, hedge) -> Dict:
+        """
+        Exécute primary() et, s'il dépasse le seuil du magasin, hedge() en parallèle
+
+        Args:
+            primary: Coroutine function de la recherche principale
+            hedge: Coroutine function de la recherche de secours (nouveau contexte)
+
+        Returns:
+            Le premier résultat réussi, sinon le dernier résultat obtenu
+        """
+        with self._lock:
+            self._store_stats(store)["lookups"] += 1
+        threshold = self.threshold(store) if self.enabled else None
+        if threshold is None:
+            return await primary()
+
+        first = asyncio.ensure_future(primary())
+        try:
+            done, _ = await asyncio.wait({first}, timeout=threshold)
+            if done or not self._may_hedge(store):
+                return await first
+
+            print(f"Recherche {store} au-delà de {threshold:.1f}s, lancement d'une recherche de secours")
+            second = asyncio.ensure_future(hedge())
+            tasks = {first, second}
+            try:
+                result = None
+                while tasks:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        result = task.result()
+                        if result.get("success"):
+                            if task is second:
+                                with self._lock:
+                                    self.stats[store]["hedge_wins"] += 1
+                            return result
+                return result
+            finally:
+                for task in tasks:
+                    task.cancel()
+        finally:
+            if not first.done():
+                first.cancel()
+
+    def status(self) -> Dict:
+        with self._lock:
+            stores = {}
+            for store, stats in self.stats.items():
+                samples = list(self._latencies[store])
+                stores[store] = {
+                    **stats,
+                    "threshold_s": round(percentile(samples, self.pct), 2) if len(samples) >= self.min_samples else None,
+                    "hedge_rate": round(stats["hedges"] / stats["lookups"], 3) if stats["lookups"] else 0,
+                    "win_rate": round(stats["hedge_wins"] / stats["hedges"], 3) if stats["hedges"] else 0,
+                }
+        return {"enabled": self.enabled, "percentile": self.pct, "max_fraction": self.max_fraction, "stores": stores}
@@ -0,0 +1,326 @@
+"""
+Jobs asynchrones pour les gros paniers : file bornée traitée en arrière-plan sur la boucle
+asyncio, suivi de progression et résultats partiels consultables par identifiant
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Optional
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+# Un job terminé identique est renvoyé tel quel pendant JOB_REUSE_TTL secondes
+JOB_REUSE_TTL = float(os.getenv("JOB_REUSE_TTL", "3600"))
+# Les jobs terminés sont supprimés après JOB_RETENTION_S ; le backend mémoire en garde
+# au plus JOB_MAX_KEPT
+JOB_RETENTION_S = float(os.getenv("JOB_RETENTION_S", str(JOB_REUSE_TTL)))
+JOB_MAX_KEPT = int(os.getenv("JOB_MAX_KEPT", "1000"))
+# Intervalle minimal entre deux purges
+JOB_PURGE_INTERVAL_S = 60
+
+UNFINISHED = ("queued", "running")
+
+
+class QueueFull(Exception):
+    """Trop de jobs en attente"""
+
+
+def job_fingerprint(kind: str, payload: Dict) -> str:
+    """Empreinte d'une demande, pour retrouver un job identique déjà soumis"""
+    raw = json.dumps({"kind": kind, "payload": payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _finished_before(job: Dict, before: float) -> bool:
+    return job["status"] not in UNFINISHED and (job.get("finished_at") or 0) < before
+
+
+class MemoryJobBackend:
+    """Stockage des jobs en mémoire (perdu au redémarrage), au plus max_kept jobs terminés"""
+
+    def __init__(self, max_kept: int = JOB_MAX_KEPT):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.max_kept = max_kept
+
+    def save(self, job: Dict):
+        with self._lock:
+            self._jobs[job["id"]] = job
+            if len(self._jobs) > self.max_kept:
+                finished = [j for j in self._jobs.values() if j["status"] not in UNFINISHED]
+                finished.sort(key=lambda j: j["finished_at"] or 0)
+                for old in finished[:len(self._jobs) - self.max_kept]:
+                    del self._jobs[old["id"]]
+
+    def add_result(self, job: Dict, result: Dict):
+        """Le job en mémoire est l'objet modifié par JobProgress : rien à écrire"""
+
+    def purge(self, before: float) -> int:
+        """Supprime les jobs terminés avant before, renvoie leur nombre"""
+        with self._lock:
+            old = [job_id for job_id, job in self._jobs.items() if _finished_before(job, before)]
+            for job_id in old:
+                del self._jobs[job_id]
+        return len(old)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find(self, fingerprint: str) -> Optional[Dict]:
+        """Job le plus récent ayant cette empreinte"""
+        with self._lock:
+            found = [job for job in self._jobs.values() if job["fingerprint"] == fingerprint]
+        return max(found, key=lambda job: job["submitted_at"]) if found else None
+
+    def unfinished(self) -> list:
+        with self._lock:
+            return [job for job in self._jobs.values() if job["status"] in UNFINISHED]
+
+
+class SQLiteJobBackend:
+    """
+    Stockage des jobs dans SQLite (partagé entre redémarrages).
+    Les résultats partiels sont ajoutés ligne par ligne dans job_results : un article
+    terminé coûte une insertion, pas la réécriture de tout le job.
+    """
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, fingerprint TEXT, status TEXT, submitted_at REAL, data TEXT)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in [("finished_at", "REAL"), ("progress", "TEXT")]:
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_fingerprint ON jobs (fingerprint)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_results (job_id TEXT, seq INTEGER, data TEXT, PRIMARY KEY (job_id, seq))"
+        )
+        self._db.commit()
+
+    def save(self, job: Dict):
+        """Écrit le job sans ses résultats (voir add_result)"""
+        data = {key: value for key, value in job.items() if key != "results"}
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (id, fingerprint, status, submitted_at, finished_at, progress, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job["id"], job["fingerprint"], job["status"], job["submitted_at"], job.get("finished_at"),
+                 json.dumps(job["progress"]), json.dumps(data, default=str))
+            )
+            self._db.commit()
+
+    def add_result(self, job: Dict, result: Dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO job_results (job_id, seq, data) VALUES (?, ?, ?)",
+                (job["id"], len(job["results"]) - 1, json.dumps(result, default=str))
+            )
+            self._db.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(job["progress"]), job["id"]))
+            self._db.commit()
+
+    def _load(self, row) -> Dict:
+        """Job complet : données, progression la plus récente et résultats partiels"""
+        job_id, progress, data = row
+        job = json.loads(data)
+        if progress:
+            job["progress"] = json.loads(progress)
+        results = self._db.execute(
+            "SELECT data FROM job_results WHERE job_id = ? ORDER BY seq", (job_id,)
+        ).fetchall()
+        # Jobs écrits avant job_results : résultats dans data
+        job["results"] = [json.loads(r[0]) for r in results] or job.get("results", [])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute("SELECT id, progress, data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._load(row) if row else None
+
+    def find(self, fingerprint: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, progress, data FROM jobs WHERE fingerprint = ? ORDER BY submitted_at DESC LIMIT 1", (fingerprint,)
+            ).fetchone()
+            return self._load(row) if row else None
+
+    def purge(self, before: float) -> int:
+        """Supprime les jobs terminés avant before et leurs résultats, renvoie leur nombre"""
+        with self._lock:
+            # Jobs d'avant la colonne finished_at : date de soumission
+            condition = "status NOT IN (?, ?) AND COALESCE(finished_at, submitted_at) < ?"
+            params = (*UNFINISHED, before)
+            self._db.execute(f"DELETE FROM job_results WHERE job_id IN (SELECT id FROM jobs WHERE {condition})", params)
+            deleted = self._db.execute(f"DELETE FROM jobs WHERE {condition}", params).rowcount
+            self._db.commit()
+        return deleted
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM jobs WHERE status IN (?, ?)", UNFINISHED
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+def make_backend() -> object:
+    """Backend choisi par JOB_BACKEND : "memory" (défaut) ou "sqlite" (JOB_DB_PATH)"""
+    if os.getenv("JOB_BACKEND", "memory") == "sqlite":
+        return SQLiteJobBackend(os.getenv("JOB_DB_PATH", "jobs.sqlite3"))
+    return MemoryJobBackend()
+
+
+class JobProgress:
+    """Passé au runner d'un job pour publier sa progression et ses résultats partiels"""
+
+    def __init__(self, queue, job: Dict):
+        self._queue = queue
+        self._job = job
+
+    def set_total(self, total: int):
+        self._job["progress"]["total"] = total
+        self._queue.backend.save(self._job)
+
+    def add(self, result: Dict):
+        self._job["results"].append(result)
+        self._job["progress"]["done"] += 1
+        self._queue.backend.add_result(self._job, result)
+
+
+class JobQueue:
+    """
+    File de jobs bornée. runners associe un type de job à une coroutine
+    runner(payload, progress) qui renvoie le résumé final du job.
+    """
+
+    def __init__(self, backend, runners: Dict, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_SIZE):
+        self.backend = backend
+        self.runners = runners
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue = None
+        self._tasks = []
+        self._running = 0
+        self._wait_times = deque(maxlen=200)
+        self._purged_at = 0.0
+        self.stats = {"submitted": 0, "reused": 0, "rejected": 0, "completed": 0, "failed": 0, "purged": 0}
+
+    def _start(self):
+        """Démarre les workers sur la boucle courante au premier job"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        # Jobs interrompus par un redémarrage : ils ne reprendront pas
+        for job in self.backend.unfinished():
+            job.update(status="failed", error="Interrompu par un redémarrage", finished_at=time.time())
+            self.backend.save(job)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, kind: str, payload: Dict, total: int = 0) -> Dict:
+        """
+        Met un job en file, ou renvoie le job identique en cours / terminé récemment
+
+        Raises:
+            QueueFull: la file est pleine
+        """
+        if kind not in self.runners:
+            raise ValueError(f"Type de job inconnu: {kind}")
+        self._start()
+        self._purge()
+
+        fingerprint = job_fingerprint(kind, payload)
+        existing = self.backend.find(fingerprint)
+        if existing is not None and (
+            existing["status"] in UNFINISHED
+            or (existing["status"] == "done" and time.time() - existing["finished_at"] < JOB_REUSE_TTL)
+        ):
+            self.stats["reused"] += 1
+            return existing
+
+        if self._queue.full():
+            self.stats["rejected"] += 1
+            raise QueueFull(f"{self._queue.qsize()} jobs en attente")
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "fingerprint": fingerprint,
+            "status": "queued",
+            "payload": payload,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "progress": {"done": 0, "total": total},
+            "results": [],
+            "summary": None,
+            "error": None,
+        }
+        self.backend.save(job)
+        self._queue.put_nowait(job["id"])
+        self.stats["submitted"] += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.backend.get(job_id)
+
+    def _purge(self):
+        """Supprime les jobs terminés depuis plus de JOB_RETENTION_S (au plus une fois par minute)"""
+        now = time.time()
+        if now - self._purged_at < JOB_PURGE_INTERVAL_S:
+            return
+        self._purged_at = now
+        self.stats["purged"] += self.backend.purge(now - JOB_RETENTION_S)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = self.backend.get(job_id)
+        if job is None:
+            return
+        job["started_at"] = time.time()
+        job["status"] = "running"
+        self._wait_times.append(job["started_at"] - job["submitted_at"])
+        self.backend.save(job)
+
+        self._running += 1
+        try:
+            job["summary"] = await self.runners[job["kind"]](job["payload"], JobProgress(self, job))
+            job["status"] = "done"
+            self.stats["completed"] += 1
+        except Exception as e:
+            print(f"Job {job_id} en échec: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+            self.stats["failed"] += 1
+        finally:
+            self._running -= 1
+            job["finished_at"] = time.time()
+            self.backend.save(job)
+
+    def status(self) -> Dict:
+        waits = list(self._wait_times)
+        return {
+            "backend": type(self.backend).__name__,
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queued": self.max_queued,
+            "running": self._running,
+            "avg_wait_s": round(sum(waits) / len(waits), 3) if waits else 0,
+            "max_wait_s": round(max(waits), 3) if waits else 0,
+            **self.stats
+        }
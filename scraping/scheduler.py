@@ -0,0 +1,144 @@
+"""
+Ordonnanceur global des scrapings : toutes les places de scraping du processus, avec une
+limite par magasin et une limite globale, partagées par tous les endpoints et requêtes
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+SCRAPE_GLOBAL_LIMIT = int(os.getenv("SCRAPE_GLOBAL_LIMIT", "8"))
+
+
+class _Waiter:
+    __slots__ = ("store", "wake", "granted")
+
+    def __init__(self, store: str, wake):
+        self.store = store
+        self.wake = wake
+        self.granted = False
+
+
+class ScrapeScheduler:
+    """
+    Les demandes sont servies dans l'ordre d'arrivée, en sautant celles dont le magasin
+    est à sa limite. Une place libérée est donnée directement au prochain en attente.
+    """
+
+    def __init__(self, limits: Dict[str, int], global_limit: int = SCRAPE_GLOBAL_LIMIT):
+        self.global_limit = global_limit
+        self.limits = {
+            store: int(os.getenv(f"SCRAPE_LIMIT_{store.upper()}", limit))
+            for store, limit in limits.items()
+        }
+        self.active = {store: 0 for store in self.limits}
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self.stats = {store: {"granted": 0, "total_wait_s": 0.0, "max_wait_s": 0.0} for store in self.limits}
+
+    def _has_room(self, store: str) -> bool:
+        return sum(self.active.values()) < self.global_limit and self.active[store] < self.limits[store]
+
+    def _grant(self, store: str):
+        self.active[store] += 1
+        self.stats[store]["granted"] += 1
+
+    def _try_acquire(self, store: str, wake) -> _Waiter:
+        """Prend une place tout de suite si possible, sinon s'inscrit dans la file"""
+        with self._lock:
+            if store not in self.limits:
+                raise ValueError(f"Magasin non supporté: {store}")
+            waiter = _Waiter(store, wake)
+            # Les places libérées vont d'abord à ceux qui attendent le même magasin
+            queued = any(w.store == store for w in self._waiters)
+            if not queued and self._has_room(store):
+                self._grant(store)
+                waiter.granted = True
+            else:
+                self._waiters.append(waiter)
+            return waiter
+
+    def _dispatch(self):
+        """Donne les places libres aux demandes en attente (appelé sous self._lock)"""
+        for waiter in list(self._waiters):
+            if self._has_room(waiter.store):
+                self._waiters.remove(waiter)
+                self._grant(waiter.store)
+                waiter.granted = True
+                waiter.wake()
+            elif sum(self.active.values()) >= self.global_limit:
+                break
+
+    def _release(self, store: str):
+        with self._lock:
+            self.active[store] -= 1
+            self._dispatch()
+
+    def set_limit(self, store: str, limit: int):
+        """Change la limite d'un magasin ; les scrapings en cours au-delà finissent normalement"""
+        with self._lock:
+            self.limits[store] = limit
+            self._dispatch()
+
+    def _cancel(self, waiter: _Waiter):
+        """Abandon d'une attente ; si la place a déjà été donnée, elle est rendue"""
+        with self._lock:
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                return
+        self._release(waiter.store)
+
+    def _record_wait(self, store: str, waited: float):
+        with self._lock:
+            stats = self.stats[store]
+            stats["total_wait_s"] += waited
+            stats["max_wait_s"] = max(stats["max_wait_s"], waited)
+
+    @asynccontextmanager
+    async def slot(self, store: str):
+        """Place de scraping pour store, attendue sur la boucle asyncio"""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        start = time.monotonic()
+        waiter = self._try_acquire(store, lambda: loop.call_soon_threadsafe(
+            lambda: ready.done() or ready.set_result(None)
+        ))
+        if not waiter.granted:
+            try:
+                await ready
+            except BaseException:
+                self._cancel(waiter)
+                raise
+            self._record_wait(store, time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self._release(store)
+
+    def status(self) -> Dict:
+        with self._lock:
+            waiting = {store: 0 for store in self.limits}
+            for waiter in self._waiters:
+                waiting[waiter.store] += 1
+            active_total = sum(self.active.values())
+            return {
+                "global_limit": self.global_limit,
+                "active": active_total,
+                "queue_depth": len(self._waiters),
+                "utilisation": round(active_total / self.global_limit, 2) if self.global_limit else 0,
+                "stores": {
+                    store: {
+                        "limit": limit,
+                        "active": self.active[store],
+                        "queue_depth": waiting[store],
+                        "utilisation": round(self.active[store] / limit, 2) if limit else 0,
+                        "granted": self.stats[store]["granted"],
+                        "total_wait_s": round(self.stats[store]["total_wait_s"], 2),
+                        "max_wait_s": round(self.stats[store]["max_wait_s"], 2)
+                    }
+                    for store, limit in self.limits.items()
+                }
+            }
@@ -0,0 +1,73 @@
+"""
+Regroupement des recherches identiques en cours : un seul scraping par clé,
+tous les appelants concurrents reçoivent son résultat
+"""
+import asyncio
+from typing import Dict
+
+from stores.deadline import current_end, shared_deadline
+
+
+class AsyncSingleFlight:
+    """
+    Recherches de search_single_item_async.
+    La tâche partagée tourne sous l'échéance la plus tardive de ses appelants (repoussée
+    quand un appelant la rejoint) : celle d'un appelant pressé n'écourte pas le résultat
+    des autres, mais les timeouts des scrapers restent bornés. Chaque appelant borne sa
+    propre attente (asyncio.wait_for, process_items_list) et la tâche est annulée quand
+    plus personne n'attend.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._waiters = {}
+        self._deadlines = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "abandoned": 0}
+
+    async def do(self, key: str, coro_fn):
+        """
+        Attend la tâche en cours pour key, ou lance coro_fn() si aucune n'existe
+
+        Returns:
+            (résultat, shared) avec shared True si le résultat vient d'un autre appel
+        """
+        task = self._tasks.get(key)
+        shared = task is not None
+        if shared:
+            self.stats["coalesced"] += 1
+            self._deadlines[task].extend(current_end())
+        else:
+            self.stats["leaders"] += 1
+            with shared_deadline() as task_deadline:
+                task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            self._deadlines[task] = task_deadline
+            self._waiters[task] = 0
+            task.add_done_callback(lambda done: self._forget(key, done))
+        self._waiters[task] += 1
+        try:
+            # shield : l'annulation d'un appelant n'interrompt pas le scraping des autres
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            # Plus personne n'attend ce résultat : on arrête le scraping
+            if self._waiters.get(task) == 1 and not task.done():
+                self.stats["abandoned"] += 1
+                self._forget(key, task)
+                task.cancel()
+            raise
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+
+    def _forget(self, key: str, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        self._waiters.pop(task, None)
+        self._deadlines.pop(task, None)
+
+    def status(self) -> Dict:
+        return {"in_flight": len(self._tasks), **self.stats}
+
+
+# Recherches de prix en cours, partagées par tous les endpoints
+price_lookups_async = AsyncSingleFlight()
@@ -0,0 +1,63 @@
+"""
+Mesure du démarrage à froid par phase (imports, cache, navigateurs, contextes des magasins)
+et état de préchauffage exposé par /ready
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+import psutil
+
+
+class StartupReport:
+    """
+    Durée de chaque phase du démarrage. Une phase en erreur est notée mais n'empêche
+    pas les suivantes : le serveur répond même si un navigateur n'a pas pu être préchauffé.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {}
+        self.errors = {}
+        self.ready = False
+        self.ready_after_s = None
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.phases[name] = round(seconds * 1000, 1)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Chronomètre le bloc ; une exception est enregistrée puis ignorée"""
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self.errors[name] = str(e)
+            print(f"Démarrage : phase {name} en erreur: {e}")
+        finally:
+            self.record(name, time.monotonic() - start)
+
+    def mark_ready(self):
+        """Fin du préchauffage : affiche le détail des phases (suivi des régressions de démarrage)"""
+        with self._lock:
+            self.ready = True
+            # Depuis le lancement du processus, import du serveur ASGI compris
+            self.ready_after_s = round(time.time() - psutil.Process().create_time(), 2)
+            phases = ", ".join(f"{name} {ms} ms" for name, ms in self.phases.items())
+        print(f"Démarrage : {phases} ; prêt {self.ready_after_s} s après le lancement du processus")
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "warm": self.ready and not self.errors,
+                "ready_after_s": self.ready_after_s,
+                "phases_ms": dict(self.phases),
+                "errors": dict(self.errors)
+            }
+
+
+startup = StartupReport()
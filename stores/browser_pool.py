@@ -0,0 +1,137 @@
+"""
+Pool de navigateurs Chromium partagé par tous les scrapers du processus
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+# Playwright est importé au premier lancement de navigateur : ~100 ms de moins au démarrage
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0 Safari/537.36"
+)
+
+LAUNCH_ARGS = ['--incognito']
+
+
+class _AsyncBrowser:
+    """Navigateur du pool async et ses compteurs d'utilisation"""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.uses = 0
+        self.active = 0
+        self.retiring = False
+
+
+class AsyncBrowserPool:
+    """
+    Nombre borné de navigateurs Chromium longue durée, utilisés depuis la boucle asyncio.
+    Chaque recherche reçoit un BrowserContext neuf (incognito, sans cookies partagés).
+    Un navigateur peut servir plusieurs contextes à la fois ; les recherches sont
+    réparties sur le navigateur le moins chargé, recyclé après max_uses contextes.
+    """
+
+    def __init__(self, size: int = None, max_uses: int = None):
+        self.size = size or int(os.getenv("BROWSER_POOL_SIZE", "4"))
+        self.max_uses = max_uses or int(os.getenv("BROWSER_MAX_USES", "50"))
+        self._playwright = None
+        self._browsers = []
+        self._lock = asyncio.Lock()
+        self.stats = {"launches": 0, "recycled": 0, "crashes": 0, "contexts": 0}
+
+    async def _launch(self) -> _AsyncBrowser:
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+        self.stats["launches"] += 1
+        slot = _AsyncBrowser(browser)
+        self._browsers.append(slot)
+        return slot
+
+    async def _acquire(self) -> _AsyncBrowser:
+        async with self._lock:
+            # Retirer les navigateurs qui ont planté
+            for slot in [b for b in self._browsers if not b.browser.is_connected()]:
+                self._browsers.remove(slot)
+                self.stats["crashes"] += 1
+
+            candidates = [b for b in self._browsers if not b.retiring]
+            slot = min(candidates, key=lambda b: b.active, default=None)
+            if slot is None or (slot.active > 0 and len(self._browsers) < self.size):
+                slot = await self._launch()
+
+            slot.uses += 1
+            slot.active += 1
+            if slot.uses >= self.max_uses:
+                slot.retiring = True
+            self.stats["contexts"] += 1
+            return slot
+
+    async def _release(self, slot: _AsyncBrowser):
+        slot.active -= 1
+        if slot.retiring and slot.active == 0:
+            async with self._lock:
+                if slot in self._browsers:
+                    self._browsers.remove(slot)
+                    self.stats["recycled"] += 1
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+
+    async def prelaunch(self, count: int = 1):
+        """Lance à l'avance jusqu'à count navigateurs (sans dépasser size)"""
+        async with self._lock:
+            while len(self._browsers) < min(count, self.size):
+                await self._launch()
+
+    @asynccontextmanager
+    async def new_context(self):
+        """Fournit un BrowserContext neuf, fermé à la sortie du bloc"""
+        slot = await self._acquire()
+        try:
+            context = await slot.browser.new_context(user_agent=USER_AGENT)
+            try:
+                yield context
+            finally:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+        finally:
+            await self._release(slot)
+
+    def status(self) -> dict:
+        return {
+            "size": self.size,
+            "max_uses": self.max_uses,
+            "browsers": len(self._browsers),
+            "active_contexts": sum(b.active for b in self._browsers),
+            **self.stats
+        }
+
+    async def close(self):
+        browsers, self._browsers = self._browsers, []
+        for slot in browsers:
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+_async_pool = None
+
+
+def get_async_browser_pool() -> AsyncBrowserPool:
+    """Retourne le pool de navigateurs async (lié à la boucle asyncio du serveur)"""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = AsyncBrowserPool()
+    return _async_pool
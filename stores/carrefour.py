@@ -1,82 +1,111 @@
-from playwright.sync_api import sync_playwright
+import asyncio
+from stores.browser_pool import get_async_browser_pool
+from stores.resources import ResourcePolicy
+from stores.dom import parse_html
+from stores.http_fast import FastPath, FastPathUnavailable
+from stores.common import (
+    TILE_LIMIT,
+    Readiness,
+    open_search_async,
+    wait_until_ready_async,
+    dismiss_cookies_async,
+    extract_tiles_async,
+    score_tiles,
+    select_prices,
+)
 from urllib.parse import quote_plus
-import time
-from regex.utils import fuzzy_score
-import json
 
 URL="https://www.carrefour.fr/s?q="
 
-def get_price_carrefour(city: str, item: dict):
-    
-    query = f"{item.get('name', '')} {item.get('brand', '')} {item.get('quantity', '')}".strip()
+READINESS = Readiness("article.product-list-card-plp-grid-new")
+RESOURCE_POLICY = ResourcePolicy("carrefour", extra_domains=["tagcommander.com", "commander1.com"])
+
+# Le prix est affiché en deux parties : "2" et ",35"
+EXTRACT_JS = """
+([selector, limit]) => Array.from(document.querySelectorAll(selector)).slice(0, limit).map(a => {
+    const text = s => { const e = a.querySelector(s); return e ? e.innerText.trim() : null; };
+    const priceInt = text(".product-price__content.c-text--size-m");
+    const priceDec = text(".product-price__content.c-text--size-s");
+    return {
+        name: text(".product-list-card-plp-grid-new__title"),
+        brand: text(".product-list-card-plp-grid-new__brand") || "",
+        price_text: priceInt !== null && priceDec !== null ? priceInt + priceDec : null
+    };
+})
+"""
+
+
+def parse_price(price_text: str) -> float:
+    return float(price_text.replace(",", ".").strip())
+
+
+def build_query(item: dict) -> str:
+    return f"{item.get('name', '')} {item.get('brand', '')} {item.get('quantity', '')}".strip()
+
+
+def parse_search_html(html: str) -> list:
+    """Équivalent de EXTRACT_JS sur le HTML rendu côté serveur"""
+    tiles = []
+    for a in parse_html(html).select(READINESS.selector)[:TILE_LIMIT]:
+        price_int = a.select_text(".product-price__content.c-text--size-m")
+        price_dec = a.select_text(".product-price__content.c-text--size-s")
+        tiles.append({
+            "name": a.select_text(".product-list-card-plp-grid-new__title"),
+            "brand": a.select_text(".product-list-card-plp-grid-new__brand") or "",
+            "price_text": price_int + price_dec if price_int is not None and price_dec is not None else None
+        })
+    return tiles
+
+
+FAST_PATH = FastPath("carrefour", parse_search_html)
+
+
+async def get_price_carrefour_async(city: str, item: dict):
+    """Recherche dans un contexte du pool de navigateurs, sur la boucle asyncio"""
+    query = build_query(item)
     url = f"{URL}{quote_plus(query)}"
     print(f"Recherche Carrefour : {url}")
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True, args=['--incognito'])
-        context = browser.new_context(user_agent=(
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0 Safari/537.36"
-        ))
-        page = context.new_page()
-        page.goto(url, wait_until="networkidle", timeout=20000)
-
-        # Gérer la popup cookies
-        try:
-            if page.is_visible('button:has-text("Continuer sans accepter")'):
-                page.click('button:has-text("Continuer sans accepter")')
-            elif page.is_visible('button:has-text("Tout accepter")'):
-                page.click('button:has-text("Tout accepter")')
-            time.sleep(1)
-        except:
-            pass
-
-        # Attendre les articles
-        try:
-            page.wait_for_selector("article.product-list-card-plp-grid-new", timeout=20000)
-        except:
-            print("Aucun produit trouvé pour", query)
-            return "", "", False
-
-        articles = page.query_selector_all("article.product-list-card-plp-grid-new")
-        results = []
-
-        for a in articles[:5]:
-            try:
-                name = a.query_selector(".product-list-card-plp-grid-new__title").inner_text().strip()
-                brand = a.query_selector(".product-list-card-plp-grid-new__brand").inner_text().strip() if a.query_selector(".product-list-card-plp-grid-new__brand") else ""
-                price_int = a.query_selector(".product-price__content.c-text--size-m").inner_text().strip()
-                price_dec = a.query_selector(".product-price__content.c-text--size-s").inner_text().replace(",", ".").strip()
-                price = float(price_int + price_dec)
-               
-
-                full_text = f"{name} {brand}"
-                score = fuzzy_score(query, full_text)
-
-                results.append({
-                    "name": name,
-                    "brand": brand,
-                    "price": price,
-                    "score": score
-                })
-            except:
-                continue
-
-        browser.close()
-
-        if not results:
-            return "", "", False
-
-        bests = sorted(results[:5], key=lambda x: x["score"], reverse=True)
-        bests_sorted_by_price = sorted(bests[:3], key=lambda x: x["price"])
-        highest_price = bests_sorted_by_price[-1]["price"]
-        lowest_price = bests_sorted_by_price[0]["price"]
-        return highest_price, lowest_price, True
+    async with get_async_browser_pool().new_context() as context:
+        return await _search_carrefour_async(context, city, query, url)
+
+
+def get_price_carrefour_http(city: str, item: dict):
+    """
+    Chemin rapide sans navigateur : lit le HTML de la page de recherche
+
+    Raises:
+        FastPathUnavailable: page anti-bot, erreur HTTP ou aucune tuile lisible
+    """
+    query = build_query(item)
+    url = f"{URL}{quote_plus(query)}"
+
+    tiles = FAST_PATH.fetch_tiles(url)
+    highest_price, lowest_price, success = select_prices(score_tiles(query, tiles, parse_price, "Carrefour"))
+    if not success:
+        raise FastPathUnavailable(f"Aucun prix lisible dans le HTML pour {query}")
+    return highest_price, lowest_price, success
+
+
+async def _search_carrefour_async(context, city: str, query: str, url: str):
+    await RESOURCE_POLICY.install_async(context)
+    page = await context.new_page()
+    await open_search_async(page, url, timeout=20000)
+
+    # Gérer la popup cookies
+    await dismiss_cookies_async(page)
+
+    # Attendre les articles
+    if not await wait_until_ready_async(page, READINESS, timeout=20000):
+        print("Aucun produit trouvé pour", query)
+        return "", "", False
+
+    tiles = await extract_tiles_async(page, EXTRACT_JS, READINESS)
+    return select_prices(score_tiles(query, tiles, parse_price, "Carrefour"))
 
 
 # Test de la fonction
 if __name__ == "__main__":
     item = {"name": "Prince", "brand": "LU", "quantity": ""}
-    best = get_price_carrefour("Le port-marly", item)
+    best = asyncio.run(get_price_carrefour_async("Le port-marly", item))
     print(best)
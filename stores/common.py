@@ -0,0 +1,155 @@
+"""
+Fonctions partagées par les scrapers des magasins (Playwright async)
+"""
+from urllib.parse import urlparse
+
+from regex.utils import fuzzy_scores
+from stores.deadline import budget_ms
+from stores.http_fast import BotChallenge, is_bot_challenge
+
+COOKIE_BUTTONS = [
+    'button:has-text("Continuer sans accepter")',
+    'button:has-text("Tout accepter")',
+]
+
+# Nombre de tuiles produits lues par recherche
+TILE_LIMIT = 5
+
+ENOUGH_TILES_JS = "([selector, count]) => document.querySelectorAll(selector).length >= count"
+
+
+class Readiness:
+    """
+    Événement qui signale qu'une page de recherche affiche ses résultats :
+    la première tuile produit, puis au plus settle_ms pour en voir min_count.
+    """
+
+    def __init__(self, selector: str, min_count: int = 5, settle_ms: int = 1500):
+        self.selector = selector
+        self.min_count = min_count
+        self.settle_ms = settle_ms
+
+
+async def open_search_async(page, url: str, timeout: int):
+    """Charge la page de recherche sans attendre la fin du trafic réseau (timeout borné par l'échéance)"""
+    await page.goto(url, wait_until="domcontentloaded", timeout=budget_ms(timeout))
+
+
+async def warm_up_context_async(context, resource_policy, url: str, timeout: int):
+    """
+    Ouvre l'accueil du magasin dans un contexte : processus de rendu démarré et DNS
+    résolu avant la première recherche
+    """
+    await resource_policy.install_async(context)
+    page = await context.new_page()
+    parts = urlparse(url)
+    await page.goto(f"{parts.scheme}://{parts.netloc}/", wait_until="commit", timeout=timeout)
+
+
+async def wait_until_ready_async(page, readiness: Readiness, timeout: int) -> bool:
+    """
+    Attend la première tuile produit puis sort dès que min_count tuiles existent
+
+    Returns:
+        False si aucune tuile n'est apparue avant timeout
+
+    Raises:
+        BotChallenge: la page affichée est un mur anti-bot
+    """
+    try:
+        await page.wait_for_selector(readiness.selector, timeout=budget_ms(timeout))
+    except:
+        try:
+            html = await page.content()
+        except Exception:
+            html = ""
+        _check_challenge(page.url, html)
+        return False
+
+    try:
+        await page.wait_for_function(
+            ENOUGH_TILES_JS, arg=[readiness.selector, readiness.min_count], timeout=budget_ms(readiness.settle_ms)
+        )
+    except:
+        pass  # Moins de min_count résultats : on garde ceux affichés
+    return True
+
+
+def _check_challenge(url: str, html: str):
+    """Distingue un mur anti-bot d'une recherche sans résultat"""
+    if is_bot_challenge(html):
+        raise BotChallenge(f"Page anti-bot ({urlparse(url).hostname})")
+
+
+async def dismiss_cookies_async(page, buttons=COOKIE_BUTTONS, wait_ms: int = 0):
+    """
+    Ferme la popup cookies avec le premier bouton visible
+
+    Args:
+        wait_ms: Délai d'attente de la popup si elle n'est pas encore affichée
+    """
+    try:
+        if wait_ms:
+            await page.wait_for_selector(", ".join(buttons), timeout=budget_ms(wait_ms))
+        for button in buttons:
+            if await page.is_visible(button):
+                await page.click(button)
+                break
+    except:
+        pass
+
+
+async def extract_tiles_async(page, script: str, readiness: Readiness) -> list:
+    """
+    Lit les premières tuiles produits en un seul aller-retour avec le navigateur
+
+    Args:
+        script: Fonction JS ([selector, limit]) => [{name, brand, price_text}, ...]
+    """
+    return await page.evaluate(script, [readiness.selector, TILE_LIMIT])
+
+
+def score_tiles(query: str, tiles: list, parse_price, store_label: str) -> list:
+    """
+    Convertit les tuiles extraites en résultats notés par rapport à la recherche
+
+    Args:
+        parse_price: Fonction propre au magasin, price_text -> float
+        store_label: Nom du magasin pour les messages d'erreur
+    """
+    results = []
+    for tile in tiles:
+        if not tile.get("price_text"):
+            continue
+        try:
+            price = parse_price(tile["price_text"])
+        except ValueError as e:
+            print(f"Erreur lors du traitement d'un article {store_label} : {e}")
+            continue
+
+        results.append({
+            "name": tile.get("name") or "",
+            "brand": tile.get("brand") or "",
+            "price": price
+        })
+
+    # Toutes les tuiles notées en un seul appel RapidFuzz
+    scores = fuzzy_scores(query, [f"{r['name']} {r['brand']}" for r in results])
+    for result, score in zip(results, scores):
+        result["score"] = score
+    return results
+
+
+def select_prices(results):
+    """
+    Garde les 3 articles les plus proches de la recherche parmi les 5 premiers
+    et retourne (prix le plus haut, prix le plus bas, succès)
+    """
+    if not results:
+        return "", "", False
+
+    bests = sorted(results[:5], key=lambda x: x["score"], reverse=True)
+    bests_sorted_by_price = sorted(bests[:3], key=lambda x: x["price"])
+    highest_price = bests_sorted_by_price[-1]["price"]
+    lowest_price = bests_sorted_by_price[0]["price"]
+    return highest_price, lowest_price, True
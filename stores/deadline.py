@@ -0,0 +1,93 @@
+"""
+Échéance de la requête en cours, propagée aux scrapers par contextvars : les timeouts
+Playwright et HTTP sont raccourcis pour ne jamais dépasser le budget de l'appelant
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+_deadline = ContextVar("scrape_deadline", default=None)
+
+
+@contextmanager
+def deadline(deadline_ms: Optional[float]):
+    """
+    Fixe l'échéance des recherches lancées dans ce bloc (tâches asyncio et
+    threads créés depuis ce contexte compris)
+
+    Args:
+        deadline_ms: Budget en millisecondes, None pour ne rien changer
+    """
+    if deadline_ms is None:
+        yield
+        return
+    token = _deadline.set(time.monotonic() + deadline_ms / 1000)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class SharedDeadline:
+    """
+    Échéance d'un travail partagé entre plusieurs appelants (single-flight) : la plus
+    tardive des leurs, None (sans limite) dès que l'un d'eux n'en a pas. Elle est relue
+    à chaque timeout : un appelant qui arrive pendant le travail repousse les suivants.
+    """
+
+    def __init__(self, end: Optional[float]):
+        self.end = end
+
+    def extend(self, end: Optional[float]):
+        """Ajoute l'échéance d'un nouvel appelant"""
+        if self.end is not None:
+            self.end = None if end is None else max(self.end, end)
+
+
+def current_end() -> Optional[float]:
+    """Échéance (time.monotonic) du contexte courant, None sans échéance"""
+    end = _deadline.get()
+    return end.end if isinstance(end, SharedDeadline) else end
+
+
+@contextmanager
+def shared_deadline():
+    """
+    Remplace l'échéance de l'appelant par une SharedDeadline dans ce bloc, pour créer
+    un travail que d'autres appelants rejoindront (SharedDeadline.extend)
+    """
+    shared = SharedDeadline(current_end())
+    token = _deadline.set(shared)
+    try:
+        yield shared
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_s() -> Optional[float]:
+    """Temps restant avant l'échéance (peut être négatif), None sans échéance"""
+    end = current_end()
+    return None if end is None else end - time.monotonic()
+
+
+def expired() -> bool:
+    """True si l'échéance est passée : le résultat a pu être écourté par elle"""
+    remaining = remaining_s()
+    return remaining is not None and remaining <= 0
+
+
+def budget_ms(timeout_ms: float) -> float:
+    """Timeout Playwright borné par l'échéance (au moins 1 ms : 0 désactive le timeout)"""
+    remaining = remaining_s()
+    if remaining is None:
+        return timeout_ms
+    return max(1, min(timeout_ms, remaining * 1000))
+
+
+def budget_s(timeout_s: float) -> float:
+    """Timeout en secondes borné par l'échéance (requêtes HTTP)"""
+    remaining = remaining_s()
+    if remaining is None:
+        return timeout_s
+    return max(0.001, min(timeout_s, remaining))
@@ -0,0 +1,158 @@
+"""
+Mini-DOM construit avec html.parser pour lire des pages rendues côté serveur sans navigateur.
+Supporte les sélecteurs utilisés par les scrapers : tag, .classe, [attr], [attr='v'],
+[attr^='v'] et le combinateur descendant (espace).
+"""
+import re
+from html.parser import HTMLParser
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "source", "track", "wbr",
+}
+
+# Contenu jamais rendu comme texte
+HIDDEN_TAGS = {"script", "style", "template", "noscript"}
+
+_COMPOUND = re.compile(
+    r"""(?P<tag>^[a-zA-Z][a-zA-Z0-9-]*)"""
+    r"""|\.(?P<cls>[\w-]+)"""
+    r"""|\[(?P<attr>[\w-]+)(?:(?P<op>\^?=)(?P<q>['"])(?P<val>.*?)(?P=q))?\]"""
+)
+
+
+class Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: dict, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+
+    @property
+    def classes(self):
+        return (self.attrs.get("class") or "").split()
+
+    def get(self, name: str, default=None):
+        return self.attrs.get(name, default)
+
+    def iter(self):
+        """Descendants en ordre du document"""
+        for child in self.children:
+            if isinstance(child, Node):
+                yield child
+                yield from child.iter()
+
+    def select(self, selector: str) -> list:
+        chain = [_parse_compound(part) for part in selector.split()]
+        return [node for node in self.iter() if _matches_chain(node, chain, self)]
+
+    def select_one(self, selector: str):
+        found = self.select(selector)
+        return found[0] if found else None
+
+    def select_text(self, selector: str):
+        """Texte du premier descendant correspondant, None s'il n'existe pas"""
+        node = self.select_one(selector)
+        return node.text() if node is not None else None
+
+    def text(self) -> str:
+        """Équivalent approximatif de innerText : texte visible, espaces normalisés"""
+        parts = []
+        self._collect_text(parts)
+        return " ".join(" ".join(parts).split())
+
+    def _collect_text(self, parts):
+        for child in self.children:
+            if isinstance(child, Node):
+                if child.tag not in HIDDEN_TAGS:
+                    child._collect_text(parts)
+            else:
+                parts.append(child)
+
+
+def _parse_compound(selector: str) -> list:
+    tests = []
+    pos = 0
+    for match in _COMPOUND.finditer(selector):
+        if match.start() != pos:
+            raise ValueError(f"Sélecteur non supporté: {selector}")
+        pos = match.end()
+        if match.group("tag"):
+            tests.append(("tag", match.group("tag").lower(), None))
+        elif match.group("cls"):
+            tests.append(("class", match.group("cls"), None))
+        else:
+            tests.append(("attr", match.group("attr"), (match.group("op"), match.group("val"))))
+    if pos != len(selector):
+        raise ValueError(f"Sélecteur non supporté: {selector}")
+    return tests
+
+
+def _matches(node: Node, tests: list) -> bool:
+    for kind, name, extra in tests:
+        if kind == "tag":
+            if node.tag != name:
+                return False
+        elif kind == "class":
+            if name not in node.classes:
+                return False
+        else:
+            op, val = extra
+            value = node.attrs.get(name)
+            if value is None:
+                return False
+            if op == "=" and value != val:
+                return False
+            if op == "^=" and not value.startswith(val):
+                return False
+    return True
+
+
+def _matches_chain(node: Node, chain: list, root: Node) -> bool:
+    if not _matches(node, chain[-1]):
+        return False
+    remaining = chain[:-1]
+    ancestor = node.parent
+    while remaining and ancestor is not None and ancestor is not root:
+        if _matches(ancestor, remaining[-1]):
+            remaining = remaining[:-1]
+        ancestor = ancestor.parent
+    return not remaining
+
+
+class _TreeBuilder(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document", {})
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {k: (v if v is not None else "") for k, v in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {k: (v if v is not None else "") for k, v in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+
+    def handle_endtag(self, tag):
+        # HTML tolérant : fermer jusqu'à la balise ouvrante correspondante si elle existe
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+def parse_html(html: str) -> Node:
+    """Construit l'arbre d'un document HTML"""
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
@@ -0,0 +1,156 @@
+"""
+Chemin rapide sans navigateur : lecture du HTML rendu côté serveur avec une session HTTP
+partagée (keep-alive), avec repli sur Playwright quand il échoue
+"""
+import asyncio
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from stores.browser_pool import USER_AGENT
+from stores.deadline import budget_s
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_FAST_PATH_TIMEOUT", "8"))
+# Pages sans tuile d'affilée avant la mise en pause (résultats rendus côté client)
+EMPTY_PAGE_LIMIT = int(os.getenv("HTTP_FAST_PATH_EMPTY_LIMIT", "3"))
+
+# Marqueurs des pages anti-bot (Cloudflare, DataDome)
+CHALLENGE_MARKERS = ["/cdn-cgi/challenge-platform/", "window._cf_chl_opt", "captcha-delivery.com"]
+
+
+class FastPathUnavailable(Exception):
+    """Le chemin HTTP ne peut pas répondre : il faut passer par le navigateur"""
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Session HTTP du processus, avec un pool de connexions réutilisées"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "User-Agent": USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml,application/json;q=0.9,*/*;q=0.8",
+                "Accept-Language": "fr-FR,fr;q=0.9",
+            })
+            _session = session
+        return _session
+
+
+class BotChallenge(Exception):
+    """Le navigateur a reçu une page anti-bot à la place des résultats (compté par le disjoncteur)"""
+
+
+def is_bot_challenge(html: str) -> bool:
+    return any(marker in html for marker in CHALLENGE_MARKERS)
+
+
+# Chemins rapides déclarés par les magasins, pour /health
+FAST_PATHS = {}
+
+
+class FastPath:
+    """
+    Extracteur HTTP d'un magasin.
+    Après un mur anti-bot, ou empty_limit pages sans tuile d'affilée, le chemin est mis
+    en pause cooldown_s secondes pour ne pas payer une requête inutile avant chaque
+    repli sur le navigateur.
+    """
+
+    def __init__(self, store: str, parse_tiles, enabled: bool = True, cooldown_s: float = 600,
+                 empty_limit: int = EMPTY_PAGE_LIMIT):
+        self.store = store
+        self.parse_tiles = parse_tiles
+        self.enabled = os.getenv(f"{store.upper()}_HTTP_FAST_PATH", "1" if enabled else "0") != "0"
+        self.cooldown_s = cooldown_s
+        self.empty_limit = empty_limit
+        self.paused_until = 0.0
+        self.consecutive_empty = 0
+        self.stats = {"served": 0, "fallbacks": 0, "challenges": 0, "empty_pages": 0}
+        self._lock = threading.Lock()
+        FAST_PATHS[store] = self
+
+    def available(self) -> bool:
+        return self.enabled and time.monotonic() >= self.paused_until
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def tiles_from_html(self, html: str) -> list:
+        """Tuiles [{name, brand, price_text}] d'une page de recherche"""
+        if is_bot_challenge(html):
+            self._count("challenges")
+            self.paused_until = time.monotonic() + self.cooldown_s
+            raise FastPathUnavailable(f"Page anti-bot {self.store}")
+
+        tiles = self.parse_tiles(html)
+        with self._lock:
+            if tiles:
+                self.consecutive_empty = 0
+                return tiles
+            self.stats["empty_pages"] += 1
+            self.consecutive_empty += 1
+            if self.consecutive_empty >= self.empty_limit:
+                # Probablement rendu côté client : le HTML seul ne suffit pas
+                self.consecutive_empty = 0
+                self.paused_until = time.monotonic() + self.cooldown_s
+                print(f"Chemin HTTP {self.store} en pause : {self.empty_limit} pages sans tuile d'affilée")
+        raise FastPathUnavailable(f"Aucune tuile dans le HTML {self.store}")
+
+    def fetch_tiles(self, url: str) -> list:
+        if not self.available():
+            raise FastPathUnavailable(f"Chemin HTTP {self.store} désactivé")
+        try:
+            response = get_session().get(url, timeout=budget_s(HTTP_TIMEOUT))
+        except requests.RequestException as e:
+            raise FastPathUnavailable(str(e))
+
+        if response.status_code != 200:
+            # 403/503 : souvent un blocage, on traite comme un mur anti-bot
+            if is_bot_challenge(response.text) or response.status_code in (403, 503):
+                self._count("challenges")
+                self.paused_until = time.monotonic() + self.cooldown_s
+            raise FastPathUnavailable(f"HTTP {response.status_code} {self.store}")
+        return self.tiles_from_html(response.text)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "paused": time.monotonic() < self.paused_until,
+                **self.stats
+            }
+
+
+def fast_path_stats() -> dict:
+    return {store: fast_path.status() for store, fast_path in FAST_PATHS.items()}
+
+
+async def lookup_with_fast_path_async(fast_path: FastPath, get_price_http, get_price_browser_async, city: str, item: dict):
+    """
+    Essaie le chemin HTTP (dans un thread) puis retombe sur Playwright
+
+    Returns:
+        (highest_price, lowest_price, success, source) avec source "http" ou "browser"
+    """
+    if fast_path.available():
+        try:
+            result = await asyncio.to_thread(get_price_http, city, item)
+        except FastPathUnavailable as e:
+            fast_path._count("fallbacks")
+            print(f"Chemin HTTP indisponible, passage au navigateur : {e}")
+        else:
+            fast_path._count("served")
+            return (*result, "http")
+    return (*await get_price_browser_async(city, item), "browser")
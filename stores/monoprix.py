@@ -1,90 +1,112 @@
-import time
+import asyncio
 from urllib.parse import quote_plus
-from regex.utils import fuzzy_score
-from playwright.sync_api import sync_playwright
+from stores.browser_pool import get_async_browser_pool
+from stores.resources import ResourcePolicy
+from stores.dom import parse_html
+from stores.http_fast import FastPath, FastPathUnavailable
+from stores.common import (
+    TILE_LIMIT,
+    Readiness,
+    open_search_async,
+    wait_until_ready_async,
+    COOKIE_BUTTONS,
+    dismiss_cookies_async,
+    extract_tiles_async,
+    score_tiles,
+    select_prices,
+)
 
 URL = "https://courses.monoprix.fr/search?q="
 
-def get_price_monoprix(city: str, item: dict):
-    
-    query = f"{item.get('name', '')} {item.get('brand', '')} {item.get('quantity', '')}".strip()
+READINESS = Readiness("div[data-test^='fop-wrapper:']")
+RESOURCE_POLICY = ResourcePolicy("monoprix")
+
+# Monoprix affiche parfois un simple bouton "Accepter"
+MONOPRIX_COOKIE_BUTTONS = COOKIE_BUTTONS + ['button:has-text("Accepter")']
+
+# Pas de marque séparée chez Monoprix : elle fait partie du titre
+EXTRACT_JS = """
+([selector, limit]) => Array.from(document.querySelectorAll(selector)).slice(0, limit).map(a => {
+    const text = s => { const e = a.querySelector(s); return e ? e.innerText.trim() : null; };
+    return {
+        name: text("h3[data-test='fop-title']") || "",
+        brand: "",
+        price_text: text("span[data-test='fop-price']")
+    };
+})
+"""
+
+
+def parse_price(price_text: str) -> float:
+    # Nettoyer le prix : "4,55 €" -> "4.55"
+    return float(price_text.replace("€", "").replace(",", ".").replace("\u00a0", "").strip())
+
+
+def build_query(item: dict) -> str:
+    return f"{item.get('name', '')} {item.get('brand', '')} {item.get('quantity', '')}".strip()
+
+
+def parse_search_html(html: str) -> list:
+    """Équivalent de EXTRACT_JS sur le HTML rendu côté serveur"""
+    tiles = []
+    for a in parse_html(html).select(READINESS.selector)[:TILE_LIMIT]:
+        tiles.append({
+            "name": a.select_text("h3[data-test='fop-title']") or "",
+            "brand": "",
+            "price_text": a.select_text("span[data-test='fop-price']")
+        })
+    return tiles
+
+
+FAST_PATH = FastPath("monoprix", parse_search_html)
+
+
+async def get_price_monoprix_async(city: str, item: dict):
+    """Recherche dans un contexte du pool de navigateurs, sur la boucle asyncio"""
+    query = build_query(item)
     url = f"{URL}{quote_plus(query)}"
     print(f"Recherche Monoprix : {url}")
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True, args=['--incognito'])
-        context = browser.new_context(user_agent=(
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0 Safari/537.36"
-        ))
-        page = context.new_page()
-        page.goto(url, wait_until="networkidle", timeout=20000)
-
-        # Gérer la popup cookies
-        try:
-            if page.is_visible('button:has-text("Continuer sans accepter")'):
-                page.click('button:has-text("Continuer sans accepter")')
-            elif page.is_visible('button:has-text("Tout accepter")'):
-                page.click('button:has-text("Tout accepter")')
-            elif page.is_visible('button:has-text("Accepter")'):
-                page.click('button:has-text("Accepter")')
-            time.sleep(1)
-        except:
-            pass
-
-        # Attendre les articles
-        try:
-            page.wait_for_selector("div[data-test^='fop-wrapper:']", timeout=5000)
-        except:
-            print("Aucun produit trouvé pour", query)
-            return "", "", False
-
-        articles = page.query_selector_all("div[data-test^='fop-wrapper:']")
-        results = []
-
-        for a in articles[:5]:
-            try:
-                # Nom du produit
-                name_element = a.query_selector("h3[data-test='fop-title']")
-                name = name_element.inner_text().strip() if name_element else ""
-                
-                # Prix
-                price_element = a.query_selector("span[data-test='fop-price']")
-                if price_element:
-                    price_text = price_element.inner_text().strip()
-                    # Nettoyer le prix : "4,55 €" -> "4.55"
-                    price_text = price_text.replace("€", "").replace(",", ".").replace("\u00a0", "").strip()
-                    price = float(price_text)
-                else:
-                    continue
-                
-                full_text = f"{name}"
-                score = fuzzy_score(query, full_text)
-
-                results.append({
-                    "name": name,
-                    "price": price,
-                    "score": score
-                })
-            except Exception as e:
-                print(f"Erreur lors du traitement d'un article Monoprix : {e}")
-                continue
-
-        browser.close()
-
-        if not results:
-            return "", "", False
-
-        bests = sorted(results[:5], key=lambda x: x["score"], reverse=True)
-        bests_sorted_by_price = sorted(bests[:3], key=lambda x: x["price"])
-        highest_price = bests_sorted_by_price[-1]["price"]
-        lowest_price = bests_sorted_by_price[0]["price"]
-        return highest_price, lowest_price, True
+    async with get_async_browser_pool().new_context() as context:
+        return await _search_monoprix_async(context, city, query, url)
+
+
+def get_price_monoprix_http(city: str, item: dict):
+    """
+    Chemin rapide sans navigateur : lit le HTML de la page de recherche
+
+    Raises:
+        FastPathUnavailable: page anti-bot, erreur HTTP ou aucune tuile lisible
+    """
+    query = build_query(item)
+    url = f"{URL}{quote_plus(query)}"
+
+    tiles = FAST_PATH.fetch_tiles(url)
+    highest_price, lowest_price, success = select_prices(score_tiles(query, tiles, parse_price, "Monoprix"))
+    if not success:
+        raise FastPathUnavailable(f"Aucun prix lisible dans le HTML pour {query}")
+    return highest_price, lowest_price, success
+
+
+async def _search_monoprix_async(context, city: str, query: str, url: str):
+    await RESOURCE_POLICY.install_async(context)
+    page = await context.new_page()
+    await open_search_async(page, url, timeout=20000)
+
+    # Gérer la popup cookies
+    await dismiss_cookies_async(page, MONOPRIX_COOKIE_BUTTONS)
+
+    # Attendre les articles
+    if not await wait_until_ready_async(page, READINESS, timeout=15000):
+        print("Aucun produit trouvé pour", query)
+        return "", "", False
+
+    tiles = await extract_tiles_async(page, EXTRACT_JS, READINESS)
+    return select_prices(score_tiles(query, tiles, parse_price, "Monoprix"))
 
 
 # Test de la fonction
 if __name__ == "__main__":
     item = {"name": "Nutella", "brand": "", "quantity": "400g"}
-    best = get_price_monoprix("", item)
-    print(best)
\ No newline at end of file
+    best = asyncio.run(get_price_monoprix_async("", item))
+    print(best)
@@ -0,0 +1,84 @@
+"""
+Blocage des ressources inutiles (images, polices, médias, traceurs) pendant le scraping
+"""
+import os
+import threading
+from urllib.parse import urlparse
+
+# Mettre SCRAPER_BLOCK_RESOURCES=0 pour désactiver le blocage (mesure avant/après)
+BLOCK_RESOURCES = os.getenv("SCRAPER_BLOCK_RESOURCES", "1") != "0"
+
+BLOCKED_TYPES = {"image", "media", "font"}
+
+# Domaines tiers sans intérêt pour lire les tuiles produits
+TRACKER_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "criteo.com",
+    "criteo.net",
+    "hotjar.com",
+    "contentsquare.net",
+    "bing.com",
+    "tiktok.com",
+    "pinterest.com",
+    "snapchat.com",
+    "adnxs.com",
+    "abtasty.com",
+    "kameleoon.eu",
+    "cloudflareinsights.com",
+]
+
+
+# Politiques déclarées par les magasins, pour /health
+POLICIES = {}
+
+
+class ResourcePolicy:
+    """Politique de blocage d'un magasin, installée sur chaque BrowserContext via route()"""
+
+    def __init__(self, store: str, blocked_types=BLOCKED_TYPES, extra_domains=None, enabled: bool = None):
+        self.store = store
+        self.blocked_types = set(blocked_types)
+        self.blocked_domains = TRACKER_DOMAINS + list(extra_domains or [])
+        self.enabled = BLOCK_RESOURCES if enabled is None else enabled
+        self.stats = {"allowed": 0, "blocked": 0}
+        self._lock = threading.Lock()
+        POLICIES[store] = self
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.blocked_types:
+            return True
+        host = urlparse(url).hostname or ""
+        return any(host == d or host.endswith("." + d) for d in self.blocked_domains)
+
+    def _decide(self, request) -> bool:
+        blocked = self.should_block(request.resource_type, request.url)
+        with self._lock:
+            self.stats["blocked" if blocked else "allowed"] += 1
+        return blocked
+
+    async def install_async(self, context):
+        """Installe la politique sur un BrowserContext (route sur toutes les requêtes)"""
+        if not self.enabled:
+            return
+
+        async def handler(route):
+            if self._decide(route.request):
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await context.route("**/*", handler)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"enabled": self.enabled, **self.stats}
+
+
+def resource_stats() -> dict:
+    """Compteurs de requêtes bloquées/autorisées par magasin"""
+    return {store: policy.status() for store, policy in POLICIES.items()}
@@ -1,158 +1,177 @@
-from playwright.sync_api import sync_playwright
+import asyncio
+from stores.browser_pool import get_async_browser_pool
+from stores.resources import ResourcePolicy
+from stores.dom import parse_html
+from stores.http_fast import FastPath, FastPathUnavailable
+from stores.deadline import budget_ms
+from stores.common import (
+    TILE_LIMIT,
+    Readiness,
+    open_search_async,
+    wait_until_ready_async,
+    dismiss_cookies_async,
+    extract_tiles_async,
+    score_tiles,
+    select_prices,
+)
 from urllib.parse import quote_plus
-import time
-from regex.utils import fuzzy_score
 import json
 
 
 URL="https://www.coursesu.com/recherche?q="
 
-def get_price_u(city: str, item: dict):
-    
-    query = f"{item.get('name', '')} {item.get('brand', '')} {item.get('quantity', '')}".strip()
+READINESS = Readiness("li.grid-tile")
+RESOURCE_POLICY = ResourcePolicy("u", extra_domains=["tagcommander.com", "commander1.com"])
+
+# La marque vient de l'attribut data-tc-product-tile (JSON)
+EXTRACT_JS = """
+([selector, limit]) => Array.from(document.querySelectorAll(selector)).slice(0, limit).map(a => {
+    const text = s => { const e = a.querySelector(s); return e ? e.innerText.trim() : null; };
+    let brand = "";
+    try {
+        brand = JSON.parse(a.getAttribute("data-tc-product-tile")).brand || "";
+    } catch (e) {}
+    return {
+        name: text(".product-name .name-link") || "",
+        brand: brand,
+        price_text: text("[data-sup-product-price]")
+    };
+})
+"""
+
+# Marques recherchées dans le nom quand data-tc-product-tile n'en donne pas
+COMMON_BRANDS = ["BARILLA", "PANZANI", "LU", "DANONE", "PRESIDENT", "YOPLAIT"]
+
+def build_query(item: dict) -> str:
+    return f"{item.get('name', '')} {item.get('brand', '')} {item.get('quantity', '')}".strip()
+
+
+def parse_search_html(html: str) -> list:
+    """Équivalent de EXTRACT_JS sur le HTML rendu côté serveur"""
+    tiles = []
+    for a in parse_html(html).select(READINESS.selector)[:TILE_LIMIT]:
+        brand = ""
+        try:
+            brand = json.loads(a.get("data-tc-product-tile") or "").get("brand", "") or ""
+        except (ValueError, AttributeError):
+            pass
+        tiles.append(_guess_brand({
+            "name": a.select_text(".product-name .name-link") or "",
+            "brand": brand,
+            "price_text": a.select_text("[data-sup-product-price]")
+        }))
+    return tiles
+
+
+# Désactivé par défaut : sans sélection du magasin (processing_superu) les prix
+# servis en HTTP sont ceux du magasin par défaut, pas ceux de la ville demandée
+FAST_PATH = FastPath("u", parse_search_html, enabled=False)
+
+
+async def get_price_u_async(city: str, item: dict):
+    """Recherche dans un contexte du pool de navigateurs, sur la boucle asyncio"""
+    query = build_query(item)
+    url = f"{URL}{quote_plus(query)}"
+
+    async with get_async_browser_pool().new_context() as context:
+        return await _search_u_async(context, city, query, url)
+
+
+def _guess_brand(tile):
+    """Si data-tc-product-tile ne donne pas de marque, la chercher dans le nom"""
+    if not tile.get("brand") and tile.get("name"):
+        for b in COMMON_BRANDS:
+            if b in tile["name"].upper():
+                tile["brand"] = b
+                break
+    return tile
+
+
+def parse_price(price_text: str) -> float:
+    return float(price_text.replace("€", "").replace(",", ".").strip())
+
+
+def get_price_u_http(city: str, item: dict):
+    """
+    Chemin rapide sans navigateur : lit le HTML de la page de recherche
+
+    Raises:
+        FastPathUnavailable: page anti-bot, erreur HTTP ou aucune tuile lisible
+    """
+    query = build_query(item)
     url = f"{URL}{quote_plus(query)}"
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=True,
-            args=['--incognito']
-        )
-        context = browser.new_context(user_agent=(
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0 Safari/537.36"
-        ))
-        page = context.new_page()
-        page.goto(url, wait_until="networkidle", timeout=45000)
-
-        # Gérer la popup cookies
+    tiles = FAST_PATH.fetch_tiles(url)
+    highest_price, lowest_price, success = select_prices(score_tiles(query, tiles, parse_price, "Super U"))
+    if not success:
+        raise FastPathUnavailable(f"Aucun prix lisible dans le HTML pour {query}")
+    return highest_price, lowest_price, success
+
+
+async def _search_u_async(context, city: str, query: str, url: str):
+    await RESOURCE_POLICY.install_async(context)
+    page = await context.new_page()
+    await open_search_async(page, url, timeout=45000)
+
+    # Gérer la popup cookies (elle bloquerait les clics de sélection du magasin)
+    await dismiss_cookies_async(page, wait_ms=3000)
+
+    # Traitement spécifique Super U
+    await processing_superu_async(page, city)
+
+    # Attendre les articles
+    if not await wait_until_ready_async(page, READINESS, timeout=30000):
+        print("Aucun produit trouvé pour", query)
+        return "", "", False
+
+    tiles = [_guess_brand(tile) for tile in await extract_tiles_async(page, EXTRACT_JS, READINESS)]
+    return select_prices(score_tiles(query, tiles, parse_price, "Super U"))
+
+
+# Étapes de la sélection du magasin Super U
+STORE_LINK = 'a:has-text("Trouver votre magasin")'
+STORE_SEARCH = '#store-search'
+STORE_RESULT = '.store-delivery-mode-arrow'
+STORE_CLOSE = 'span.ui-button-icon.ui-icon.ui-icon-closethick'
+
+
+async def processing_superu_async(page, city):
+    """Sélectionne le magasin Super U le plus proche de city (prix locaux)"""
+    try:
+        # Cliquer sur "Trouver votre magasin"
         try:
-            if page.is_visible('button:has-text("Continuer sans accepter")'):
-                page.click('button:has-text("Continuer sans accepter")')
-            elif page.is_visible('button:has-text("Tout accepter")'):
-                page.click('button:has-text("Tout accepter")')
-            time.sleep(1)
+            await page.wait_for_selector(STORE_LINK, timeout=budget_ms(5000))
         except:
-            pass
+            return
+        await page.click(STORE_LINK)
+
+        # Attendre que l'input de recherche de magasin soit visible
+        await page.wait_for_selector(STORE_SEARCH, timeout=budget_ms(10000))
+
+        # Saisir le nom de la ville dans l'input
+        await page.fill(STORE_SEARCH, city)
+
+        # Retour arrière puis remettre la dernière lettre pour déclencher l'autocomplétion
+        await page.press(STORE_SEARCH, 'Backspace')
+        if city:
+            await page.type(STORE_SEARCH, city[-1])
 
-        # Traitement spécifique Super U
-        processing_superu(page, city)
+        # Appuyer sur Entrée pour valider
+        await page.press(STORE_SEARCH, 'Enter')
 
-        # Attendre les articles
+        # Cliquer sur le premier magasin proposé
+        first_store_element = await page.wait_for_selector(STORE_RESULT, timeout=budget_ms(10000))
+        await first_store_element.click()
+
+        # Cliquer sur le bouton de fermeture
         try:
-            page.wait_for_selector("li.grid-tile", timeout=30000)
+            close_button = await page.wait_for_selector(STORE_CLOSE, timeout=budget_ms(5000))
         except:
-            print("Aucun produit trouvé pour", query)
-            return "", "", False
-
-        articles = page.query_selector_all("li.grid-tile")
-        results = []
-
-        for a in articles[:5]:
-            try:
-                # Nom du produit
-                name_element = a.query_selector(".product-name .name-link")
-                name = name_element.inner_text().strip() if name_element else ""
-                
-                # Marque (extraire de data-tc-product-tile ou du nom)
-                brand = ""
-                data_tc = a.get_attribute("data-tc-product-tile")
-                if data_tc:
-                    import json
-                    try:
-                        data = json.loads(data_tc)
-                        brand = data.get("brand", "")
-                    except:
-                        pass
-                
-                # Si pas de marque trouvée dans les données, essayer d'extraire du nom
-                if not brand and name:
-                    # Rechercher des marques communes dans le nom
-                    common_brands = ["BARILLA", "PANZANI", "LU", "DANONE", "PRESIDENT", "YOPLAIT"]
-                    for b in common_brands:
-                        if b in name.upper():
-                            brand = b
-                            break
-                
-                # Prix
-                price_element = a.query_selector("[data-sup-product-price]")
-                if price_element:
-                    price_text = price_element.inner_text().strip().replace("€", "").replace(",", ".").strip()
-                    price = float(price_text)
-                else:
-                    continue
-
-                full_text = f"{name} {brand}"
-                score = fuzzy_score(query, full_text)
-
-                results.append({
-                    "name": name,
-                    "brand": brand,
-                    "price": price,
-                    "score": score
-                })
-            except Exception as e:
-                print(f"Erreur lors du traitement d'un article : {e}")
-                continue
-
-        browser.close()
-
-        if not results:
-            return "", "", False
-
-        bests = sorted(results[:5], key=lambda x: x["score"], reverse=True)
-        bests_sorted_by_price = sorted(bests[:3], key=lambda x: x["price"])
-        highest_price = bests_sorted_by_price[-1]["price"]
-        lowest_price = bests_sorted_by_price[0]["price"]
-        return highest_price, lowest_price, True
-
-
-def processing_superu(page, city):
-    try:
-        # Cliquer sur "Trouver votre magasin"
-        if page.is_visible('a:has-text("Trouver votre magasin")'):
-            page.click('a:has-text("Trouver votre magasin")')
-            time.sleep(2)
-            
-            # Attendre que l'input de recherche de magasin soit visible
-            page.wait_for_selector('#store-search', timeout=10000)
-            
-            time.sleep(1)
-            # Saisir le nom de la ville dans l'input
-            page.fill('#store-search', city)
-            time.sleep(1)
-            
-            # Appuyer sur Retour arrière pour supprimer la dernière lettre
-            page.press('#store-search', 'Backspace')
-            time.sleep(0.5)
-            
-            # Remettre la dernière lettre du nom de la ville
-            if city:
-                last_letter = city[-1]
-                page.type('#store-search', last_letter)
-                time.sleep(0.5)
-            
-            # Appuyer sur Entrée pour valider
-            page.press('#store-search', 'Enter')
-            time.sleep(2)
-            
-            # Cliquer sur le premier élément avec la classe "store-delivery-mode-arrow"
-            page.wait_for_selector('.store-delivery-mode-arrow', timeout=10000)
-            first_store_element = page.query_selector('.store-delivery-mode-arrow')
-            if first_store_element:
-                first_store_element.click()
-                time.sleep(2)
-                
-                # Cliquer sur le bouton de fermeture
-                close_button = page.query_selector('span.ui-button-icon.ui-icon.ui-icon-closethick')
-                if close_button:
-                    close_button.click()
-                    time.sleep(1)
-                else:
-                    print("⚠️ Bouton de fermeture non trouvé")
-            else:
-                print("⚠️ Aucun magasin trouvé avec la classe store-delivery-mode-arrow")
-            
+            print("⚠️ Bouton de fermeture non trouvé")
+            return
+        await close_button.click()
+        await page.wait_for_selector(STORE_CLOSE, state="hidden", timeout=budget_ms(5000))
+
     except Exception as e:
         print(f"⚠️ Erreur lors de la sélection du magasin Super U : {e}")
     return
@@ -161,5 +180,5 @@ def processing_superu(page, city):
 # Test de la fonction
 if __name__ == "__main__":
     item = {"name": "Oeufs de caille", "brand": "", "quantity": ""}
-    best = get_price_u("Vaucresson", item)
-    print(best)
\ No newline at end of file
+    best = asyncio.run(get_price_u_async("Vaucresson", item))
+    print(best)
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark de la notation floue : chemin paire par paire d'origine (normalize
+non mis en cache, fuzz.ratio par candidat) contre fuzzy_scores / top_matches.
+Non collecté par pytest (préfixe bench_).
+
+Usage: python tests/bench_fuzzy_scoring.py [nombre_de_noms] [candidats_par_recherche]
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import re
+import time
+import unicodedata
+
+from rapidfuzz import fuzz
+
+from regex.utils import fuzzy_scores, normalize, top_matches
+
+WORDS = [
+    "crème", "fraîche", "épaisse", "biscuits", "goût", "chocolat", "pâtes", "coquillettes",
+    "café", "moulu", "thé", "vert", "jambon", "supérieur", "découenné", "lait", "demi-écrémé",
+    "yaourt", "nature", "fromage", "râpé", "emmental", "pain", "de", "mie", "complet", "œufs",
+    "bio", "sauce", "tomate", "basilic", "huile", "d'olive", "vierge", "extra", "céréales",
+]
+BRANDS = ["LU", "Président", "Panzani", "Barilla", "Carte Noire", "Lipton", "Herta", "Lactel", "Danone", "Harrys"]
+
+
+def normalize_uncached(text):
+    """normalize tel qu'avant : NFKD systématique et re.sub non compilé"""
+    text = text.lower()
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return text.strip()
+
+
+def fuzzy_score_uncached(query, candidate):
+    return fuzz.ratio(normalize_uncached(query), normalize_uncached(candidate))
+
+
+def product_names(count: int):
+    random.seed(0)
+    return [
+        f"{' '.join(random.sample(WORDS, random.randint(2, 5)))} {random.choice(BRANDS)} {random.randint(1, 12) * 125}g"
+        for _ in range(count)
+    ]
+
+
+def timed(label: str, fn, searches: int):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:34s}: {elapsed * 1000:8.1f} ms ({elapsed / searches * 1e6:7.1f} µs/recherche)")
+    return result
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    per_search = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    names = product_names(count)
+    # Recherches d'un panier : chaque requête revient sur plusieurs magasins
+    queries = [name.rsplit(" ", 2)[0] for name in random.sample(names, 50)] * 4
+    searches = [(query, random.sample(names, per_search)) for query in queries]
+    print(f"{len(searches)} recherches de {per_search} tuiles, {count} noms de produits")
+
+    pairwise = timed(
+        "paire par paire (d'origine)",
+        lambda: [[fuzzy_score_uncached(q, c) for c in candidates] for q, candidates in searches],
+        len(searches)
+    )
+    normalize.cache_clear()
+    batched = timed("fuzzy_scores (cache froid)", lambda: [fuzzy_scores(q, c) for q, c in searches], len(searches))
+    timed("fuzzy_scores (cache chaud)", lambda: [fuzzy_scores(q, c) for q, c in searches], len(searches))
+    assert batched == pairwise
+
+    # Une requête contre tout le catalogue : top-k en un seul appel
+    query = queries[0]
+    timed(
+        f"top 3 parmi {count} (paire par paire)",
+        lambda: sorted(range(count), key=lambda i: -fuzzy_score_uncached(query, names[i]))[:3],
+        1
+    )
+    normalize.cache_clear()
+    timed(f"top 3 parmi {count} (top_matches)", lambda: top_matches(query, names, k=3), 1)
+    print(f"cache normalize : {normalize.cache_info()}")
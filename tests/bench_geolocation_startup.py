@@ -0,0 +1,75 @@
+"""
+Mesure du coût de démarrage de la géolocalisation : temps d'import et mémoire (RSS)
+du module, avec et sans pandas, et dédoublonnage des enregistrements face à
+DataFrame.drop_duplicates. Non collecté par pytest (préfixe bench_).
+
+Usage: python tests/bench_geolocation_startup.py [nombre_de_magasins]
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Exécuté dans un processus neuf pour mesurer un vrai démarrage à froid
+IMPORT_PROBE = """
+import sys, time, psutil
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, psutil.Process().memory_info().rss, "pandas" in sys.modules)
+"""
+
+
+def measure_import(module: str):
+    """(secondes, RSS en Mo, pandas chargé) pour l'import de module dans un processus neuf"""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE.format(module=module)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[0]), int(output[1]) / 1024 / 1024, output[2] == "True"
+
+
+def bench_dedupe(count: int):
+    import random
+    from geolocation.records import Supermarket, dedupe
+
+    random.seed(0)
+    # Environ un magasin sur deux en double, comme les résultats des deux types Google Places
+    stores = [
+        Supermarket(f"Magasin {i % (count // 2)}", "", 48.8 + (i % (count // 2)) * 1e-4, 2.0, "")
+        for i in range(count)
+    ]
+    random.shuffle(stores)
+
+    start = time.perf_counter()
+    unique = dedupe(stores)
+    records_s = time.perf_counter() - start
+    print(f"dedupe (NamedTuple)        : {records_s * 1000:8.2f} ms pour {count} magasins -> {len(unique)}")
+
+    try:
+        import pandas as pd
+    except ImportError:
+        print("pandas non installé : comparaison ignorée")
+        return
+    start = time.perf_counter()
+    frame = pd.DataFrame([store._asdict() for store in stores]).drop_duplicates(subset=["name", "latitude", "longitude"])
+    pandas_s = time.perf_counter() - start
+    print(f"DataFrame.drop_duplicates  : {pandas_s * 1000:8.2f} ms pour {count} magasins -> {len(frame)}")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    for module in ["geolocation.records", "geolocation.find_supermarches", "pandas"]:
+        try:
+            seconds, rss_mb, pandas_loaded = measure_import(module)
+        except subprocess.CalledProcessError as e:
+            print(f"{module:32s}: import impossible ({e.stderr.strip().splitlines()[-1]})")
+            continue
+        print(f"{module:32s}: {seconds * 1000:7.1f} ms, RSS {rss_mb:6.1f} Mo, pandas chargé : {pandas_loaded}")
+
+    bench_dedupe(count)
@@ -0,0 +1,28 @@
+"""
+Tests de la notation floue par lots (regex.utils)
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from regex.utils import fuzzy_score, fuzzy_scores, normalize, top_matches
+
+NAMES = ["Biscuits Prince goût chocolat LU", "Crème fraîche épaisse", "Coca-Cola 1L", "Cœur de Lion", ""]
+
+
+def test_normalize_strips_accents_and_punctuation():
+    assert normalize("Crème  Fraîche-Épaisse!") == "creme fraiche epaisse"
+    assert normalize("Coca-Cola 1L") == "coca cola 1l"
+    # œ n'est pas décomposé par NFKD : remplacé par un séparateur
+    assert normalize("Cœur") == "c ur"
+
+
+def test_batch_scores_match_pairwise_scores():
+    query = "creme fraiche"
+    assert fuzzy_scores(query, NAMES) == [fuzzy_score(query, name) for name in NAMES]
+    assert fuzzy_scores(query, []) == []
+
+
+def test_top_matches_keeps_candidate_order_on_ties():
+    assert top_matches("coca cola", NAMES, k=1) == [(2, fuzzy_score("coca cola", NAMES[2]))]
+    assert [index for index, _ in top_matches("xyz", ["abc", "abc", "xyz"], k=3)] == [2, 0, 1]
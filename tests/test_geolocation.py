@@ -0,0 +1,353 @@
+"""
+Tests hors-ligne de la recherche Google Places contre un serveur local qui imite l'API
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from geolocation import find_supermarches
+from geolocation.records import Supermarket, dedupe
+
+
+def place(name, lat, lng, vicinity=""):
+    return {"name": name, "geometry": {"location": {"lat": lat, "lng": lng}}, "vicinity": vicinity}
+
+
+# Pages renvoyées par le faux serveur : (type ou pagetoken) -> réponse
+PAGES = {
+    "supermarket": {
+        "status": "OK",
+        "results": [place("Carrefour Market", 48.86, 2.09, "1 rue A"), place("Aldi", 48.87, 2.10)],
+        "next_page_token": "page2",
+    },
+    "page2": {"status": "OK", "results": [place("Super U", 48.88, 2.11)]},
+    # Même Carrefour renvoyé par le second type : dédoublonné
+    "grocery_or_supermarket": {
+        "status": "OK",
+        "results": [place("Carrefour Market", 48.86, 2.09, "1 rue A"), place("Monoprix", 48.85, 2.08)],
+    },
+}
+
+
+class PlacesHandler(BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        key = query.get("pagetoken", query.get("type", [""]))[0]
+        self.requests_seen.append(key)
+        body = json.dumps(PAGES.get(key, {"status": "INVALID_REQUEST"})).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def places_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PlacesHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    PlacesHandler.requests_seen = []
+    monkeypatch.setenv("GOOGLE_MAPS_API_KEY", "test")
+    monkeypatch.setattr(find_supermarches, "PLACES_URL", f"http://127.0.0.1:{server.server_port}/nearbysearch/json")
+    monkeypatch.setattr(find_supermarches, "PLACES_PAGE_DELAY_S", 0)
+    yield PlacesHandler
+    server.shutdown()
+
+
+def test_types_and_pages_are_merged(places_server):
+    stores = find_supermarches.fetch_supermarkets_gcp(48.8671, 2.0935, radius_km=2)
+
+    assert sorted(s.name for s in stores) == ["Aldi", "Carrefour Market", "Monoprix", "Super U"]
+    assert sorted(places_server.requests_seen) == ["grocery_or_supermarket", "page2", "supermarket"]
+    assert [s.brand for s in stores if s.name == "Super U"] == ["u"]
+
+
+def test_pagination_stops_at_budget(places_server):
+    stores = find_supermarches.fetch_supermarkets_gcp(48.8671, 2.0935, radius_km=2, budget_s=0)
+    assert stores == []
+    assert places_server.requests_seen == []
+
+
+def test_places_failure_raises_and_is_not_cached(monkeypatch, tmp_path):
+    from geolocation.tiles import TileCache
+
+    monkeypatch.setenv("GOOGLE_MAPS_API_KEY", "test")
+    # Port fermé : tous les types de lieux échouent
+    monkeypatch.setattr(find_supermarches, "PLACES_URL", "http://127.0.0.1:9/nearbysearch/json")
+    with pytest.raises(find_supermarches.PlacesError):
+        find_supermarches.fetch_supermarkets_gcp(48.8671, 2.0935, radius_km=2)
+
+    cache = TileCache("gcp", find_supermarches.TILE_SOURCES["gcp"], path=str(tmp_path / "tiles.sqlite3"))
+    with pytest.raises(find_supermarches.PlacesError):
+        cache.query(48.8671, 2.0935, 2)
+    assert cache._db.execute("SELECT COUNT(*) FROM tiles").fetchone()[0] == 0
+
+
+def test_partial_places_answer_is_served_but_not_cached(places_server, monkeypatch, tmp_path):
+    from geolocation.tiles import TileCache
+
+    monkeypatch.setitem(PAGES, "grocery_or_supermarket", {"status": "OVER_QUERY_LIMIT"})
+    cache = TileCache("gcp", find_supermarches.TILE_SOURCES["gcp"], path=str(tmp_path / "tiles.sqlite3"))
+    stores = cache.query(48.8671, 2.0935, 5)
+
+    assert "Carrefour Market" in [s.name for s in stores]
+    assert cache.status()["incomplete"] > 0
+    assert cache._db.execute("SELECT COUNT(*) FROM tiles").fetchone()[0] == 0
+
+
+def test_full_pages_mark_places_answer_saturated(places_server, monkeypatch):
+    from geolocation.tiles import IncompleteFetch
+
+    full = [place(f"Magasin {i}", 48.86 + i / 10000, 2.09) for i in range(find_supermarches.PLACES_PAGE_SIZE)]
+    monkeypatch.setitem(PAGES, "supermarket", {"status": "OK", "results": full, "next_page_token": "full2"})
+    monkeypatch.setitem(PAGES, "full2", {"status": "OK", "results": full, "next_page_token": "full3"})
+    monkeypatch.setitem(PAGES, "full3", {"status": "OK", "results": full})
+
+    with pytest.raises(IncompleteFetch) as e:
+        find_supermarches.fetch_supermarkets_gcp(48.8671, 2.0935, radius_km=16, complete=True)
+    assert e.value.saturated
+    # Sans complete=True : la liste tronquée reste servie comme avant
+    assert len(find_supermarches.fetch_supermarkets_gcp(48.8671, 2.0935, radius_km=16)) > 0
+
+
+def test_saturated_tile_falls_back_to_the_search_circle(tmp_path):
+    from geolocation.tiles import IncompleteFetch, TileCache
+
+    calls = []
+
+    def fetch(latitude, longitude, radius_km):
+        calls.append(radius_km)
+        stores = [Supermarket("Proche", "", 48.868, 2.094, "")]
+        if radius_km > 5:
+            raise IncompleteFetch("plus de 60 lieux", stores, saturated=True)
+        return stores
+
+    cache = TileCache("test", fetch, path=str(tmp_path / "tiles.sqlite3"))
+    assert [s.name for s in cache.query(48.8671, 2.0935, 5)] == ["Proche"]
+    assert calls[-1] == 5
+    assert cache._db.execute("SELECT COUNT(*) FROM tiles").fetchone()[0] == 0
+
+    # Tuile dense mémorisée : plus de requête par tuile, seulement le cercle demandé
+    calls.clear()
+    cache.query(48.8671, 2.0935, 5)
+    assert calls == [5]
+    assert cache.status()["dense_tiles"] == cache.status()["saturated"] > 0
+
+
+def test_dedupe_keeps_first_store_by_name_and_position():
+    first = Supermarket("Aldi", "aldi", 48.87, 2.10, "1 rue A")
+    stores = dedupe([first, Supermarket("Aldi", "", 48.87, 2.10, ""), Supermarket("Aldi", "", 48.88, 2.10, "")])
+    assert stores[0] is first
+    assert len(stores) == 2
+    assert first._asdict()["is_opened"] is None
+
+
+def test_tile_cache_filters_by_distance_and_persists(tmp_path):
+    from geolocation.tiles import TileCache
+
+    calls = []
+    known = [
+        Supermarket("Proche", "", 48.868, 2.094, ""),
+        Supermarket("Loin", "", 48.95, 2.30, ""),
+    ]
+
+    def fetch(latitude, longitude, radius_km):
+        calls.append((latitude, longitude))
+        return known
+
+    path = str(tmp_path / "tiles.sqlite3")
+    stores = TileCache("test", fetch, path=path).query(48.8671, 2.0935, 2)
+    assert [s.name for s in stores] == ["Proche"]
+    assert stores[0].distance_km < 0.2
+    assert calls
+
+    # Nouveau processus : tuiles relues depuis SQLite, aucun appel externe
+    calls.clear()
+    cache = TileCache("test", fetch, path=path)
+    assert [s.name for s in cache.query(48.8671, 2.0935, 2)] == ["Proche"]
+    assert calls == []
+    assert cache.status()["disk_hits"] > 0
+
+
+def test_opening_status_is_not_served_from_cache(tmp_path):
+    from geolocation.tiles import TileCache
+
+    def fetch(latitude, longitude, radius_km):
+        return [Supermarket("Proche", "", 48.868, 2.094, "", is_opened=True)]
+
+    def failing(latitude, longitude, radius_km):
+        raise AssertionError("tuile attendue en cache")
+
+    path = str(tmp_path / "tiles.sqlite3")
+    cache = TileCache("test", fetch, path=path)
+    assert [s.is_opened for s in cache.query(48.8671, 2.0935, 2)] == [True]
+    # Ouverture en direct au remplissage seulement : ni la mémoire ni SQLite ne la conservent
+    assert [s.is_opened for s in cache.query(48.8671, 2.0935, 2)] == [None]
+    assert [s.is_opened for s in TileCache("test", failing, path=path).query(48.8671, 2.0935, 2)] == [None]
+
+
+def test_tiles_sized_to_the_radius():
+    from geolocation.tiles import covering_tiles, precision_for_radius, tile_query
+
+    precision = precision_for_radius(5, 48.8671)
+    tiles = covering_tiles(48.8671, 2.0935, 5, precision)
+    assert len(tiles) <= 4
+    assert all(tile_query(tile)[2] <= 50 for tile in tiles)
+
+
+def test_wide_search_bypasses_tiles(tmp_path):
+    from geolocation.tiles import TileCache
+
+    calls = []
+
+    def fetch(latitude, longitude, radius_km):
+        calls.append(radius_km)
+        return [Supermarket("Proche", "", 48.868, 2.094, "")]
+
+    cache = TileCache("test", fetch, path=str(tmp_path / "tiles.sqlite3"))
+    assert [s.name for s in cache.query(48.8671, 2.0935, 40)] == ["Proche"]
+    # Une seule requête sur le cercle demandé, rien d'enregistré
+    assert calls == [40]
+    assert cache.status()["uncached"] == 1
+    assert cache._db.execute("SELECT COUNT(*) FROM tiles").fetchone()[0] == 0
+
+
+def test_offline_index_build_and_query(tmp_path):
+    from geolocation.offline_index import SpatialIndex, main
+
+    extract = {"elements": [
+        {"type": "node", "lat": 48.868, "lon": 2.094, "tags": {"shop": "supermarket", "name": "Carrefour Market", "brand": "Carrefour"}},
+        {"type": "node", "lat": 48.875, "lon": 2.110, "tags": {"shop": "convenience", "name": "Franprix", "addr:city": "Marly"}},
+        {"type": "node", "lat": 48.869, "lon": 2.095, "tags": {"amenity": "cafe", "name": "Café"}},
+        {"type": "node", "lat": 43.30, "lon": 5.37, "tags": {"shop": "supermarket", "name": "Marseille"}},
+    ]}
+    source = tmp_path / "extract.json"
+    source.write_text(json.dumps(extract), encoding="utf-8")
+    output = tmp_path / "supermarkets.idx"
+
+    main(["build", str(source), "-o", str(output)])
+    index = SpatialIndex.load(str(output))
+
+    assert index.meta["count"] == 3
+    stores = index.query(48.8671, 2.0935, 2)
+    assert [s.name for s in stores] == ["Carrefour Market", "Franprix"]
+    assert stores[1].address == "Marly"
+    assert index.query(48.8671, 2.0935, 0.01) == []
+
+
+def overpass_server(delay_s=0.0, status=200):
+    """Faux miroir Overpass : répond après delay_s avec un supermarché"""
+    body = json.dumps({"elements": [{"lat": 48.868, "lon": 2.094, "tags": {"name": f"Miroir {delay_s}"}}]}).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay_s)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/interpreter"
+
+
+def test_overpass_hedges_to_faster_mirror():
+    from geolocation.overpass import OverpassMirrors
+
+    slow, slow_url = overpass_server(delay_s=1.0)
+    fast, fast_url = overpass_server()
+    try:
+        mirrors = OverpassMirrors([slow_url, fast_url], find_supermarches.get_session, hedge_delay_s=0.05, budget_s=5)
+        data = mirrors.query("[out:json];")
+        assert data["elements"][0]["tags"]["name"] == "Miroir 0.0"
+        assert mirrors.status()[fast_url]["wins"] == 1
+    finally:
+        slow.shutdown()
+        fast.shutdown()
+
+
+def test_failing_mirror_backs_off():
+    from geolocation.overpass import OverpassMirrors
+
+    broken, broken_url = overpass_server(status=504)
+    healthy, healthy_url = overpass_server()
+    try:
+        mirrors = OverpassMirrors([broken_url, healthy_url], find_supermarches.get_session, hedge_delay_s=5, budget_s=5)
+        # L'échec du premier miroir déclenche le suivant sans attendre le délai
+        assert mirrors.query("[out:json];")["elements"]
+        status = mirrors.status()[broken_url]
+        assert not status["available"] and status["consecutive_failures"] == 1
+
+        # Miroir en backoff interrogé en dernier
+        assert [m.url for m in mirrors._ordered()] == [healthy_url, broken_url]
+    finally:
+        broken.shutdown()
+        healthy.shutdown()
+
+
+def test_closest_stores_falls_back_to_overpass(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    def gcp_down(latitude, longitude, radius_km):
+        raise ValueError("GOOGLE_MAPS_API_KEY non définie")
+
+    monkeypatch.setattr(main, "get_offline_index", lambda: None)
+    monkeypatch.setattr(main, "find_supermarkets_gcp", gcp_down)
+    monkeypatch.setattr(main, "find_supermarkets", lambda latitude, longitude, radius_km: [
+        Supermarket("Aldi", "aldi", 48.868, 2.094, "1 rue A", distance_km=0.1)
+    ])
+
+    response = TestClient(main.app).post("/closest_stores", json={"latitude": 48.8671, "longitude": 2.0935})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["api_used"] == "Overpass"
+    assert body["stores"] == [{
+        "name": "Aldi", "brand": "aldi", "latitude": 48.868, "longitude": 2.094,
+        "address": "1 rue A", "is_opened": None, "distance_km": 0.1
+    }]
+
+
+def test_store_lookup_does_not_block_event_loop(monkeypatch):
+    import httpx
+    import main
+
+    def slow_overpass(latitude, longitude, radius_km):
+        time.sleep(0.3)
+        return []
+
+    monkeypatch.setattr(main, "get_offline_index", lambda: None)
+    monkeypatch.setattr(main, "find_supermarkets_gcp", slow_overpass)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            start = time.monotonic()
+            lookup = asyncio.ensure_future(client.post("/closest_stores", json={"latitude": 48.8671, "longitude": 2.0935}))
+            await asyncio.sleep(0.05)
+            await client.get("/ready")
+            probe_s = time.monotonic() - start
+            assert (await lookup).status_code == 200
+            return probe_s
+
+    # La sonde répond pendant la recherche des magasins
+    assert asyncio.run(scenario()) < 0.2
@@ -0,0 +1,102 @@
+"""
+Tests hors-ligne du chemin HTTP (sans navigateur).
+Les pages tests/fixtures/*_search.html sont écrites à la main à partir des sélecteurs
+des scrapers, ce ne sont pas des captures : elles vérifient l'extraction, pas que les
+sites servent bien leurs tuiles en HTTP. Seul resp_body.bin est une vraie réponse
+(mur Cloudflare).
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+import pytest
+
+from stores import aldi, carrefour, monoprix, u
+from stores.http_fast import FastPath, FastPathUnavailable, lookup_with_fast_path_async
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_carrefour_tiles():
+    tiles = carrefour.parse_search_html(read_fixture("carrefour_search.html"))
+    assert tiles[0] == {"name": "Biscuits Prince goût chocolat", "brand": "LU", "price_text": "2,35"}
+    assert tiles[2]["brand"] == ""
+    assert tiles[3]["price_text"] is None
+
+
+def test_aldi_tiles():
+    tiles = aldi.parse_search_html(read_fixture("aldi_search.html"))
+    assert [t["price_text"] for t in tiles] == ["1,69", "0,99", None]
+    assert tiles[0]["brand"] == "COCA-COLA"
+
+
+def test_monoprix_tiles():
+    tiles = monoprix.parse_search_html(read_fixture("monoprix_search.html"))
+    assert [monoprix.parse_price(t["price_text"]) for t in tiles] == [4.55, 7.29]
+
+
+def test_u_tiles_brand():
+    tiles = u.parse_search_html(read_fixture("u_search.html"))
+    assert tiles[0]["brand"] == "BARILLA"
+    # data-tc-product-tile illisible : marque devinée depuis le nom
+    assert tiles[1]["brand"] == "PANZANI"
+
+
+def test_cloudflare_challenge_is_rejected():
+    brotli = pytest.importorskip("brotli")
+    with open(os.path.join(ROOT, "resp_body.bin"), "rb") as f:
+        html = brotli.decompress(f.read()).decode("utf-8")
+
+    fast_path = FastPath("test-challenge", carrefour.parse_search_html)
+    with pytest.raises(FastPathUnavailable):
+        fast_path.tiles_from_html(html)
+    # Mis en pause après le mur anti-bot
+    assert not fast_path.available()
+
+
+def test_fast_path_serves_result(monkeypatch):
+    html = read_fixture("aldi_search.html")
+    monkeypatch.setattr(aldi.FAST_PATH, "fetch_tiles", lambda url: aldi.FAST_PATH.tiles_from_html(html))
+
+    async def browser(city, item):
+        raise AssertionError("le navigateur ne doit pas être utilisé")
+
+    item = {"name": "Coca-Cola", "brand": "", "quantity": "1L"}
+    highest, lowest, success, source = asyncio.run(
+        lookup_with_fast_path_async(aldi.FAST_PATH, aldi.get_price_aldi_http, browser, "", item)
+    )
+    assert success and source == "http"
+    assert lowest <= highest
+
+
+def test_fallback_to_browser_when_no_tiles():
+    fast_path = FastPath("test-fallback", aldi.parse_search_html)
+
+    def http(city, item):
+        return fast_path.tiles_from_html("<html><body>Chargement...</body></html>")
+
+    async def browser(city, item):
+        return 2.0, 1.0, True
+
+    result = asyncio.run(lookup_with_fast_path_async(fast_path, http, browser, "", {"name": "lait"}))
+    assert result == (2.0, 1.0, True, "browser")
+    assert fast_path.stats["fallbacks"] == 1
+
+
+def test_repeated_empty_pages_pause_fast_path():
+    fast_path = FastPath("test-empty", aldi.parse_search_html, empty_limit=2)
+    for _ in range(2):
+        assert fast_path.available()
+        with pytest.raises(FastPathUnavailable):
+            fast_path.tiles_from_html("<html><body><div id='app'></div></body></html>")
+    # Résultats rendus côté client : plus de requête HTTP avant le navigateur
+    assert not fast_path.available()
+    assert fast_path.status()["empty_pages"] == 2
@@ -0,0 +1,115 @@
+"""
+Tests de la file de jobs asynchrones (backends SQLite et mémoire)
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+import pytest
+
+from scraping.jobs import JobQueue, QueueFull, SQLiteJobBackend
+
+ITEMS = [{"name": "lait"}, {"name": "pain"}, {"name": "beurre"}]
+
+
+async def fake_runner(payload, progress):
+    progress.set_total(len(payload["items"]))
+    for item in payload["items"]:
+        await asyncio.sleep(0)
+        progress.add({"item": item, "success": True})
+    return {"total_items": len(payload["items"])}
+
+
+async def wait_done(queue, job_id):
+    for _ in range(100):
+        job = queue.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job non terminé")
+
+
+def test_job_runs_and_is_reused(tmp_path):
+    async def main():
+        queue = JobQueue(SQLiteJobBackend(str(tmp_path / "jobs.sqlite3")), {"basket": fake_runner})
+        job = queue.submit("basket", {"items": ITEMS})
+        done = await wait_done(queue, job["id"])
+
+        assert done["status"] == "done"
+        assert done["progress"] == {"done": 3, "total": 3}
+        assert done["summary"] == {"total_items": 3}
+
+        # Même panier resoumis : job terminé renvoyé sans nouveau scraping
+        again = queue.submit("basket", {"items": ITEMS})
+        assert again["id"] == job["id"]
+        assert queue.status()["reused"] == 1
+
+    asyncio.run(main())
+
+
+def test_failed_job_keeps_error(tmp_path):
+    async def broken(payload, progress):
+        progress.add({"item": payload["items"][0], "success": True})
+        raise RuntimeError("navigateur indisponible")
+
+    async def main():
+        queue = JobQueue(SQLiteJobBackend(str(tmp_path / "jobs.sqlite3")), {"basket": broken})
+        job = await wait_done(queue, queue.submit("basket", {"items": ITEMS})["id"])
+        assert job["status"] == "failed"
+        assert job["error"] == "navigateur indisponible"
+        assert len(job["results"]) == 1
+
+    asyncio.run(main())
+
+
+def test_queue_is_bounded(tmp_path):
+    async def main():
+        queue = JobQueue(SQLiteJobBackend(str(tmp_path / "jobs.sqlite3")), {"basket": fake_runner}, workers=0, max_queued=1)
+        queue.submit("basket", {"items": ITEMS[:1]})
+        with pytest.raises(QueueFull):
+            queue.submit("basket", {"items": ITEMS[:2]})
+        assert queue.status()["queue_depth"] == 1
+
+    asyncio.run(main())
+
+
+def test_progress_is_written_as_deltas(tmp_path):
+    backend = SQLiteJobBackend(str(tmp_path / "jobs.sqlite3"))
+
+    async def main():
+        queue = JobQueue(backend, {"basket": fake_runner})
+        return await wait_done(queue, queue.submit("basket", {"items": ITEMS})["id"])
+
+    job = asyncio.run(main())
+    assert [r["item"] for r in job["results"]] == ITEMS
+    # Une ligne par résultat, le job lui-même ne les contient pas
+    assert backend._db.execute("SELECT COUNT(*) FROM job_results").fetchone()[0] == 3
+    data = backend._db.execute("SELECT data FROM jobs").fetchone()[0]
+    assert "results" not in data
+
+
+def test_finished_jobs_are_purged(tmp_path):
+    from scraping.jobs import MemoryJobBackend
+
+    old = {"id": "old", "fingerprint": "a", "status": "done", "submitted_at": 1.0, "finished_at": 2.0,
+           "progress": {"done": 1, "total": 1}, "results": [{"item": {"name": "lait"}}]}
+    running = {**old, "id": "running", "status": "running", "finished_at": None, "results": []}
+
+    for backend in [MemoryJobBackend(), SQLiteJobBackend(str(tmp_path / "jobs.sqlite3"))]:
+        backend.save(old)
+        backend.add_result(old, old["results"][0])
+        backend.save(running)
+        assert backend.purge(before=100.0) == 1
+        assert backend.get("old") is None
+        assert backend.get("running") is not None
+
+
+def test_memory_backend_is_capped():
+    from scraping.jobs import MemoryJobBackend
+
+    backend = MemoryJobBackend(max_kept=2)
+    for i in range(4):
+        backend.save({"id": str(i), "fingerprint": str(i), "status": "done", "submitted_at": i, "finished_at": i})
+    assert [backend.get(str(i)) is not None for i in range(4)] == [False, False, True, True]
@@ -0,0 +1,51 @@
+"""
+Tests du regroupement des magasins proches par enseigne (/closest_store_groceries)
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+import main
+
+STORES = [
+    {"name": "Carrefour Market", "address": "1 rue A, Marly-le-Roi"},
+    {"name": "Super U", "address": "2 avenue B, Le Port-Marly"},
+    {"name": "Carrefour City", "address": "3 rue C, Marly-le-Roi"},
+    {"name": "Super U", "address": "4 place D, Louveciennes"},
+    {"name": "Carrefour Express", "address": "5 rue E, Le Pecq"},
+]
+ITEMS = [{"name": "lait", "brand": "", "quantity": ""}]
+
+
+def test_national_chain_grouped_once_local_chain_per_address():
+    groups = main.group_nearby_stores(STORES)
+
+    assert [(g["chain"], len(g["stores"])) for g in groups] == [("carrefour", 3), ("u", 1), ("u", 1)]
+    assert [g["city"] for g in groups if g["chain"] == "u"] == [STORES[1]["address"], STORES[3]["address"]]
+    assert main.chain_group_key("u", STORES[1]) != main.chain_group_key("u", STORES[3])
+    assert main.chain_group_key("carrefour", STORES[0]) == main.chain_group_key("carrefour", STORES[2])
+
+
+def test_chain_results_copied_to_every_store_in_input_order(monkeypatch):
+    calls = []
+
+    async def process_items_list(items, store, city, max_workers, deadline_ms=None):
+        calls.append((store, city))
+        # Super U du Port-Marly plus lent : les résultats arrivent dans le désordre
+        await asyncio.sleep(0.02 if city == STORES[1]["address"] else 0)
+        return [{"item": items[0], "store": store, "success": True, "highest_price": 2.0, "lowest_price": 1.0,
+                 "city": city, "status": "complete"}]
+
+    monkeypatch.setattr(main, "process_items_list", process_items_list)
+    results = asyncio.run(main.process_nearby_stores(STORES, ITEMS))
+
+    # Un scraping pour Carrefour, un par adresse Super U
+    assert sorted(calls) == sorted([
+        ("carrefour", STORES[0]["address"]), ("u", STORES[1]["address"]), ("u", STORES[3]["address"])
+    ])
+    assert [r["store"] for r in results] == STORES
+    assert [r["products"][0]["store"] for r in results] == ["carrefour", "u", "carrefour", "u", "carrefour"]
+    assert results[3]["products"][0]["city"] == STORES[3]["address"]
+    assert all(r["min_price"] == 1.0 and r["status"] == "complete" for r in results)
@@ -2,39 +2,36 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import asyncio
 import time
-import concurrent.futures
 from typing import List, Dict
-from main import search_single_item
+from main import search_single_item_async
+from stores.browser_pool import get_async_browser_pool
 
 
-def test_store_performance(store: str, city: str, articles: List[Dict], max_workers: int) -> Dict:
+async def test_store_performance(store: str, city: str, articles: List[Dict], max_workers: int) -> Dict:
     """
     Teste les performances d'un magasin avec un nombre donné de workers
+    (recherches simultanées sur la boucle asyncio, comme dans le serveur)
     """
     print(f"🧪 Test {store.upper()} avec {max_workers} worker(s)")
     
     start_time = time.time()
-    results = []
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_item = {
-            executor.submit(search_single_item, store, city, item): item 
-            for item in articles
-        }
-        
-        for future in concurrent.futures.as_completed(future_to_item):
+    workers = asyncio.Semaphore(max_workers)
+
+    async def search(item: Dict) -> Dict:
+        async with workers:
             try:
-                result = future.result()
-                results.append(result)
+                return await search_single_item_async(store, city, item)
             except Exception as exc:
-                item = future_to_item[future]
-                results.append({
+                return {
                     "item": item, 
                     "store": store, 
                     "success": False, 
                     "error": str(exc)
-                })
+                }
+
+    results = await asyncio.gather(*(search(item) for item in articles))
     
     end_time = time.time()
     duration = end_time - start_time
@@ -55,7 +52,7 @@ def test_store_performance(store: str, city: str, articles: List[Dict], max_work
     }
 
 
-def run_performance_tests():
+async def run_performance_tests():
     """Lance tous les tests de performance"""
     
     # Liste d'articles pour les tests (assez longue)
@@ -112,7 +109,7 @@ def run_performance_tests():
         
         for workers in worker_counts:
             try:
-                result = test_store_performance(store_name, city, test_articles, workers)
+                result = await test_store_performance(store_name, city, test_articles, workers)
                 store_results.append(result)
                 all_results.append(result)
             except Exception as e:
@@ -173,42 +170,10 @@ def run_performance_tests():
 
 
 if __name__ == "__main__":
-    # Ajouter l'import de monoprix au main.py
-    try:
-        from stores.monoprix import get_price_monoprix
-        
-        # Modifier temporairement la fonction search_single_item pour inclure monoprix
-        def search_single_item_extended(store: str, city: str, item: Dict) -> Dict:
-            """Version étendue avec support Monoprix"""
-            try:
-                if store.lower() == "u":
-                    from stores.u import get_price_u
-                    highest_price, lowest_price, success = get_price_u(city, item)
-                elif store.lower() == "carrefour":
-                    from stores.carrefour import get_price_carrefour
-                    highest_price, lowest_price, success = get_price_carrefour(city, item)
-                elif store.lower() == "aldi":
-                    from stores.aldi import get_price_aldi
-                    highest_price, lowest_price, success = get_price_aldi(city, item)
-                elif store.lower() == "monoprix":
-                    highest_price, lowest_price, success = get_price_monoprix(city, item)
-                else:
-                    return {"item": item, "store": store, "success": False, "error": f"Magasin non supporté: {store}"}
-                
-                if success:
-                    return {"item": item, "store": store, "success": True, "highest_price": highest_price, "lowest_price": lowest_price}
-                else:
-                    return {"item": item, "store": store, "success": False, "error": "Aucun produit trouvé"}
-            
-            except Exception as e:
-                return {"item": item, "store": store, "success": False, "error": str(e)}
-        
-        # Remplacer la fonction pour ce test
-        import __main__
-        __main__.search_single_item = search_single_item_extended
-        
-        run_performance_tests()
-        
-    except ImportError as e:
-        print(f"❌ Erreur d'import: {e}")
-        print("Assurez-vous que tous les modules (monoprix.py, aldi.py, etc.) sont présents")
\ No newline at end of file
+    async def main():
+        try:
+            await run_performance_tests()
+        finally:
+            await get_async_browser_pool().close()
+
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Tests du cache des prix (mémoire + SQLite)
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraping.cache import PriceCache, cache_key
+
+ITEM = {"name": "Prince", "brand": "LU", "quantity": ""}
+RESULT = {"item": ITEM, "store": "carrefour", "success": True, "highest_price": 2.35, "lowest_price": 1.99, "source": "http"}
+
+
+def test_key_ignores_city_for_national_prices():
+    assert cache_key("carrefour", "Paris", ITEM) == cache_key("Carrefour", "Lyon", ITEM)
+    assert cache_key("u", "Paris", ITEM) != cache_key("u", "Lyon", ITEM)
+
+
+def test_hit_survives_restart(tmp_path):
+    path = str(tmp_path / "prices.sqlite3")
+    PriceCache(path).set("carrefour", "Paris", ITEM, RESULT)
+
+    cached = PriceCache(path).get("carrefour", "Lyon", ITEM)
+    assert cached["highest_price"] == 2.35 and cached["cached"]
+
+
+def test_failures_and_expired_entries_are_not_served(monkeypatch):
+    cache = PriceCache(path="")
+    cache.set("aldi", "", ITEM, {"success": False})
+    assert cache.get("aldi", "", ITEM) is None
+
+    monkeypatch.setenv("PRICE_CACHE_TTL_ALDI", "-1")
+    cache.set("aldi", "", ITEM, RESULT)
+    assert cache.get("aldi", "", ITEM) is None
+    assert cache.stats["expired"] == 1
+
+
+def test_stale_entry_served_when_store_is_down(tmp_path, monkeypatch):
+    cache = PriceCache(str(tmp_path / "prices.sqlite3"))
+    monkeypatch.setenv("PRICE_CACHE_TTL_ALDI", "-1")
+    cache.set("aldi", "", ITEM, RESULT)
+    assert cache.get("aldi", "", ITEM) is None
+
+    stale = cache.get_stale("aldi", "", ITEM)
+    assert stale["lowest_price"] == 1.99 and stale["stale"]
+
+
+def test_old_rows_are_purged_from_disk(tmp_path, monkeypatch):
+    path = str(tmp_path / "prices.sqlite3")
+    cache = PriceCache(path, stale_retention_s=60)
+    monkeypatch.setenv("PRICE_CACHE_TTL_ALDI", "-120")
+    cache.set("aldi", "", ITEM, RESULT)
+    # Expiré depuis plus que la rétention : ni servi en secours, ni gardé sur disque
+    assert cache.get_stale("aldi", "", ITEM) is None
+    assert cache._db.execute("SELECT COUNT(*) FROM prices").fetchone()[0] == 0
+    assert cache.status()["purged"] == 1
+
+    monkeypatch.setenv("PRICE_CACHE_TTL_ALDI", "-1")
+    cache._purged_at = 0.0
+    cache.set("aldi", "", ITEM, RESULT)
+    assert cache.get_stale("aldi", "", ITEM)["stale"]
+    assert cache._db.execute("SELECT COUNT(*) FROM prices").fetchone()[0] == 1
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_lru_eviction():
+    cache = PriceCache(path="", max_entries=2)
+    for name in ["lait", "pain", "beurre"]:
+        cache.set("aldi", "", {"name": name}, RESULT)
+    assert cache.get("aldi", "", {"name": "lait"}) is None
+    assert cache.stats["evictions"] == 1
+
+
+def test_single_flight_shares_one_scrape():
+    import asyncio
+    from scraping.singleflight import AsyncSingleFlight
+
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def scrape():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return RESULT
+
+    async def main():
+        key = cache_key("carrefour", "", ITEM)
+        return await asyncio.gather(*[flight.do(key, scrape) for _ in range(3)])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [False, True, True]
@@ -0,0 +1,319 @@
+"""
+Tests de l'ordonnancement des scrapings (admission, limites, disjoncteur, échéance)
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+import pytest
+
+from scraping.admission import MemoryAdmission
+
+
+def test_memory_admission_holds_scrapes_over_budget():
+    admission = MemoryAdmission(budget_mb=0, scrape_mb=100)
+
+    async def scrape(order, i):
+        async with admission.admit():
+            order.append(i)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        order = []
+        await asyncio.gather(scrape(order, 1), scrape(order, 2))
+        return order
+
+    # Au-dessus du budget : un seul scraping à la fois, le second a attendu
+    assert asyncio.run(main()) == [1, 2]
+    assert admission.stats["delayed"] == 1
+    assert admission.in_flight == 0
+
+
+def test_memory_budget_follows_container_limit(tmp_path, monkeypatch):
+    from scraping import admission
+
+    limit = tmp_path / "memory.max"
+    limit.write_text(str(8 * 1024 ** 3))
+    monkeypatch.setattr(admission, "CGROUP_LIMIT_FILES", [str(limit)])
+    monkeypatch.setattr(admission.psutil, "virtual_memory", lambda: type("Memory", (), {"total": 64 * 1024 ** 3})())
+    monkeypatch.delenv("MEMORY_BUDGET_MB", raising=False)
+    # --memory=8Gi (deploy.yml) : 6 Go pour les scrapings
+    assert MemoryAdmission().budget_mb == 8192 * admission.MEMORY_BUDGET_FRACTION
+
+    # Pas de limite cgroup : mémoire de la machine
+    limit.write_text("max")
+    assert admission.container_memory_mb() == 64 * 1024
+
+    monkeypatch.setenv("MEMORY_BUDGET_MB", "1536")
+    assert MemoryAdmission().budget_mb == 1536
+
+
+def test_scheduler_enforces_store_and_global_limits():
+    from scraping.scheduler import ScrapeScheduler
+
+    scheduler = ScrapeScheduler({"aldi": 2, "u": 1}, global_limit=2)
+    peak = {"aldi": 0, "u": 0, "total": 0}
+
+    async def scrape(store):
+        async with scheduler.slot(store):
+            active = scheduler.status()
+            peak[store] = max(peak[store], active["stores"][store]["active"])
+            peak["total"] = max(peak["total"], active["active"])
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*[scrape("aldi") for _ in range(4)], *[scrape("u") for _ in range(3)])
+
+    asyncio.run(main())
+    assert peak == {"aldi": 2, "u": 1, "total": 2}
+    status = scheduler.status()
+    assert status["active"] == 0 and status["queue_depth"] == 0
+    assert status["stores"]["u"]["granted"] == 3
+
+
+def test_cancelled_waiter_gives_back_its_place():
+    from scraping.scheduler import ScrapeScheduler
+
+    scheduler = ScrapeScheduler({"aldi": 1}, global_limit=1)
+
+    async def main():
+        async with scheduler.slot("aldi"):
+            waiting = asyncio.ensure_future(scheduler.slot("aldi").__aenter__())
+            await asyncio.sleep(0)
+            assert scheduler.status()["queue_depth"] == 1
+            waiting.cancel()
+            await asyncio.sleep(0)
+        assert scheduler.status()["active"] == 0
+
+    asyncio.run(main())
+
+
+def test_autotune_backs_off_and_recovers():
+    from scraping.autotune import ConcurrencyTuner
+    from scraping.scheduler import ScrapeScheduler
+
+    scheduler = ScrapeScheduler({"aldi": 4}, global_limit=16)
+    tuner = ConcurrencyTuner(scheduler, window=4, enabled=True)
+    ok = {"success": True}
+    timeout = {"success": False, "error": "Timeout 20000ms exceeded."}
+
+    for _ in range(4):
+        tuner.observe("aldi", 1.0, ok)
+    assert scheduler.limits["aldi"] == 5
+
+    for result in [timeout, timeout, ok, ok]:
+        tuner.observe("aldi", 1.0, result)
+    assert scheduler.limits["aldi"] == 2
+
+    # Latence doublée sans erreur : recul aussi
+    for _ in range(4):
+        tuner.observe("aldi", 5.0, ok)
+    assert scheduler.limits["aldi"] == 1
+    assert [h["limit"] for h in tuner.status()["stores"]["aldi"]["history"]] == [5, 2, 1]
+
+
+def test_circuit_breaker_opens_then_probes(monkeypatch):
+    from scraping import breaker as breaker_module
+    from scraping.breaker import CircuitBreaker
+
+    now = [0.0]
+    monkeypatch.setattr(breaker_module.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("test-breaker", failures=2, reset_s=30, probes=1)
+    timeout = {"success": False, "error": "Timeout 20000ms exceeded."}
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record(timeout)
+    assert breaker.status()["state"] == "open"
+    assert not breaker.allow()
+
+    # Après le délai : une seule recherche d'essai
+    now[0] = 31
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record({"success": True})
+    assert breaker.status()["state"] == "closed"
+    assert breaker.status()["short_circuited"] == 2
+
+
+def test_breaker_ignores_items_not_found():
+    from scraping.breaker import CircuitBreaker
+
+    breaker = CircuitBreaker("test-not-found", failures=2)
+    for _ in range(5):
+        breaker.record({"success": False, "error": "Aucun produit trouvé"})
+    assert breaker.status()["state"] == "closed"
+
+    for _ in range(2):
+        breaker.record({"success": False, "error": "Page anti-bot (www.aldi.fr)"})
+    assert breaker.status()["state"] == "open"
+
+
+def test_bot_wall_is_reported_instead_of_not_found():
+    from stores.common import Readiness, wait_until_ready_async
+    from stores.http_fast import BotChallenge
+
+    class ChallengePage:
+        url = "https://www.aldi.fr/recherche.html?query=lait"
+
+        async def wait_for_selector(self, selector, timeout):
+            raise TimeoutError("Timeout exceeded")
+
+        async def content(self):
+            return "<script>window._cf_chl_opt = {}</script>"
+
+    with pytest.raises(BotChallenge, match="www.aldi.fr"):
+        asyncio.run(wait_until_ready_async(ChallengePage(), Readiness("div.product-tile"), timeout=10))
+
+
+def test_disabled_store_skips_breaker_and_scheduler(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "get_breaker", lambda store: pytest.fail("disjoncteur consulté pour U"))
+    monkeypatch.setattr(main, "observe_scrape", lambda *args: pytest.fail("autotuning alimenté par U"))
+    result = asyncio.run(main.scheduled_scrape_async("u", "Marly", {"name": "lait"}))
+    assert result["success"] is False
+    assert "u" not in main.breaker_stats()
+
+
+def test_deadline_bounds_scraper_timeouts():
+    from stores.deadline import budget_ms, deadline
+
+    assert budget_ms(20000) == 20000
+    with deadline(500):
+        assert 400 < budget_ms(20000) <= 500
+        assert budget_ms(100) == 100
+    with deadline(-10):
+        # Jamais 0 : Playwright le comprendrait comme "pas de timeout"
+        assert budget_ms(20000) == 1
+
+
+def test_abandoned_lookup_is_cancelled_for_last_waiter():
+    from scraping.singleflight import AsyncSingleFlight
+
+    flight = AsyncSingleFlight()
+    cancelled = []
+
+    async def scrape():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("k", scrape))
+        second = asyncio.ensure_future(flight.do("k", scrape))
+        await asyncio.sleep(0)
+        # Un des deux clients part : le scraping continue pour l'autre
+        first.cancel()
+        await asyncio.sleep(0)
+        assert not cancelled
+        second.cancel()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert cancelled == [True]
+    assert flight.status() == {"in_flight": 0, "leaders": 1, "coalesced": 1, "abandoned": 1}
+
+
+def test_shared_lookup_runs_until_latest_caller_deadline():
+    from scraping.singleflight import AsyncSingleFlight
+    from stores.deadline import budget_ms, deadline
+
+    flight = AsyncSingleFlight()
+    budgets = []
+
+    async def scrape():
+        for _ in range(3):
+            budgets.append(budget_ms(20000))
+            await asyncio.sleep(0.03)
+        return "ok"
+
+    async def client(deadline_ms, delay):
+        await asyncio.sleep(delay)
+        with deadline(deadline_ms):
+            return await flight.do("k", scrape)
+
+    async def main():
+        return await asyncio.gather(client(500, 0), client(5000, 0.01), client(None, 0.04))
+
+    assert [shared for _, shared in asyncio.run(main())] == [False, True, True]
+    # L'échéance du premier appelant borne les timeouts du scraping partagé...
+    assert budgets[0] <= 500
+    # ...puis celle, plus tardive, de chaque appelant qui le rejoint
+    assert 4500 < budgets[1] <= 5000
+    assert budgets[2] == 20000
+
+
+def test_deadline_cut_lookup_is_not_counted(monkeypatch):
+    import main
+    from scraping.breaker import CircuitBreaker
+    from stores.deadline import budget_ms, deadline
+
+    breaker = CircuitBreaker("test-deadline", failures=1)
+    observed = []
+    monkeypatch.setattr(main, "get_breaker", lambda store: breaker)
+    monkeypatch.setattr(main, "observe_scrape", lambda *args: observed.append(args))
+    monkeypatch.setattr(main, "get_price_cache", lambda: type("NoCache", (), {"get": lambda *args: None})())
+
+    async def scrape(store, city, item):
+        # Timeout Playwright raccourci par l'échéance de la requête
+        await asyncio.sleep(budget_ms(20000) / 1000)
+        return {"success": False, "error": "Timeout exceeded."}
+
+    monkeypatch.setattr(main, "scrape_single_item_async", scrape)
+    with deadline(20):
+        result = asyncio.run(main.search_single_item_async("aldi", "", {"name": "lait-deadline"}))
+    assert result["success"] is False
+    assert breaker.status()["state"] == "closed"
+    assert observed == []
+
+
+def test_hedge_wins_against_straggler():
+    from scraping.hedging import HedgePolicy
+
+    policy = HedgePolicy(enabled=True, pct=95, max_fraction=0.5, min_samples=5)
+    for _ in range(5):
+        policy.observe("aldi", 0.01)
+    straggler_cancelled = []
+
+    async def straggler():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            straggler_cancelled.append(True)
+            raise
+
+    async def hedge():
+        return {"success": True, "source": "hedge"}
+
+    async def main():
+        # Une recherche rapide (pas de hedge), puis une recherche bloquée
+        await policy.run("aldi", hedge, hedge)
+        return await policy.run("aldi", straggler, hedge)
+
+    assert asyncio.run(main())["source"] == "hedge"
+    assert straggler_cancelled == [True]
+    status = policy.status()["stores"]["aldi"]
+    assert (status["lookups"], status["hedges"], status["hedge_wins"]) == (2, 1, 1)
+
+
+def test_hedges_are_capped():
+    from scraping.hedging import HedgePolicy
+
+    policy = HedgePolicy(enabled=True, max_fraction=0.1, min_samples=1)
+    policy.observe("u", 0.001)
+
+    async def slow():
+        await asyncio.sleep(0.01)
+        return {"success": True, "source": "primary"}
+
+    async def main():
+        return [await policy.run("u", slow, slow) for _ in range(3)]
+
+    asyncio.run(main())
+    # 3 recherches, 10 % au plus : aucune doublée
+    assert policy.status()["stores"]["u"]["hedges"] == 0
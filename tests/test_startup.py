@@ -0,0 +1,131 @@
+"""
+Tests du préchauffage au démarrage (lifespan) et de la sonde /ready, avec un faux Playwright
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import time
+from fastapi.testclient import TestClient
+
+import main
+from scraping.startup import StartupReport
+from stores.browser_pool import AsyncBrowserPool
+
+
+class FakeContext:
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    async def route(self, pattern, handler):
+        pass
+
+    async def new_page(self):
+        return FakePage(self.pages)
+
+
+class FakePage:
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    async def goto(self, url, wait_until=None, timeout=None):
+        await asyncio.sleep(0.01)
+        if "aldi" in url:
+            raise RuntimeError("net::ERR_NAME_NOT_RESOLVED")
+        self.pages.append(url)
+
+
+class FakeBrowser:
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def is_connected(self):
+        return True
+
+    async def new_context(self, user_agent=None):
+        return FakeContext(self.pages)
+
+    async def close(self):
+        pass
+
+
+class FakePlaywright:
+    """Remplace Playwright dans un vrai AsyncBrowserPool : compte les lancements de Chromium"""
+
+    def __init__(self, launch_delay_s=0.0):
+        self.chromium = self
+        self.launch_delay_s = launch_delay_s
+        self.launches = 0
+        self.pages = []
+        self.stopped = False
+
+    async def launch(self, headless=True, args=None):
+        await asyncio.sleep(self.launch_delay_s)
+        self.launches += 1
+        return FakeBrowser(self.pages)
+
+    async def stop(self):
+        self.stopped = True
+
+
+def fake_pool(monkeypatch, launch_delay_s=0.0):
+    playwright = FakePlaywright(launch_delay_s)
+    pool = AsyncBrowserPool(size=4)
+    pool._playwright = playwright
+    monkeypatch.setattr(main, "get_async_browser_pool", lambda: pool)
+    return playwright
+
+
+def test_phase_errors_are_recorded_not_raised():
+    report = StartupReport()
+    with report.phase("browser_launch"):
+        raise RuntimeError("chromium absent")
+    report.mark_ready()
+
+    status = report.status()
+    assert status["ready"] and not status["warm"]
+    assert status["errors"] == {"browser_launch": "chromium absent"}
+    assert "browser_launch" in status["phases_ms"]
+
+
+def test_lifespan_warms_stores_then_ready(monkeypatch):
+    playwright = fake_pool(monkeypatch)
+    monkeypatch.setattr(main, "startup", StartupReport())
+    monkeypatch.setattr(main, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(main, "WARMUP_BROWSERS", 1)
+    # Pas de base SQLite créée dans le dossier courant
+    monkeypatch.setattr(main, "get_price_cache", lambda: None)
+
+    with TestClient(main.app) as client:
+        for _ in range(100):
+            response = client.get("/ready")
+            if response.status_code == 200:
+                break
+            time.sleep(0.01)
+        status = response.json()
+
+    assert response.status_code == 200
+    # Trois magasins préchauffés sur le seul navigateur demandé, lancé pendant browser_launch
+    assert playwright.launches == 1
+    assert sorted(playwright.pages) == ["https://courses.monoprix.fr/", "https://www.carrefour.fr/"]
+    # Aldi injoignable : signalé sans bloquer la disponibilité
+    assert not status["warm"] and list(status["errors"]) == ["context_aldi"]
+    assert {"price_cache", "browser_launch", "context_carrefour"} <= set(status["phases_ms"])
+    assert playwright.stopped
+
+
+def test_not_ready_while_warming(monkeypatch):
+    playwright = fake_pool(monkeypatch, launch_delay_s=5)
+    monkeypatch.setattr(main, "startup", StartupReport())
+    monkeypatch.setattr(main, "WARMUP_ENABLED", True)
+    # Pas de base SQLite créée dans le dossier courant
+    monkeypatch.setattr(main, "get_price_cache", lambda: None)
+
+    with TestClient(main.app) as client:
+        assert client.get("/ready").status_code == 503
+    # Préchauffage annulé à l'arrêt
+    assert playwright.stopped and playwright.launches == 0